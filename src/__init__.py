@@ -0,0 +1,10 @@
+"""
+Módulos compartidos del proyecto Consultores en Turismo Sostenible.
+
+Contiene la lógica reutilizable por el dashboard (streamlit_app) y por el
+pipeline de datos (notebooks):
+
+- data_processing: carga, limpieza, cachés y almacenamiento de datasets
+- analysis: cálculo de KPIs, rankings e índices de saturación
+- visualization: geometría y utilidades para los mapas del dashboard
+"""
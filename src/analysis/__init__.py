@@ -0,0 +1,3 @@
+"""
+Análisis: agregación de KPIs por ciudad y barrio.
+"""
@@ -0,0 +1,242 @@
+"""
+KPIs básicos y de impacto urbano del pipeline de datos
+=======================================================
+
+Funciones de las fases de KPIs del notebook persona_a
+(calcular_kpis_basicos y calcular_kpis_impacto_urbano), extraídas para que el
+pipeline por línea de comandos (src.data_processing.pipeline) las ejecute sin
+abrir el notebook. Reciben los datos como argumentos en lugar de leer
+variables globales y no imprimen nada; el cálculo es el mismo.
+
+Generan kpis_por_ciudad.csv, kpis_por_barrio.csv y kpis_impacto_urbano.csv.
+"""
+
+import pandas as pd
+
+TIPO_ENTIRE_HOME = 'Entire home/apt'
+
+
+def calcular_kpis_basicos(df_listings_unificado, df_demograficos):
+    """
+    KPIs básicos por ciudad y por barrio (listings, entire home, capacidad, precio y densidades).
+
+    Args:
+        df_listings_unificado: dataset unificado de listings
+        df_demograficos: datos demográficos por ciudad ('poblacion_total', 'superficie_km2')
+
+    Returns:
+        tuple: (kpis por ciudad, kpis por barrio)
+    """
+    if df_listings_unificado.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    kpis_ciudad = []
+    for ciudad in df_listings_unificado['ciudad'].unique():
+        ciudad_data = df_listings_unificado[df_listings_unificado['ciudad'] == ciudad]
+        demo_ciudad = df_demograficos[df_demograficos['ciudad'] == ciudad]
+        datos_demo = demo_ciudad.iloc[0] if len(demo_ciudad) > 0 else None
+
+        total_listings = len(ciudad_data)
+        listings_entire_home = (
+            int((ciudad_data['room_type'] == TIPO_ENTIRE_HOME).sum()) if 'room_type' in ciudad_data.columns else 0
+        )
+        capacidad_total = ciudad_data['accommodates'].sum() if 'accommodates' in ciudad_data.columns else 0
+        precio_medio = ciudad_data['price_clean'].mean() if 'price_clean' in ciudad_data.columns else None
+
+        if datos_demo is not None:
+            poblacion = datos_demo['poblacion_total']
+            superficie = datos_demo['superficie_km2']
+            densidad_listings_km2 = total_listings / superficie
+            densidad_listings_1000hab = (total_listings / poblacion) * 1000
+        else:
+            poblacion = None
+            superficie = None
+            densidad_listings_km2 = None
+            densidad_listings_1000hab = None
+
+        kpis_ciudad.append({
+            'ciudad': ciudad,
+            'total_listings': total_listings,
+            'listings_entire_home': listings_entire_home,
+            'capacidad_total': capacidad_total,
+            'precio_medio_euros': round(precio_medio, 2) if not pd.isna(precio_medio) else None,
+            'poblacion_total': poblacion,
+            'superficie_km2': superficie,
+            'densidad_listings_km2': round(densidad_listings_km2, 2) if densidad_listings_km2 else None,
+            'densidad_listings_1000hab': round(densidad_listings_1000hab, 2) if densidad_listings_1000hab else None,
+            'ratio_entire_home_pct': round((listings_entire_home / total_listings * 100), 2) if total_listings > 0 else 0,
+        })
+
+    kpis_barrio = []
+    if 'neighbourhood_cleansed' in df_listings_unificado.columns:
+        for ciudad in df_listings_unificado['ciudad'].unique():
+            ciudad_data = df_listings_unificado[df_listings_unificado['ciudad'] == ciudad]
+
+            for barrio in ciudad_data['neighbourhood_cleansed'].unique():
+                if pd.isna(barrio):
+                    continue
+                barrio_data = ciudad_data[ciudad_data['neighbourhood_cleansed'] == barrio]
+
+                total_listings_barrio = len(barrio_data)
+                listings_entire_home_barrio = (
+                    int((barrio_data['room_type'] == TIPO_ENTIRE_HOME).sum()) if 'room_type' in barrio_data.columns else 0
+                )
+                capacidad_barrio = barrio_data['accommodates'].sum() if 'accommodates' in barrio_data.columns else 0
+                precio_medio_barrio = barrio_data['price_clean'].mean() if 'price_clean' in barrio_data.columns else None
+
+                kpis_barrio.append({
+                    'ciudad': ciudad,
+                    'barrio': barrio,
+                    'total_listings': total_listings_barrio,
+                    'listings_entire_home': listings_entire_home_barrio,
+                    'capacidad_total': capacidad_barrio,
+                    'precio_medio_euros': round(precio_medio_barrio, 2) if not pd.isna(precio_medio_barrio) else None,
+                    'ratio_entire_home_pct': (
+                        round((listings_entire_home_barrio / total_listings_barrio * 100), 2)
+                        if total_listings_barrio > 0 else 0
+                    ),
+                })
+
+    return pd.DataFrame(kpis_ciudad), pd.DataFrame(kpis_barrio)
+
+
+def _nivel_saturacion(densidad_1000hab):
+    """
+    Saturación según listings por 1.000 habitantes (estándares europeos).
+    """
+    if pd.isna(densidad_1000hab):
+        return "❓ SIN DATOS"
+    if densidad_1000hab > 15:
+        return "🔴 CRÍTICA"
+    if densidad_1000hab > 8:
+        return "🟠 ALTA"
+    if densidad_1000hab > 4:
+        return "🟡 MODERADA"
+    return "🟢 BAJA"
+
+
+def _presion_sobre_precios(diferencial_precios):
+    """
+    Presión sobre precios según el diferencial Airbnb vs. alquiler diario.
+    """
+    if diferencial_precios > 100:
+        return "🔴 MUY ALTA"
+    if diferencial_precios > 50:
+        return "🟠 ALTA"
+    if diferencial_precios > 20:
+        return "🟡 MODERADA"
+    if diferencial_precios > 0:
+        return "🟢 BAJA"
+    return "💙 NEGATIVA"
+
+
+def _impacto_vivienda(ratio_turistico_residencial):
+    """
+    Impacto en la vivienda local según el % de listings sobre viviendas totales.
+    """
+    if ratio_turistico_residencial > 2.0:
+        return "🔴 CRÍTICO"
+    if ratio_turistico_residencial > 1.0:
+        return "🟠 ALTO"
+    if ratio_turistico_residencial > 0.5:
+        return "🟡 MODERADO"
+    return "🟢 BAJO"
+
+
+def _evaluacion_sobrecarga(ratio_capacidad_poblacion):
+    """
+    Sobrecarga turística según la capacidad de alojamiento sobre la población.
+    """
+    if ratio_capacidad_poblacion > 15:
+        return "🔴 SOBRECARGA EXTREMA"
+    if ratio_capacidad_poblacion > 10:
+        return "🟠 SOBRECARGA ALTA"
+    if ratio_capacidad_poblacion > 5:
+        return "🟡 CARGA MODERADA"
+    return "🟢 CARGA SOSTENIBLE"
+
+
+def calcular_indice_impacto(row):
+    """
+    Índice compuesto de impacto urbano (0-100): densidad 30, vivienda 25, precios 25 y sobrecarga 20.
+    """
+    score = 0
+    factores = 0
+
+    if pd.notna(row['densidad_listings_1000hab']):
+        score += min(row['densidad_listings_1000hab'] * 2, 30)
+        factores += 1
+    if 'ratio_turistico_residencial_pct' in row and pd.notna(row['ratio_turistico_residencial_pct']):
+        score += min(row['ratio_turistico_residencial_pct'] * 12.5, 25)
+        factores += 1
+    if 'diferencial_precio_pct' in row and pd.notna(row['diferencial_precio_pct']):
+        score += min(abs(row['diferencial_precio_pct']) * 0.25, 25)
+        factores += 1
+    if 'capacidad_turistica_vs_poblacion_pct' in row and pd.notna(row['capacidad_turistica_vs_poblacion_pct']):
+        score += min(row['capacidad_turistica_vs_poblacion_pct'], 20)
+        factores += 1
+
+    return round(score, 1) if factores > 0 else None
+
+
+def clasificar_impacto(indice):
+    """
+    Nivel de impacto urbano a partir del índice compuesto.
+    """
+    if pd.isna(indice):
+        return "❓ SIN DATOS"
+    if indice >= 70:
+        return "🔴 IMPACTO CRÍTICO"
+    if indice >= 50:
+        return "🟠 IMPACTO ALTO"
+    if indice >= 30:
+        return "🟡 IMPACTO MODERADO"
+    return "🟢 IMPACTO BAJO"
+
+
+def calcular_kpis_impacto_urbano(df_kpis_ciudad, df_precios_reales):
+    """
+    Enriquece los KPIs de ciudad con saturación, presión sobre precios, impacto en vivienda,
+    sobrecarga turística y el índice compuesto de impacto urbano.
+
+    Args:
+        df_kpis_ciudad: KPIs básicos por ciudad (calcular_kpis_basicos)
+        df_precios_reales: alquileres reales por ciudad ('alquiler_diario_real_euros'...)
+
+    Returns:
+        DataFrame: KPIs de impacto urbano por ciudad
+    """
+    df_kpis_enriquecido = df_kpis_ciudad.merge(df_precios_reales, on='ciudad', how='left')
+
+    for idx, row in df_kpis_enriquecido.iterrows():
+        # 1. Densidad y saturación territorial
+        df_kpis_enriquecido.at[idx, 'nivel_saturacion'] = _nivel_saturacion(row['densidad_listings_1000hab'])
+
+        # 2. Presión sobre precios (Airbnb vs. alquiler real)
+        if pd.notna(row['precio_medio_euros']) and pd.notna(row['alquiler_diario_real_euros']):
+            diferencial_precios = (
+                (row['precio_medio_euros'] - row['alquiler_diario_real_euros'])
+                / row['alquiler_diario_real_euros'] * 100
+            )
+            df_kpis_enriquecido.at[idx, 'diferencial_precio_pct'] = round(diferencial_precios, 1)
+            df_kpis_enriquecido.at[idx, 'rentabilidad_vs_alquiler_tradicional'] = round(diferencial_precios, 1)
+            df_kpis_enriquecido.at[idx, 'presion_sobre_precios'] = _presion_sobre_precios(diferencial_precios)
+
+        # 3. Ratio turístico/residencial
+        if pd.notna(row['total_listings']) and 'ciudad_viviendas_totales' in df_kpis_enriquecido.columns:
+            if pd.notna(row['ciudad_viviendas_totales']) and row['ciudad_viviendas_totales'] > 0:
+                ratio_turistico_residencial = (row['total_listings'] / row['ciudad_viviendas_totales']) * 100
+                df_kpis_enriquecido.at[idx, 'ratio_turistico_residencial_pct'] = round(ratio_turistico_residencial, 3)
+                df_kpis_enriquecido.at[idx, 'impacto_vivienda_local'] = _impacto_vivienda(ratio_turistico_residencial)
+
+        # 4. Capacidad turística total frente a la población
+        if pd.notna(row['capacidad_total']) and pd.notna(row['poblacion_total']):
+            ratio_capacidad_poblacion = (row['capacidad_total'] / row['poblacion_total']) * 100
+            df_kpis_enriquecido.at[idx, 'capacidad_turistica_vs_poblacion_pct'] = round(ratio_capacidad_poblacion, 2)
+            df_kpis_enriquecido.at[idx, 'evaluacion_sobrecarga'] = _evaluacion_sobrecarga(ratio_capacidad_poblacion)
+
+    # 5. Índice compuesto de impacto urbano
+    df_kpis_enriquecido['indice_impacto_urbano'] = df_kpis_enriquecido.apply(calcular_indice_impacto, axis=1)
+    df_kpis_enriquecido['clasificacion_impacto'] = df_kpis_enriquecido['indice_impacto_urbano'].apply(clasificar_impacto)
+
+    return df_kpis_enriquecido
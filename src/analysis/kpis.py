@@ -0,0 +1,195 @@
+"""
+Motor de agregación de KPIs por ciudad y barrio
+================================================
+
+Calcula todos los KPIs de ciudad y de barrio del dashboard en una sola pasada
+agrupada sobre el dataset de listings, en lugar de filtrar el DataFrame con
+máscaras booleanas una vez por ciudad y otra por barrio.
+
+Las columnas de salida (incluidos los alias de compatibilidad) son las mismas
+que generaba cargar_datasets_verificados, para que todas las pestañas
+mostrar_* sigan funcionando sin cambios.
+"""
+
+import numpy as np
+import pandas as pd
+
+TIPO_ENTIRE_HOME = 'Entire home/apt'
+
+# Disponibilidad por defecto cuando no hay datos de availability_365
+DISPONIBILIDAD_POR_DEFECTO = 200
+
+COLUMNAS_KPIS_CIUDAD = [
+    'ciudad',
+    'total_listings',
+    'precio_medio',
+    'precio_medio_euros',
+    'ratio_entire_home',
+    'ocupacion_estimada',
+    'entire_home_count',
+    'barrios_count',
+]
+
+COLUMNAS_KPIS_BARRIO = [
+    'ciudad',
+    'barrio',
+    'total_listings',
+    'entire_home_count',
+    'ratio_entire_home',
+    'ratio_entire_home_pct',
+    'precio_medio',
+    'precio_medio_euros',
+    'price',
+    'disponibilidad_media',
+    'lat_mean',
+    'lon_mean',
+]
+
+
+def _preparar_agregacion(df):
+    """
+    Añade la columna auxiliar de entire home y define las agregaciones comunes.
+    """
+    if 'room_type' in df.columns:
+        es_entire_home = (df['room_type'] == TIPO_ENTIRE_HOME).to_numpy()
+    else:
+        es_entire_home = np.zeros(len(df), dtype=bool)
+
+    trabajo = df.assign(_entire_home=es_entire_home)
+
+    agregaciones = {
+        'total_listings': ('_entire_home', 'size'),
+        'entire_home_count': ('_entire_home', 'sum'),
+        'precio_medio': ('price', 'mean'),
+    }
+    if 'availability_365' in df.columns:
+        agregaciones['disponibilidad_media'] = ('availability_365', 'mean')
+
+    return trabajo, agregaciones
+
+
+def _completar_metricas(agrupado):
+    """
+    Calcula ratios y valores por defecto sobre el resultado agrupado.
+    """
+    agrupado['total_listings'] = agrupado['total_listings'].astype('int64')
+    agrupado['entire_home_count'] = agrupado['entire_home_count'].astype('int64')
+    agrupado['ratio_entire_home'] = np.where(
+        agrupado['total_listings'] > 0,
+        agrupado['entire_home_count'] / agrupado['total_listings'].clip(lower=1) * 100,
+        0.0
+    )
+    agrupado['precio_medio'] = agrupado['precio_medio'].fillna(0)
+
+    if 'disponibilidad_media' in agrupado.columns:
+        agrupado['disponibilidad_media'] = agrupado['disponibilidad_media'].fillna(DISPONIBILIDAD_POR_DEFECTO)
+    else:
+        agrupado['disponibilidad_media'] = float(DISPONIBILIDAD_POR_DEFECTO)
+
+    return agrupado
+
+
+def _ordenar_por_ciudad(agrupado, df):
+    """
+    Ordena los grupos por orden de aparición de la ciudad en el dataset.
+
+    Reproduce el orden del cálculo original (ciudad a ciudad y, dentro de cada
+    ciudad, barrio a barrio por orden de aparición).
+    """
+    orden_ciudades = {ciudad: i for i, ciudad in enumerate(pd.unique(df['ciudad'].dropna()))}
+    rango = agrupado['ciudad'].map(orden_ciudades)
+    return agrupado.iloc[np.argsort(rango.to_numpy(), kind='stable')].reset_index(drop=True)
+
+
+def calcular_kpis_ciudad(df):
+    """
+    Calcula los KPIs por ciudad en una sola pasada agrupada.
+
+    Args:
+        df: DataFrame de listings limpio (ciudad, neighbourhood_cleansed,
+            room_type, price, availability_365)
+
+    Returns:
+        DataFrame: una fila por ciudad con las columnas de COLUMNAS_KPIS_CIUDAD
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_KPIS_CIUDAD)
+
+    trabajo, agregaciones = _preparar_agregacion(df)
+    agregaciones['barrios_count'] = ('neighbourhood_cleansed', 'nunique')
+
+    agrupado = (
+        trabajo.groupby('ciudad', sort=False, observed=True, dropna=True)
+        .agg(**agregaciones)
+        .reset_index()
+    )
+    agrupado = _completar_metricas(agrupado)
+
+    disponibilidad = agrupado['disponibilidad_media']
+    agrupado['ocupacion_estimada'] = np.where(
+        disponibilidad > 0,
+        np.maximum(0, 100 - (disponibilidad / 365 * 100)),
+        0.0
+    )
+
+    agrupado = _ordenar_por_ciudad(agrupado, df)
+    agrupado['ciudad'] = agrupado['ciudad'].astype(str).str.lower()
+    agrupado['precio_medio_euros'] = agrupado['precio_medio']
+    agrupado['barrios_count'] = agrupado['barrios_count'].astype('int64')
+
+    return agrupado[COLUMNAS_KPIS_CIUDAD]
+
+
+def calcular_kpis_barrio(df):
+    """
+    Calcula los KPIs por barrio en una sola pasada agrupada por (ciudad, barrio).
+
+    Args:
+        df: DataFrame de listings limpio (ciudad, neighbourhood_cleansed,
+            room_type, price, availability_365, latitude, longitude)
+
+    Returns:
+        DataFrame: una fila por barrio con las columnas de COLUMNAS_KPIS_BARRIO
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_KPIS_BARRIO)
+
+    trabajo, agregaciones = _preparar_agregacion(df)
+    for columna, alias in (('latitude', 'lat_mean'), ('longitude', 'lon_mean')):
+        if columna in df.columns:
+            agregaciones[alias] = (columna, 'mean')
+
+    agrupado = (
+        trabajo.groupby(['ciudad', 'neighbourhood_cleansed'], sort=False, observed=True, dropna=True)
+        .agg(**agregaciones)
+        .reset_index()
+        .rename(columns={'neighbourhood_cleansed': 'barrio'})
+    )
+    agrupado = _completar_metricas(agrupado)
+
+    for alias in ('lat_mean', 'lon_mean'):
+        if alias in agrupado.columns:
+            # Las coordenadas pueden venir en float32 (esquema compacto de listings)
+            agrupado[alias] = agrupado[alias].astype('float64').fillna(0)
+        else:
+            agrupado[alias] = 0
+
+    agrupado = _ordenar_por_ciudad(agrupado, df)
+    agrupado['ciudad'] = agrupado['ciudad'].astype(str).str.lower()
+    # Nombres de barrio como cadenas aunque la columna de origen sea category
+    agrupado['barrio'] = agrupado['barrio'].astype(object)
+    agrupado['ratio_entire_home_pct'] = agrupado['ratio_entire_home']
+    agrupado['precio_medio_euros'] = agrupado['precio_medio']
+    agrupado['price'] = agrupado['precio_medio']
+
+    return agrupado[COLUMNAS_KPIS_BARRIO]
+
+
+def calcular_kpis(df):
+    """
+    Calcula los KPIs de ciudad y de barrio del dashboard.
+
+    Returns:
+        tuple: (kpis_ciudad, kpis_barrio)
+    """
+    return calcular_kpis_ciudad(df), calcular_kpis_barrio(df)
@@ -0,0 +1,233 @@
+"""
+Clustering de barrios y predicciones de impacto urbano
+=======================================================
+
+Funciones de las fases de modelado del notebook persona_b
+(generar_clustering_barrios_reales y generar_predicciones_impacto_reales),
+extraídas para el pipeline por línea de comandos
+(src.data_processing.pipeline). Reciben los KPIs como argumentos y devuelven
+el resultado sin imprimir ni guardar; el pipeline escribe
+barrios_clustering.csv y predicciones_impacto_urbano.csv.
+
+scikit-learn es opcional: sin él se usan las mismas alternativas que el
+notebook aplica cuando faltan datos (clasificación por cuartiles y
+predicciones por tendencias simples).
+"""
+
+import pandas as pd
+
+try:
+    from sklearn.cluster import KMeans
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import StandardScaler
+    SKLEARN_DISPONIBLE = True
+except ImportError:
+    SKLEARN_DISPONIBLE = False
+
+# Variables del clustering de barrios
+VARIABLES_CLUSTERING = [
+    'total_listings', 'listings_entire_home', 'capacidad_total',
+    'precio_medio_euros', 'ratio_entire_home_pct',
+]
+
+# Variables predictoras del modelo de impacto urbano
+VARIABLES_PREDICTORAS = [
+    'total_listings', 'densidad_listings_km2', 'densidad_listings_1000hab',
+    'ratio_entire_home_pct', 'poblacion_total',
+]
+
+# Variables que escalan con el número de listings en los escenarios
+VARIABLES_ESCENARIO = ['total_listings', 'densidad_listings_km2', 'densidad_listings_1000hab']
+
+FACTOR_CRECIMIENTO = 1.2
+FACTOR_REGULACION = 0.7
+
+
+def generar_clustering_basico(df_barrios):
+    """
+    Clasificación de barrios por cuartiles de total_listings (cuando no se puede usar K-means).
+    """
+    if df_barrios.empty:
+        return pd.DataFrame()
+    if 'total_listings' not in df_barrios.columns:
+        return df_barrios.copy()
+
+    df_basic = df_barrios[['ciudad', 'barrio', 'total_listings']].dropna()
+
+    q25 = df_basic['total_listings'].quantile(0.25)
+    q50 = df_basic['total_listings'].quantile(0.50)
+    q75 = df_basic['total_listings'].quantile(0.75)
+
+    def clasificar_barrio(listings):
+        if listings >= q75:
+            return (3, "🔴 ALTA DENSIDAD")
+        elif listings >= q50:
+            return (2, "🟡 DENSIDAD MODERADA")
+        elif listings >= q25:
+            return (1, "🟠 DENSIDAD BAJA-MEDIA")
+        else:
+            return (0, "🟢 DENSIDAD MUY BAJA")
+
+    clasificacion = df_basic['total_listings'].map(clasificar_barrio)
+    return df_basic.assign(
+        cluster=clasificacion.str[0].astype('int64'),
+        cluster_tipo=clasificacion.str[1],
+    )
+
+
+def _tipo_cluster(cluster_data, df_clustering):
+    """
+    Interpretación de un cluster según su densidad de listings y su precio medio.
+    """
+    total_listings_avg = cluster_data['total_listings'].mean()
+    precio_avg = cluster_data['precio_medio_euros'].mean() if 'precio_medio_euros' in cluster_data.columns else 0
+
+    if total_listings_avg > df_clustering['total_listings'].quantile(0.75):
+        if precio_avg > df_clustering.get('precio_medio_euros', pd.Series([0])).quantile(0.75):
+            return "🔴 ALTA DENSIDAD - PRECIOS ALTOS"
+        return "🟠 ALTA DENSIDAD TURÍSTICA"
+    if total_listings_avg > df_clustering['total_listings'].quantile(0.5):
+        return "🟡 DENSIDAD MODERADA"
+    return "🟢 BAJA DENSIDAD TURÍSTICA"
+
+
+def generar_clustering_barrios_reales(df_barrios):
+    """
+    Clustering K-means de barrios sobre sus KPIs (3-4 grupos).
+
+    Args:
+        df_barrios: KPIs por barrio (kpis_por_barrio.csv)
+
+    Returns:
+        DataFrame: 'ciudad', 'barrio', variables usadas, 'cluster' y
+            'cluster_tipo' (clasificación por cuartiles si no hay datos o
+            variables suficientes o scikit-learn no está instalado)
+    """
+    if df_barrios.empty:
+        return pd.DataFrame()
+
+    variables_disponibles = [
+        var for var in VARIABLES_CLUSTERING
+        if var in df_barrios.columns and df_barrios[var].notna().sum() > 0
+    ]
+    if not SKLEARN_DISPONIBLE or len(variables_disponibles) < 2 or 'total_listings' not in variables_disponibles:
+        return generar_clustering_basico(df_barrios)
+
+    df_clustering = df_barrios[['ciudad', 'barrio'] + variables_disponibles].copy()
+
+    # Valores faltantes: mediana de la ciudad o, si la ciudad no tiene datos, mediana global
+    for var in variables_disponibles:
+        mediana_ciudad = df_clustering.groupby('ciudad')[var].transform('median')
+        df_clustering[var] = df_clustering[var].fillna(mediana_ciudad).fillna(df_clustering[var].median())
+    df_clustering = df_clustering.dropna(subset=variables_disponibles)
+
+    if len(df_clustering) < 5:
+        return generar_clustering_basico(df_barrios)
+
+    X = StandardScaler().fit_transform(df_clustering[variables_disponibles])
+    n_clusters = min(4, max(3, len(df_clustering) // 10))
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+    df_clustering['cluster'] = kmeans.fit_predict(X)
+
+    tipos = {
+        cluster_id: _tipo_cluster(df_clustering[df_clustering['cluster'] == cluster_id], df_clustering)
+        for cluster_id in range(n_clusters)
+    }
+    df_clustering['cluster_tipo'] = df_clustering['cluster'].map(tipos)
+    return df_clustering
+
+
+def generar_predicciones_tendencias_simples(df_impacto):
+    """
+    Predicciones por tendencias simples sobre la densidad actual (cuando no se puede entrenar el modelo).
+    """
+    predicciones = []
+    for _, row in df_impacto.iterrows():
+        densidad_base = row.get('densidad_listings_1000hab', row.get('total_listings', 0))
+
+        predicciones.append({
+            'ciudad': row['ciudad'],
+            'valor_actual': densidad_base,
+            'pred_mantenimiento': densidad_base,
+            'pred_crecimiento_20pct': round(densidad_base * FACTOR_CRECIMIENTO, 2),
+            'pred_regulacion_30pct': round(densidad_base * FACTOR_REGULACION, 2),
+            'cambio_crecimiento': round(densidad_base * (FACTOR_CRECIMIENTO - 1), 2),
+            'cambio_regulacion': round(densidad_base * (FACTOR_REGULACION - 1), 2),
+            'modelo_entrenado': 'Tendencias_simples_datos_reales',
+            'variables_usadas': 'Densidad actual',
+        })
+    return pd.DataFrame(predicciones)
+
+
+def _escenario(fila, variables, factor):
+    """
+    Fila de predictoras con las variables de listings escaladas por `factor`.
+    """
+    escenario = fila[variables].copy()
+    for var in VARIABLES_ESCENARIO:
+        if var in variables:
+            escenario[var] *= factor
+    return escenario
+
+
+def generar_predicciones_impacto_reales(df_impacto):
+    """
+    Predicciones del índice de impacto urbano por ciudad en tres escenarios.
+
+    Entrena un RandomForest sobre los KPIs de impacto de las ciudades y
+    predice el objetivo con los listings actuales, con un crecimiento del
+    20 % y con una regulación del -30 %.
+
+    Args:
+        df_impacto: KPIs de impacto urbano por ciudad (kpis_impacto_urbano.csv)
+
+    Returns:
+        DataFrame: una fila por ciudad con 'valor_actual', las tres
+            predicciones, los cambios frente al mantenimiento, el modelo y las
+            variables usadas (vacío si no hay variables suficientes)
+    """
+    if df_impacto.empty:
+        return pd.DataFrame()
+
+    variables_disponibles = [
+        var for var in VARIABLES_PREDICTORAS
+        if var in df_impacto.columns and df_impacto[var].notna().any()
+    ]
+    if len(variables_disponibles) < 2:
+        return pd.DataFrame()
+
+    if 'indice_impacto_urbano' in df_impacto.columns:
+        variable_objetivo = 'indice_impacto_urbano'
+    elif 'densidad_listings_1000hab' in df_impacto.columns:
+        variable_objetivo = 'densidad_listings_1000hab'
+    else:
+        return pd.DataFrame()
+
+    df_modelo = df_impacto[variables_disponibles + [variable_objetivo, 'ciudad']].dropna()
+    if not SKLEARN_DISPONIBLE or len(df_modelo) < 3:
+        return generar_predicciones_tendencias_simples(df_impacto)
+
+    modelo = RandomForestRegressor(n_estimators=50, random_state=42, max_depth=3)
+    modelo.fit(df_modelo[variables_disponibles], df_modelo[variable_objetivo])
+
+    predicciones = []
+    for _, ciudad_data in df_modelo.iterrows():
+        escenarios = pd.DataFrame([
+            ciudad_data[variables_disponibles],
+            _escenario(ciudad_data, variables_disponibles, FACTOR_CRECIMIENTO),
+            _escenario(ciudad_data, variables_disponibles, FACTOR_REGULACION),
+        ]).astype('float64')
+        pred_mantenimiento, pred_crecimiento, pred_regulacion = modelo.predict(escenarios)
+
+        predicciones.append({
+            'ciudad': ciudad_data['ciudad'],
+            'valor_actual': ciudad_data[variable_objetivo],
+            'pred_mantenimiento': round(pred_mantenimiento, 2),
+            'pred_crecimiento_20pct': round(pred_crecimiento, 2),
+            'pred_regulacion_30pct': round(pred_regulacion, 2),
+            'cambio_crecimiento': round(pred_crecimiento - pred_mantenimiento, 2),
+            'cambio_regulacion': round(pred_regulacion - pred_mantenimiento, 2),
+            'modelo_entrenado': 'RandomForest_datos_reales',
+            'variables_usadas': ', '.join(variables_disponibles),
+        })
+    return pd.DataFrame(predicciones)
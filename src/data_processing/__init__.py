@@ -0,0 +1,3 @@
+"""
+Procesamiento de datos: carga de listings, cachés columnares y almacenamiento.
+"""
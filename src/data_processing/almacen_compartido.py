@@ -0,0 +1,281 @@
+"""
+Almacén de datos compartido entre sesiones
+===========================================
+
+Con st.cache_data, cada rerun de cada sesión recibe una copia deserializada
+(pickle) del DataFrame de listings y de todos los GeoJSON. Este módulo define
+un almacén de solo lectura que se construye una vez por proceso y se entrega a
+todas las sesiones sin copiar los datos:
+
+- Los DataFrames se entregan como copias superficiales (sin copiar datos).
+  Con copy-on-write activado en pandas, cualquier modificación del llamador
+  copia solo la parte modificada y nunca altera los datos compartidos.
+- Los diccionarios de datasets y de GeoJSON se entregan como mappings de solo
+  lectura (MappingProxyType).
+- La geometría de barrios de cada ciudad se prepara una sola vez al construir
+  el almacén (ver src.visualization.geometria), junto con el registro de mapas
+  disponibles por ciudad (ver src.visualization.disponibilidad_mapas). Los
+  listings de cada ciudad se asignan por coordenadas a su polígono de barrio
+  con el índice espacial de la geometría; la asignación de cada listing se
+  guarda (asignacion_listings) y de ella sale el polígono de cada barrio que
+  usan los mapas.
+- El índice de clusters de listings de cada ciudad para la vista de listings
+  individuales (ver src.visualization.clustering_listings) se construye al
+  primer uso y se comparte entre sesiones.
+- El motor de consultas (ver src.data_processing.consultas_barrios) filtra
+  las tablas por ciudad y umbrales sin máscaras sobre la tabla completa; sus
+  particiones por ciudad también se comparten entre sesiones.
+
+Cada almacén tiene una versión calculada a partir del contenido de los datasets
+(version), que las cachés de mapas usan en sus claves para no servir mapas de
+datos anteriores tras una recarga.
+
+También registra las sesiones que usan el almacén (con la hora de su última
+interacción) para generar un informe de memoria con el ahorro frente a copias
+por sesión. Solo cuentan como activas las sesiones con alguna interacción en
+los últimos SESION_ACTIVA_S segundos; las demás se olvidan.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from types import MappingProxyType
+
+import pandas as pd
+
+from src.data_processing.consultas_barrios import MotorConsultas
+from src.data_processing.memoria import memoria_proceso_mb
+from src.visualization.clustering_listings import IndiceClustersListings
+from src.visualization.disponibilidad_mapas import calcular_disponibilidad_mapas, mapas_disponibles
+from src.visualization.geometria import preparar_geometrias
+from src.visualization.indice_espacial import SIN_BARRIO
+
+BYTES_POR_MB = 1024 * 1024
+
+# Segundos sin interacción tras los que una sesión deja de contarse como activa
+SESION_ACTIVA_S = 30 * 60
+
+# Atributos de cada listing en la vista de listings individuales
+COLUMNAS_LISTING_INDIVIDUAL = ['id', 'neighbourhood_cleansed', 'room_type', 'price']
+
+
+def activar_copy_on_write():
+    """
+    Activa el modo copy-on-write de pandas (necesario para las vistas sin copia).
+    """
+    pd.set_option('mode.copy_on_write', True)
+
+
+def calcular_version_datasets(datasets):
+    """
+    Versión corta (hash) del contenido de un diccionario de DataFrames.
+    """
+    if datasets is None:
+        return None
+    h = hashlib.sha1()
+    for nombre in sorted(datasets):
+        h.update(nombre.encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(datasets[nombre], index=True).to_numpy().tobytes())
+    return h.hexdigest()[:12]
+
+
+def asignar_listings_a_barrios(listings, geometrias):
+    """
+    Asigna los listings de cada ciudad a los polígonos de su geometría.
+
+    Args:
+        listings: DataFrame con 'ciudad', 'neighbourhood_cleansed', 'latitude' y 'longitude'
+        geometrias: diccionario ciudad -> GeometriaCiudad
+
+    Returns:
+        dict: ciudad -> Serie con el índice de feature de cada listing de la
+            ciudad (SIN_BARRIO si ninguna), con el índice de listings
+    """
+    columnas = ['ciudad', 'neighbourhood_cleansed', 'latitude', 'longitude']
+    if listings is None or listings.empty or not set(columnas).issubset(listings.columns):
+        return {}
+
+    asignados = {}
+    for ciudad, df_ciudad in listings[columnas].groupby('ciudad', sort=False, observed=True):
+        geometria = geometrias.get(str(ciudad).lower())
+        if geometria is None:
+            continue
+        id_feature = geometria.asignar_listings(
+            df_ciudad['neighbourhood_cleansed'].to_numpy(),
+            pd.to_numeric(df_ciudad['longitude'], errors='coerce').to_numpy(),
+            pd.to_numeric(df_ciudad['latitude'], errors='coerce').to_numpy(),
+        )
+        asignados[str(ciudad).lower()] = pd.Series(id_feature, index=df_ciudad.index, name='id_feature')
+    return asignados
+
+
+class AlmacenDatosCompartido:
+    """
+    Datasets y GeoJSON compartidos por todas las sesiones del proceso.
+
+    Args:
+        datasets: diccionario de DataFrames (o None si no se pudieron cargar)
+        geodatos: diccionario ciudad -> GeoJSON
+        tablas_centroides: diccionario ciudad -> tabla de centroides (opcional)
+    """
+
+    def __init__(self, datasets, geodatos, tablas_centroides=None):
+        self._datasets = MappingProxyType(dict(datasets)) if datasets is not None else None
+        self._geodatos = MappingProxyType(dict(geodatos or {}))
+        geometrias = preparar_geometrias(self._geodatos, tablas_centroides)
+        self._asignacion_listings = MappingProxyType(asignar_listings_a_barrios(
+            self._datasets.get('listings_precios') if self._datasets is not None else None,
+            geometrias
+        ))
+        self._geometrias = MappingProxyType(geometrias)
+        self._disponibilidad_mapas = calcular_disponibilidad_mapas(
+            self._datasets.get('kpis_barrio') if self._datasets is not None else None,
+            self._geometrias
+        )
+        self.version = calcular_version_datasets(self._datasets)
+        self._sesiones = {}
+        self._sesiones_totales = 0
+        self._lock = threading.Lock()
+        self._bytes_datasets = None
+        self._bytes_geodatos = None
+        self._indices_clusters = {}
+        self.consultas = MotorConsultas(self._datasets)
+
+    @property
+    def disponible(self):
+        return self._datasets is not None
+
+    def vista_datasets(self):
+        """
+        Vista de solo lectura de los datasets para una sesión, sin copiar datos.
+        """
+        if self._datasets is None:
+            return None
+        return MappingProxyType({
+            nombre: df.copy(deep=False) for nombre, df in self._datasets.items()
+        })
+
+    def vista_geodatos(self):
+        """
+        Vista de solo lectura del diccionario de GeoJSON por ciudad.
+        """
+        return self._geodatos
+
+    def vista_geometrias(self):
+        """
+        Vista de solo lectura de la geometría preparada (GeometriaCiudad) por ciudad.
+        """
+        return self._geometrias
+
+    def mapas_disponibles(self, ciudad):
+        """
+        Tipos de mapa disponibles para una ciudad, sin construir ningún mapa.
+        """
+        return mapas_disponibles(self._disponibilidad_mapas, ciudad)
+
+    def asignacion_listings(self, ciudad):
+        """
+        Polígono asignado a cada listing de una ciudad por coordenadas.
+
+        Returns:
+            Serie | None: índice de feature de cada listing (SIN_BARRIO si
+                ninguna), con el índice de listings_precios
+        """
+        return self._asignacion_listings.get(str(ciudad).lower())
+
+    def listings_sin_poligono(self, ciudad):
+        """
+        Número de listings de una ciudad que no caen en ningún polígono.
+        """
+        asignacion = self.asignacion_listings(ciudad)
+        return int((asignacion == SIN_BARRIO).sum()) if asignacion is not None else 0
+
+    def indice_clusters(self, ciudad):
+        """
+        Índice de clusters de los listings de una ciudad (se construye al primer uso).
+
+        Returns:
+            IndiceClustersListings | None: None si no hay listings con coordenadas
+        """
+        ciudad = str(ciudad).lower()
+        with self._lock:
+            if ciudad in self._indices_clusters:
+                return self._indices_clusters[ciudad]
+
+        indice = None
+        listings = self._datasets.get('listings_precios') if self._datasets is not None else None
+        if listings is not None and {'ciudad', 'latitude', 'longitude'}.issubset(listings.columns):
+            df_ciudad = listings[listings['ciudad'] == ciudad]
+            if not df_ciudad.empty:
+                columnas = [col for col in COLUMNAS_LISTING_INDIVIDUAL if col in df_ciudad.columns]
+                indice = IndiceClustersListings(
+                    pd.to_numeric(df_ciudad['latitude'], errors='coerce'),
+                    pd.to_numeric(df_ciudad['longitude'], errors='coerce'),
+                    df_ciudad[columnas]
+                )
+
+        with self._lock:
+            return self._indices_clusters.setdefault(ciudad, indice)
+
+    def _olvidar_sesiones_inactivas(self, ahora):
+        limite = ahora - SESION_ACTIVA_S
+        for id_sesion in [id_sesion for id_sesion, visto in self._sesiones.items() if visto < limite]:
+            del self._sesiones[id_sesion]
+
+    def registrar_sesion(self, id_sesion):
+        """
+        Registra una interacción de una sesión y devuelve el número de sesiones activas.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            if id_sesion not in self._sesiones:
+                self._sesiones_totales += 1
+            self._sesiones[id_sesion] = ahora
+            self._olvidar_sesiones_inactivas(ahora)
+            return len(self._sesiones)
+
+    @property
+    def bytes_datasets(self):
+        if self._bytes_datasets is None:
+            total = 0
+            if self._datasets is not None:
+                for df in self._datasets.values():
+                    total += int(df.memory_usage(index=True, deep=True).sum())
+            self._bytes_datasets = total
+        return self._bytes_datasets
+
+    @property
+    def bytes_geodatos(self):
+        if self._bytes_geodatos is None:
+            self._bytes_geodatos = sum(
+                len(json.dumps(geojson).encode('utf-8')) for geojson in self._geodatos.values()
+            )
+        return self._bytes_geodatos
+
+    def informe_memoria(self):
+        """
+        Informe de memoria compartida y ahorro estimado frente a copias por sesión.
+
+        Returns:
+            dict: tamaños en MB, sesiones activas y acumuladas, y ahorro
+                estimado con las sesiones activas
+        """
+        with self._lock:
+            self._olvidar_sesiones_inactivas(time.monotonic())
+            sesiones = len(self._sesiones)
+            sesiones_totales = self._sesiones_totales
+
+        compartido_mb = (self.bytes_datasets + self.bytes_geodatos) / BYTES_POR_MB
+
+        return {
+            'datasets_mb': self.bytes_datasets / BYTES_POR_MB,
+            'geodatos_mb': self.bytes_geodatos / BYTES_POR_MB,
+            'compartido_mb': compartido_mb,
+            'sesiones': sesiones,
+            'sesiones_totales': sesiones_totales,
+            # Con st.cache_data cada sesión recibía su propia copia en cada rerun
+            'ahorro_estimado_mb': compartido_mb * sesiones,
+            'copia_evitada_por_rerun_mb': compartido_mb,
+            'memoria_proceso_mb': memoria_proceso_mb(),
+        }
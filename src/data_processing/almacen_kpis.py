@@ -0,0 +1,482 @@
+"""
+Almacén versionado de KPIs precalculados, particionado por ciudad
+==================================================================
+
+El dashboard recalculaba los KPIs de ciudad y de barrio desde los listings en
+cada arranque. Este módulo guarda esos KPIs (los de src.analysis.kpis, con
+las columnas que consume el dashboard) en un almacén columnar junto al CSV de
+listings, con una partición Parquet por tabla y ciudad:
+
+    data/processed/kpis/
+        kpis_ciudad/<ciudad>.parquet
+        kpis_barrio/<ciudad>.parquet
+        manifiesto.json
+
+El manifiesto registra la firma del CSV de origen (tamaño, fecha de
+modificación y SHA-1 del contenido), la huella del código que calcula los
+KPIs (SHA-1 de src/analysis/kpis.py y de este módulo), el hash del contenido de los listings
+limpios de cada ciudad y, por tabla y ciudad, el fichero, el número de filas
+y el SHA-1 del Parquet.
+
+- Si cambia el código de los KPIs, el almacén completo deja de ser válido y
+  se recalculan todas las ciudades.
+- Si el CSV no ha cambiado, los KPIs se leen del almacén (verificando hashes
+  y número de filas).
+- Si ha cambiado (p. ej. llega un snapshot trimestral de una ciudad), solo se
+  recalculan las ciudades cuyo hash de listings es distinto; el resto de
+  particiones se reutiliza y el resultado se combina en las tablas de KPIs.
+  Solo se reescriben las particiones de las ciudades recalculadas.
+
+El pipeline lo genera con construir_almacen_kpis (paso final del notebook
+persona_a o `python -m src.data_processing.almacen_kpis`), y el dashboard lo
+lee con obtener_kpis. pyarrow es opcional: sin él los KPIs se calculan
+siempre en memoria.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.analysis import kpis as modulo_kpis
+from src.analysis.kpis import calcular_kpis
+from src.data_processing.cache_listings import PYARROW_DISPONIBLE, cargar_listings_con_cache, firma_csv
+
+DIRECTORIO_ALMACEN_KPIS = 'kpis'
+NOMBRE_MANIFIESTO = 'manifiesto.json'
+
+# Se incrementa si cambia el formato del almacén o las columnas de los KPIs
+VERSION_FORMATO = 2
+
+TABLAS_KPIS = ('kpis_ciudad', 'kpis_barrio')
+
+# Filtro de precios válidos del dashboard (euros por noche)
+PRECIO_MAXIMO = 6501
+
+TAMANO_BLOQUE_HASH = 1024 * 1024
+
+
+def limpiar_listings(df):
+    """
+    Limpieza de listings previa al cálculo de KPIs del dashboard.
+
+    Convierte el precio a numérico y elimina filas sin ciudad, sin barrio,
+    sin precio válido o con precios <= 0 o extremos (>= PRECIO_MAXIMO).
+    """
+    df = df.assign(price=pd.to_numeric(df['price'], errors='coerce'))
+    df = df.dropna(subset=['ciudad', 'neighbourhood_cleansed', 'price'])
+    return df[(df['price'] > 0) & (df['price'] < PRECIO_MAXIMO)]
+
+
+def hash_fichero(ruta):
+    """
+    SHA-1 del contenido de un fichero, leído por bloques.
+    """
+    h = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE_HASH), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def huella_codigo_kpis():
+    """
+    SHA-1 de los módulos que calculan los KPIs (src.analysis.kpis y la
+    limpieza de este módulo), como las huellas de código de las etapas del
+    pipeline.
+    """
+    return [hash_fichero(modulo.__file__) for modulo in (modulo_kpis, sys.modules[__name__])]
+
+
+def _codigo_vigente(manifiesto):
+    """
+    Indica si el manifiesto se generó con el formato y el código de KPIs actuales.
+    """
+    return (
+        bool(manifiesto)
+        and manifiesto.get('version_formato') == VERSION_FORMATO
+        and manifiesto.get('codigo_kpis') == huella_codigo_kpis()
+    )
+
+
+def ruta_almacen_kpis(csv_path):
+    """
+    Directorio del almacén de KPIs de un CSV de listings (data/processed/kpis).
+    """
+    return Path(csv_path).parent / DIRECTORIO_ALMACEN_KPIS
+
+
+def leer_manifiesto(directorio):
+    """
+    Manifiesto del almacén, o None si no existe o no es legible.
+    """
+    ruta = Path(directorio) / NOMBRE_MANIFIESTO
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def hashes_por_ciudad(df):
+    """
+    Hash del contenido de los listings de cada ciudad.
+
+    Se calcula un hash por fila de todo el DataFrame en una sola pasada
+    (pd.util.hash_pandas_object, con las columnas en orden alfabético para no
+    depender del origen de la carga) y se combinan, en orden, los de cada
+    ciudad. Las categóricas se hashean como cadenas y los enteros como int64,
+    para que el hash no dependa de esos tipos; los float32 no se pueden
+    recuperar, así que el hash debe calcularse antes de aplicar_esquema.
+
+    Returns:
+        dict: ciudad (minúsculas) -> {'sha1', 'filas'}, en orden de aparición
+    """
+    if df.empty:
+        return {}
+    columnas = df[sorted(df.columns)]
+    normalizadas = {
+        col: serie.astype(object) if isinstance(serie.dtype, pd.CategoricalDtype) else serie.astype('int64')
+        for col, serie in columnas.items()
+        if isinstance(serie.dtype, pd.CategoricalDtype)
+        or (pd.api.types.is_integer_dtype(serie) and serie.dtype != 'int64')
+    }
+    hash_filas = pd.util.hash_pandas_object(columnas.assign(**normalizadas), index=False).to_numpy()
+    ciudades = df['ciudad'].astype(str).str.lower()
+
+    particiones = {}
+    for ciudad, posiciones in ciudades.groupby(ciudades, sort=False).indices.items():
+        particiones[ciudad] = {
+            'sha1': hashlib.sha1(hash_filas[posiciones].tobytes()).hexdigest(),
+            'filas': int(len(posiciones)),
+        }
+    return particiones
+
+
+def _nombre_particion(ciudad):
+    return f"{re.sub(r'[^a-z0-9_-]', '_', str(ciudad).lower())}.parquet"
+
+
+def _escribir_json_atomico(datos, ruta):
+    tmp_path = ruta.with_suffix(ruta.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    tmp_path.replace(ruta)
+
+
+def manifiesto_vigente(manifiesto, csv_path):
+    """
+    Indica si el manifiesto corresponde al CSV de listings actual.
+
+    Con el mismo tamaño y fecha de modificación no se lee el CSV. Si solo
+    cambia la fecha (fichero copiado o tocado) se compara el SHA-1 del
+    contenido. Si el almacén se generó con otro código de KPIs no es vigente.
+    """
+    if not _codigo_vigente(manifiesto):
+        return False
+
+    fuente = manifiesto.get('fuente') or {}
+    firma = firma_csv(csv_path)
+    if fuente.get('size') != firma['size']:
+        return False
+    if fuente.get('mtime_ns') == firma['mtime_ns']:
+        return True
+    return fuente.get('sha1') == hash_fichero(csv_path)
+
+
+def _leer_particiones(directorio, manifiesto, ciudades):
+    """
+    Lee y verifica las particiones de KPIs de las ciudades indicadas.
+
+    Returns:
+        dict: nombre de tabla -> ciudad -> DataFrame; las ciudades cuya
+            partición falta o no supera la verificación no se incluyen
+    """
+    particiones = {nombre: {} for nombre in TABLAS_KPIS}
+    tablas = manifiesto.get('tablas') or {}
+    columnas = {nombre: (tablas.get(nombre) or {}).get('columnas') for nombre in TABLAS_KPIS}
+
+    for ciudad in ciudades:
+        leidas = {}
+        for nombre in TABLAS_KPIS:
+            info = ((tablas.get(nombre) or {}).get('particiones') or {}).get(ciudad)
+            if not info:
+                break
+            ruta = Path(directorio) / nombre / info['fichero']
+            try:
+                if hash_fichero(ruta) != info['sha1']:
+                    break
+                df = pd.read_parquet(ruta)
+            except Exception:
+                break
+            if len(df) != info['filas'] or list(df.columns) != columnas[nombre]:
+                break
+            leidas[nombre] = df
+        else:
+            # Solo se aceptan ciudades con todas sus particiones íntegras
+            for nombre, df in leidas.items():
+                particiones[nombre][ciudad] = df
+
+    return particiones
+
+
+def _combinar_particiones(particiones, orden_ciudades):
+    """
+    Tablas de KPIs completas a partir de las particiones por ciudad.
+    """
+    kpis = {}
+    for nombre in TABLAS_KPIS:
+        partes = [particiones[nombre][ciudad] for ciudad in orden_ciudades if ciudad in particiones[nombre]]
+        kpis[nombre] = pd.concat(partes, ignore_index=True) if partes else None
+    return kpis
+
+
+def escribir_almacen_kpis(kpis, csv_path, particiones_listings, directorio=None,
+                          ciudades_escribir=None, manifiesto_previo=None):
+    """
+    Escribe las particiones de KPIs indicadas y el manifiesto del almacén.
+
+    Las particiones se escriben sobre ficheros temporales y el manifiesto se
+    escribe al final, de modo que un lector nunca ve un almacén a medias.
+
+    Args:
+        kpis: diccionario nombre de tabla -> DataFrame completo (TABLAS_KPIS)
+        csv_path: CSV de listings del que se calcularon los KPIs
+        particiones_listings: resultado de hashes_por_ciudad de los listings
+        directorio: directorio del almacén (por defecto ruta_almacen_kpis)
+        ciudades_escribir: ciudades a reescribir (None = todas); el resto
+            conserva la entrada de manifiesto_previo
+        manifiesto_previo: manifiesto anterior del almacén
+
+    Returns:
+        dict | None: manifiesto escrito, o None si pyarrow no está disponible
+    """
+    if not PYARROW_DISPONIBLE:
+        return None
+
+    directorio = Path(directorio) if directorio else ruta_almacen_kpis(csv_path)
+    orden_ciudades = list(particiones_listings)
+    if ciudades_escribir is None or not manifiesto_previo:
+        ciudades_escribir = orden_ciudades
+    tablas_previas = (manifiesto_previo or {}).get('tablas') or {}
+
+    tablas = {}
+    for nombre in TABLAS_KPIS:
+        (directorio / nombre).mkdir(parents=True, exist_ok=True)
+        previas = (tablas_previas.get(nombre) or {}).get('particiones') or {}
+        por_ciudad = kpis[nombre].groupby('ciudad', sort=False).indices if not kpis[nombre].empty else {}
+
+        particiones = {}
+        for ciudad in orden_ciudades:
+            if ciudad not in ciudades_escribir and ciudad in previas:
+                particiones[ciudad] = previas[ciudad]
+                continue
+            df_ciudad = kpis[nombre].iloc[por_ciudad.get(ciudad, [])]
+            ruta = directorio / nombre / _nombre_particion(ciudad)
+            tmp_path = ruta.with_suffix('.parquet.tmp')
+            df_ciudad.to_parquet(tmp_path, index=False, compression='snappy')
+            tmp_path.replace(ruta)
+            particiones[ciudad] = {
+                'fichero': ruta.name,
+                'filas': int(len(df_ciudad)),
+                'sha1': hash_fichero(ruta),
+            }
+
+        tablas[nombre] = {
+            'columnas': list(kpis[nombre].columns),
+            'filas': sum(info['filas'] for info in particiones.values()),
+            'particiones': particiones,
+        }
+
+        # Particiones de ciudades que ya no están en los listings
+        for ciudad, info in previas.items():
+            if ciudad not in particiones and info['fichero'] not in {p['fichero'] for p in particiones.values()}:
+                (directorio / nombre / info['fichero']).unlink(missing_ok=True)
+
+    version = hashlib.sha1(''.join(
+        tablas[nombre]['particiones'][ciudad]['sha1'] for nombre in TABLAS_KPIS for ciudad in orden_ciudades
+    ).encode('utf-8')).hexdigest()[:12]
+
+    manifiesto = {
+        'version_formato': VERSION_FORMATO,
+        'codigo_kpis': huella_codigo_kpis(),
+        'version': version,
+        'creado': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'fuente': {
+            'fichero': Path(csv_path).name,
+            **firma_csv(csv_path),
+            'sha1': hash_fichero(csv_path),
+        },
+        'orden_ciudades': orden_ciudades,
+        'listings': particiones_listings,
+        'tablas': tablas,
+    }
+    _escribir_json_atomico(manifiesto, directorio / NOMBRE_MANIFIESTO)
+    return manifiesto
+
+
+def cargar_almacen_kpis(csv_path, directorio=None):
+    """
+    Lee los KPIs del almacén si el manifiesto está vigente y las particiones son íntegras.
+
+    Returns:
+        tuple: (diccionario nombre de tabla -> DataFrame, manifiesto), o
+            (None, None) si el almacén no existe, está obsoleto o alguna
+            partición no supera la verificación de hashes y número de filas
+    """
+    if not PYARROW_DISPONIBLE:
+        return None, None
+
+    directorio = Path(directorio) if directorio else ruta_almacen_kpis(csv_path)
+    manifiesto = leer_manifiesto(directorio)
+    if not manifiesto_vigente(manifiesto, csv_path):
+        return None, None
+
+    orden_ciudades = manifiesto.get('orden_ciudades') or []
+    particiones = _leer_particiones(directorio, manifiesto, orden_ciudades)
+    if any(len(particiones[nombre]) != len(orden_ciudades) for nombre in TABLAS_KPIS):
+        return None, None
+    kpis = _combinar_particiones(particiones, orden_ciudades)
+    if any(df is None for df in kpis.values()):
+        return None, None
+
+    # CSV tocado sin cambios de contenido: se actualiza la fecha para no volver a leerlo
+    mtime_ns = firma_csv(csv_path)['mtime_ns']
+    if manifiesto['fuente'].get('mtime_ns') != mtime_ns:
+        manifiesto['fuente']['mtime_ns'] = mtime_ns
+        try:
+            _escribir_json_atomico(manifiesto, directorio / NOMBRE_MANIFIESTO)
+        except OSError:
+            pass
+
+    return kpis, manifiesto
+
+
+def actualizar_kpis_incremental(df_listings, manifiesto_previo, directorio):
+    """
+    Recalcula solo los KPIs de las ciudades cuyos listings han cambiado.
+
+    Args:
+        df_listings: listings limpios actuales
+        manifiesto_previo: manifiesto del almacén (o None)
+        directorio: directorio del almacén
+
+    Returns:
+        tuple: (diccionario nombre de tabla -> DataFrame, hashes_por_ciudad de
+            los listings, lista de ciudades recalculadas)
+    """
+    particiones_listings = hashes_por_ciudad(df_listings)
+    orden_ciudades = list(particiones_listings)
+
+    previas = {}
+    if _codigo_vigente(manifiesto_previo):
+        listings_previos = manifiesto_previo.get('listings') or {}
+        sin_cambios = [
+            ciudad for ciudad in orden_ciudades
+            if (listings_previos.get(ciudad) or {}).get('sha1') == particiones_listings[ciudad]['sha1']
+        ]
+        previas = _leer_particiones(directorio, manifiesto_previo, sin_cambios)
+
+    reutilizables = set(previas.get(TABLAS_KPIS[0], {}))
+    recalcular = [ciudad for ciudad in orden_ciudades if ciudad not in reutilizables]
+
+    particiones = {nombre: dict(previas.get(nombre, {})) for nombre in TABLAS_KPIS}
+    if recalcular:
+        ciudades = df_listings['ciudad'].astype(str).str.lower()
+        kpis_ciudad, kpis_barrio = calcular_kpis(df_listings[ciudades.isin(recalcular)])
+        for nombre, df in (('kpis_ciudad', kpis_ciudad), ('kpis_barrio', kpis_barrio)):
+            for ciudad, posiciones in df.groupby('ciudad', sort=False).indices.items():
+                particiones[nombre][ciudad] = df.iloc[posiciones]
+
+    kpis = _combinar_particiones(particiones, orden_ciudades)
+    if kpis['kpis_ciudad'] is None:
+        kpis = dict(zip(TABLAS_KPIS, calcular_kpis(df_listings)))
+
+    return kpis, particiones_listings, recalcular
+
+
+def obtener_kpis(csv_path, df_listings, guardar=True):
+    """
+    KPIs del dashboard desde el almacén, recalculando solo las ciudades que cambiaron.
+
+    Args:
+        csv_path: CSV de listings del que procede df_listings
+        df_listings: listings ya limpios (limpiar_listings) y sin aplicar_esquema:
+            las coordenadas en float32 cambian el hash de cada ciudad
+        guardar: False para no reescribir el almacén al recalcular
+
+    Returns:
+        tuple: (kpis_ciudad, kpis_barrio, dict con 'origen' ('almacen',
+            'incremental' o 'calculado'), 'ciudades_recalculadas',
+            'tiempo_s' y 'version')
+    """
+    inicio = time.perf_counter()
+    directorio = ruta_almacen_kpis(csv_path)
+    kpis, manifiesto = cargar_almacen_kpis(csv_path, directorio)
+    origen = 'almacen'
+    recalculadas = []
+
+    if kpis is None:
+        manifiesto_previo = leer_manifiesto(directorio) if PYARROW_DISPONIBLE else None
+        kpis, particiones_listings, recalculadas = actualizar_kpis_incremental(
+            df_listings, manifiesto_previo, directorio
+        )
+        origen = 'incremental' if len(recalculadas) < len(particiones_listings) else 'calculado'
+
+        manifiesto = None
+        if guardar:
+            try:
+                manifiesto = escribir_almacen_kpis(
+                    kpis, csv_path, particiones_listings, directorio,
+                    ciudades_escribir=recalculadas, manifiesto_previo=manifiesto_previo
+                )
+            except Exception:
+                # El almacén es una optimización: si no se puede escribir, se usan los KPIs en memoria
+                manifiesto = None
+
+    info = {
+        'origen': origen,
+        'ciudades_recalculadas': recalculadas,
+        'tiempo_s': time.perf_counter() - inicio,
+        'version': manifiesto.get('version') if manifiesto else None,
+    }
+    return kpis['kpis_ciudad'], kpis['kpis_barrio'], info
+
+
+def construir_almacen_kpis(csv_path):
+    """
+    Paso del pipeline: actualiza el almacén de KPIs desde el CSV de listings.
+
+    Solo se recalculan las ciudades cuyos listings han cambiado desde la
+    última ejecución.
+
+    Returns:
+        tuple: (manifiesto escrito o vigente, info de obtener_kpis)
+    """
+    df, _ = cargar_listings_con_cache(csv_path)
+    _, _, info = obtener_kpis(csv_path, limpiar_listings(df))
+    return leer_manifiesto(ruta_almacen_kpis(csv_path)) if info['version'] else None, info
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera o actualiza el almacén versionado de KPIs del dashboard")
+    parser.add_argument(
+        'csv', nargs='?', default='data/processed/listings_unificado.csv',
+        help="CSV de listings unificado"
+    )
+    args = parser.parse_args()
+
+    manifiesto, info = construir_almacen_kpis(args.csv)
+    if manifiesto is None:
+        print("pyarrow no está instalado: no se puede escribir el almacén de KPIs")
+    else:
+        recalculadas = ', '.join(info['ciudades_recalculadas']) or 'ninguna'
+        print(f"Almacén de KPIs {manifiesto['version']} en {ruta_almacen_kpis(args.csv)} ({info['origen']})")
+        print(f"  Ciudades recalculadas: {recalculadas}")
+        for nombre, info_tabla in manifiesto['tablas'].items():
+            print(f"  {nombre}: {info_tabla['filas']:,} filas en {len(info_tabla['particiones'])} particiones")
@@ -0,0 +1,323 @@
+"""
+Base de datos SQLite de los datos procesados: carga masiva y consultas
+=======================================================================
+
+crear_base_datos_sqlite (notebook persona_a) escribía cada tabla con
+DataFrame.to_sql por defecto y el dashboard nunca leía la base de datos: las
+tablas auxiliares se cargaban enteras desde CSV aunque cada vista solo usa
+las filas de una ciudad.
+
+crear_base_datos carga las tablas en airbnb_consultores_turismo.db:
+
+- Todas las tablas en una única transacción, con journal en modo WAL y
+  synchronous=NORMAL durante la carga.
+- Las filas se insertan con executemany en lotes de TAMANO_LOTE, con las
+  columnas tipadas (INTEGER, REAL o TEXT) según el dtype de pandas.
+- Los índices (ciudad + barrio, que sirve también para filtrar solo por
+  ciudad, y room_type) se crean al final de la carga, no fila a fila, y se
+  actualizan las estadísticas del planificador (ANALYZE).
+- La tabla _origenes registra, por tabla, el número de filas y la firma
+  (tamaño y fecha de modificación) del CSV del que se cargó.
+
+Lectura: consultar_tabla hace un SELECT parametrizado con filtros de
+igualdad (p. ej. ciudad = 'madrid'), que usa los índices y solo lee las filas
+pedidas; tabla_vigente indica si una tabla corresponde todavía a su CSV.
+
+    python -m src.data_processing.base_datos [data/processed]
+"""
+
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.data_processing.cache_listings import firma_csv
+
+NOMBRE_BASE_DATOS = 'airbnb_consultores_turismo.db'
+
+# Tabla con el origen y el número de filas de cada tabla cargada
+TABLA_ORIGENES = '_origenes'
+
+# Filas por llamada a executemany
+TAMANO_LOTE = 50_000
+
+# Caché de páginas durante la carga (KB): la ordenación al crear los índices cabe en memoria
+CACHE_CARGA_KB = 256 * 1024
+
+# Columna auxiliar con el rowid, para devolver las filas en el orden del CSV
+COLUMNA_ORDEN = '_orden_carga'
+
+# Columnas de barrio que se indexan junto a la ciudad
+COLUMNAS_BARRIO = ['barrio', 'neighbourhood_cleansed']
+
+# CSV de data/processed que se cargan en la base de datos (tabla = nombre del fichero)
+TABLAS_CSV = [
+    'listings_unificado',
+    'kpis_por_ciudad',
+    'kpis_por_barrio',
+    'kpis_impacto_urbano',
+    'ocupacion_barrio_mensual',
+    'resenas_barrio_mensual',
+    'actividad_resenas_barrio',
+    'datos_demograficos',
+    'precios_inmobiliarios',
+    'precios_alquileres_reales',
+    'poblacion_distritos',
+    'estadisticas_turismo',
+    'barrios_clustering',
+    'predicciones_impacto_urbano',
+]
+
+
+def ruta_base_datos(directorio):
+    """
+    Ruta de la base de datos en un directorio de datos procesados.
+    """
+    return Path(directorio) / NOMBRE_BASE_DATOS
+
+
+def _identificador(nombre):
+    """
+    Nombre de tabla o columna entre comillas dobles (escapadas) para usarlo en SQL.
+    """
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+
+def _tipo_sqlite(serie):
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_integer_dtype(serie):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(serie):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _valores_columna(serie):
+    """
+    Valores de una columna como objetos de Python, con None en los nulos.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        serie = serie.dt.strftime('%Y-%m-%d %H:%M:%S')
+    if serie.isna().any():
+        serie = serie.astype(object).where(serie.notna(), None)
+    return serie.tolist()
+
+
+def _lotes_filas(df, tamano_lote):
+    """
+    Filas de df como tuplas de valores de Python, en lotes de tamano_lote.
+
+    La conversión se hace por columnas (tolist), no fila a fila.
+    """
+    for inicio in range(0, len(df), tamano_lote):
+        lote = df.iloc[inicio:inicio + tamano_lote]
+        yield list(zip(*(_valores_columna(lote[col]) for col in lote.columns)))
+
+
+def _columnas_indice(columnas):
+    """
+    Índices de una tabla: ciudad + barrio (que también sirve para filtrar solo
+    por ciudad) o, si no hay barrio, ciudad; y room_type.
+    """
+    columna_barrio = next((col for col in COLUMNAS_BARRIO if col in columnas), None)
+    indices = []
+    if 'ciudad' in columnas:
+        indices.append(('ciudad', columna_barrio) if columna_barrio else ('ciudad',))
+    elif columna_barrio:
+        indices.append((columna_barrio,))
+    if 'room_type' in columnas:
+        indices.append(('room_type',))
+    return indices
+
+
+def cargar_tabla(conn, tabla, df, tamano_lote=TAMANO_LOTE):
+    """
+    Reemplaza una tabla con el contenido de df (dentro de la transacción abierta en conn).
+
+    Returns:
+        list: nombres de los índices creados
+    """
+    columnas = [str(col) for col in df.columns]
+    definicion = ', '.join(f"{_identificador(col)} {_tipo_sqlite(df[col])}" for col in df.columns)
+    conn.execute(f"DROP TABLE IF EXISTS {_identificador(tabla)}")
+    conn.execute(f"CREATE TABLE {_identificador(tabla)} ({definicion})")
+
+    insercion = (
+        f"INSERT INTO {_identificador(tabla)} VALUES ({', '.join('?' * len(columnas))})"
+    )
+    for lote in _lotes_filas(df, tamano_lote):
+        conn.executemany(insercion, lote)
+
+    indices = []
+    for columnas_indice in _columnas_indice(columnas):
+        nombre = f"idx_{tabla}_{'_'.join(columnas_indice)}"
+        conn.execute(
+            f"CREATE INDEX {_identificador(nombre)} ON {_identificador(tabla)} "
+            f"({', '.join(_identificador(col) for col in columnas_indice)})"
+        )
+        indices.append(nombre)
+    return indices
+
+
+def crear_base_datos(datasets, db_path, origenes=None, tamano_lote=TAMANO_LOTE):
+    """
+    Carga un dict de DataFrames en la base de datos SQLite en una única transacción.
+
+    Las tablas que ya existían y no están en datasets se conservan.
+
+    Args:
+        datasets: dict nombre de tabla -> DataFrame
+        db_path: ruta de la base de datos
+        origenes: dict opcional nombre de tabla -> ruta del CSV de origen
+            (su firma se guarda en _origenes para tabla_vigente)
+        tamano_lote: filas por llamada a executemany
+
+    Returns:
+        dict: 'tablas' (tabla -> filas), 'indices' (tabla -> índices) y 'tiempo_s'
+    """
+    inicio = time.perf_counter()
+    origenes = origenes or {}
+    resumen = {'tablas': {}, 'indices': {}}
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_CARGA_KB}")
+
+        conn.execute("BEGIN")
+        try:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLA_ORIGENES} "
+                "(tabla TEXT PRIMARY KEY, filas INTEGER, origen TEXT, size INTEGER, mtime_ns INTEGER, fecha TEXT)"
+            )
+            for nombre, df in datasets.items():
+                tabla = nombre.replace('-', '_').lower()
+                resumen['indices'][tabla] = cargar_tabla(conn, tabla, df, tamano_lote)
+                resumen['tablas'][tabla] = len(df)
+
+                origen = origenes.get(nombre)
+                firma = firma_csv(origen) if origen is not None else {'size': None, 'mtime_ns': None}
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {TABLA_ORIGENES} VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        tabla, len(df), str(origen) if origen is not None else None,
+                        firma['size'], firma['mtime_ns'], time.strftime('%Y-%m-%d %H:%M:%S'),
+                    ),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    resumen['tiempo_s'] = time.perf_counter() - inicio
+    return resumen
+
+
+def cargar_csvs_en_base_datos(directorio, db_path=None, tablas=None, tamano_lote=TAMANO_LOTE):
+    """
+    Carga en la base de datos los CSV de TABLAS_CSV que existan en el directorio.
+
+    Returns:
+        dict: resumen de crear_base_datos, con 'db_path'
+    """
+    directorio = Path(directorio)
+    db_path = db_path or ruta_base_datos(directorio)
+    origenes = {
+        tabla: directorio / f"{tabla}.csv"
+        for tabla in (tablas or TABLAS_CSV)
+        if (directorio / f"{tabla}.csv").exists()
+    }
+    datasets = {tabla: pd.read_csv(ruta) for tabla, ruta in origenes.items()}
+
+    resumen = crear_base_datos(datasets, db_path, origenes=origenes, tamano_lote=tamano_lote)
+    resumen['db_path'] = db_path
+    return resumen
+
+
+def _conectar_lectura(db_path):
+    return sqlite3.connect(f"file:{Path(db_path).resolve()}?mode=ro", uri=True)
+
+
+def tabla_vigente(db_path, tabla, csv_path=None):
+    """
+    Indica si la tabla existe en la base de datos y, si se pasa csv_path, si se cargó desde ese CSV tal como está ahora.
+    """
+    if not Path(db_path).exists():
+        return False
+    try:
+        conn = _conectar_lectura(db_path)
+        try:
+            fila = conn.execute(
+                f"SELECT size, mtime_ns FROM {TABLA_ORIGENES} WHERE tabla = ?", (tabla,)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+    if fila is None:
+        return False
+    if csv_path is None:
+        return True
+    if not Path(csv_path).exists():
+        return False
+    firma = firma_csv(csv_path)
+    return fila == (firma['size'], firma['mtime_ns'])
+
+
+def consultar_tabla(db_path, tabla, columnas=None, filtros=None):
+    """
+    Filas de una tabla que cumplen filtros de igualdad (SELECT parametrizado).
+
+    Args:
+        db_path: ruta de la base de datos
+        tabla: nombre de la tabla
+        columnas: columnas a leer (por defecto, todas)
+        filtros: dict columna -> valor, o lista de valores (IN)
+
+    Returns:
+        DataFrame: filas de la tabla que cumplen todos los filtros, en el
+            orden en que se cargaron
+    """
+    seleccion = ', '.join(_identificador(col) for col in columnas) if columnas else '*'
+    condiciones, parametros = [], []
+    for columna, valor in (filtros or {}).items():
+        if isinstance(valor, (list, tuple, set)):
+            valores = list(valor)
+            condiciones.append(f"{_identificador(columna)} IN ({', '.join('?' * len(valores))})")
+            parametros.extend(valores)
+        else:
+            condiciones.append(f"{_identificador(columna)} = ?")
+            parametros.append(valor)
+
+    # Sin ORDER BY rowid, que haría recorrer la tabla entera en lugar de usar el índice:
+    # las filas llegan en el orden del índice y se reordenan por rowid en pandas
+    consulta = f"SELECT rowid AS {COLUMNA_ORDEN}, {seleccion} FROM {_identificador(tabla)}"
+    if condiciones:
+        consulta += " WHERE " + " AND ".join(condiciones)
+
+    conn = _conectar_lectura(db_path)
+    try:
+        df = pd.read_sql_query(consulta, conn, params=parametros)
+    finally:
+        conn.close()
+    return df.sort_values(COLUMNA_ORDEN, ignore_index=True).drop(columns=COLUMNA_ORDEN)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Carga los CSV procesados en la base de datos SQLite")
+    parser.add_argument('directorio', nargs='?', default='data/processed', help="directorio de datos procesados")
+    args = parser.parse_args()
+
+    resumen = cargar_csvs_en_base_datos(args.directorio)
+    print(f"Base de datos {resumen['db_path']} creada en {resumen['tiempo_s']:.2f}s")
+    for tabla, filas in resumen['tablas'].items():
+        indices = ', '.join(resumen['indices'][tabla]) or 'sin índices'
+        print(f"  {tabla}: {filas:,} filas ({indices})")
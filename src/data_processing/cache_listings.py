@@ -0,0 +1,212 @@
+"""
+Caché columnar (Parquet) para listings_unificado.csv
+=====================================================
+
+El CSV unificado se vuelve a parsear completo en cada arranque en frío del
+dashboard. Este módulo guarda una copia Parquet con solo las columnas que usa
+el dashboard, identificada por el tamaño y la fecha de modificación del CSV.
+Si el CSV cambia, la caché se considera obsoleta y se regenera desde el CSV.
+La caché registra también las columnas que se pidieron al crearla: si una
+carga posterior pide columnas que no se pidieron, se regenera con ambas.
+
+pyarrow es opcional: si no está instalado se lee siempre el CSV.
+"""
+
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIBLE = True
+except ImportError:
+    PYARROW_DISPONIBLE = False
+
+# Columnas de listings_unificado.csv que consume el dashboard
+COLUMNAS_DASHBOARD = [
+    'id',
+    'ciudad',
+    'neighbourhood_cleansed',
+    'room_type',
+    'price',
+    'availability_365',
+    'latitude',
+    'longitude',
+    'license',
+]
+
+# Clave de metadatos donde se guarda la firma del CSV de origen
+CLAVE_FIRMA = b'consultora.firma_csv'
+
+# Clave de metadatos con las columnas pedidas al escribir la caché
+CLAVE_COLUMNAS = b'consultora.columnas'
+
+DIRECTORIO_CACHE = 'cache'
+
+
+def firma_csv(csv_path):
+    """
+    Firma del CSV de origen: tamaño en bytes y fecha de modificación (ns).
+    """
+    stat = Path(csv_path).stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def ruta_cache_parquet(csv_path):
+    """
+    Ruta del Parquet de caché para un CSV (data/processed/cache/<nombre>.parquet).
+    """
+    csv_path = Path(csv_path)
+    return csv_path.parent / DIRECTORIO_CACHE / f"{csv_path.stem}.parquet"
+
+
+def _leer_metadato_cache(parquet_path, clave):
+    """
+    Devuelve el valor (JSON) guardado con una clave en los metadatos del Parquet, o None si no hay.
+    """
+    try:
+        metadata = pq.read_schema(parquet_path).metadata or {}
+    except Exception:
+        return None
+
+    valor = metadata.get(clave)
+    if valor is None:
+        return None
+
+    try:
+        return json.loads(valor.decode('utf-8'))
+    except ValueError:
+        return None
+
+
+def _leer_firma_cache(parquet_path):
+    """
+    Devuelve la firma guardada en los metadatos del Parquet, o None si no hay.
+    """
+    return _leer_metadato_cache(parquet_path, CLAVE_FIRMA)
+
+
+def columnas_cache(parquet_path):
+    """
+    Columnas pedidas al escribir la caché (las columnas del Parquet si no se registraron).
+    """
+    columnas = _leer_metadato_cache(parquet_path, CLAVE_COLUMNAS)
+    if columnas is None:
+        try:
+            columnas = pq.read_schema(parquet_path).names
+        except Exception:
+            return []
+    return list(columnas)
+
+
+def cache_vigente(csv_path, parquet_path=None):
+    """
+    Indica si existe una caché Parquet que corresponde al CSV actual.
+    """
+    if not PYARROW_DISPONIBLE:
+        return False
+
+    parquet_path = Path(parquet_path) if parquet_path else ruta_cache_parquet(csv_path)
+    if not parquet_path.exists():
+        return False
+
+    return _leer_firma_cache(parquet_path) == firma_csv(csv_path)
+
+
+def escribir_cache_parquet(df, csv_path, parquet_path=None, columnas=None):
+    """
+    Escribe el DataFrame como Parquet con la firma del CSV y las columnas
+    pedidas (por defecto, las de df) en los metadatos.
+
+    La escritura se hace sobre un fichero temporal y se renombra al final para
+    que otra sesión nunca lea un Parquet a medio escribir.
+
+    Returns:
+        Path | None: ruta del Parquet escrito, o None si no se pudo escribir
+    """
+    if not PYARROW_DISPONIBLE:
+        return None
+
+    parquet_path = Path(parquet_path) if parquet_path else ruta_cache_parquet(csv_path)
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(tabla.schema.metadata or {})
+    metadata[CLAVE_FIRMA] = json.dumps(firma_csv(csv_path)).encode('utf-8')
+    metadata[CLAVE_COLUMNAS] = json.dumps(list(columnas) if columnas is not None else list(df.columns)).encode('utf-8')
+    tabla = tabla.replace_schema_metadata(metadata)
+
+    tmp_path = parquet_path.with_suffix('.parquet.tmp')
+    pq.write_table(tabla, tmp_path, compression='snappy')
+    tmp_path.replace(parquet_path)
+
+    return parquet_path
+
+
+def cargar_listings_con_cache(csv_path, columnas=None, usar_cache=True):
+    """
+    Carga listings_unificado leyendo la caché Parquet si está vigente.
+
+    Si la caché no existe, el CSV ha cambiado (tamaño o fecha distintos) o la
+    caché no incluye alguna de las columnas pedidas, lee el CSV con solo las
+    columnas necesarias (las pedidas y las que ya tenía la caché) y la regenera.
+
+    Args:
+        csv_path: ruta de listings_unificado.csv
+        columnas: columnas a cargar (por defecto COLUMNAS_DASHBOARD)
+        usar_cache: False para forzar la lectura del CSV sin tocar la caché
+
+    Returns:
+        tuple: (DataFrame, dict con 'origen', 'tiempo_carga_s', 'filas',
+               'columnas' y 'ruta_cache')
+    """
+    csv_path = Path(csv_path)
+    columnas = list(columnas) if columnas else list(COLUMNAS_DASHBOARD)
+    parquet_path = ruta_cache_parquet(csv_path)
+
+    inicio = time.perf_counter()
+    origen = 'csv'
+    df = None
+
+    columnas_anteriores = []
+    if usar_cache and cache_vigente(csv_path, parquet_path):
+        columnas_anteriores = columnas_cache(parquet_path)
+        if set(columnas).issubset(columnas_anteriores):
+            try:
+                columnas_parquet = set(pq.read_schema(parquet_path).names)
+                df = pd.read_parquet(
+                    parquet_path,
+                    columns=[col for col in columnas if col in columnas_parquet]
+                )
+                origen = 'parquet'
+            except Exception:
+                # Caché corrupta o ilegible: se regenera desde el CSV
+                df = None
+
+    if df is None:
+        columnas_lectura = list(dict.fromkeys(columnas_anteriores + columnas))
+        columnas_set = set(columnas_lectura)
+        df = pd.read_csv(csv_path, usecols=lambda col: col in columnas_set)
+
+        if usar_cache:
+            try:
+                escribir_cache_parquet(df, csv_path, parquet_path, columnas=columnas_lectura)
+            except Exception:
+                # La caché es una optimización: si falla, seguimos con el CSV
+                pass
+
+        pedidas = set(columnas)
+        df = df[[col for col in df.columns if col in pedidas]]
+
+    info_carga = {
+        'origen': origen,
+        'tiempo_carga_s': time.perf_counter() - inicio,
+        'filas': len(df),
+        'columnas': list(df.columns),
+        'ruta_cache': parquet_path if PYARROW_DISPONIBLE else None,
+    }
+
+    return df, info_carga
@@ -0,0 +1,228 @@
+"""
+Ocupación real a partir de calendar.csv.gz en streaming
+========================================================
+
+cargar_datos_ciudad leía el calendar.csv.gz completo de cada ciudad (una fila
+por listing y día, decenas de millones de filas en Madrid) para después usar
+solo availability_365 como aproximación de la ocupación.
+
+leer_calendario_ocupacion recorre el calendario por bloques de
+TAMANO_BLOQUE_CALENDARIO filas, leyendo solo listing_id, date, available y
+price, y acumula por listing y mes los días del calendario y los días no
+disponibles (available == 'f', reservados o bloqueados por el anfitrión). La
+memoria queda acotada por el tamaño del bloque y por el agregado
+(listings x meses), no por el tamaño del fichero.
+
+A partir de ese agregado mensual:
+
+- ocupacion_por_listing: tasa de ocupación de cada listing por mes, por año
+  o en todo el calendario.
+- ocupacion_por_barrio: tasa de ocupación de cada barrio por mes, por año o
+  en todo el calendario (días ocupados sobre días de calendario de todos sus
+  listings).
+"""
+
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Filas de calendar.csv.gz procesadas en cada bloque
+TAMANO_BLOQUE_CALENDARIO = 1_000_000
+
+# Filas acumuladas de agregados parciales antes de consolidarlos
+MAX_FILAS_PARCIALES = 2_000_000
+
+# Columnas de calendar.csv.gz que se leen (price es opcional)
+COLUMNAS_CALENDARIO = ['listing_id', 'date', 'available', 'price']
+
+# Claves de agrupación del agregado mensual
+CLAVES_MENSUALES = ['listing_id', 'anio', 'mes']
+
+
+def _consolidar(parciales):
+    """
+    Suma agregados parciales con las mismas claves en un único DataFrame.
+    """
+    if len(parciales) == 1:
+        return parciales[0]
+    return (
+        pd.concat(parciales, ignore_index=True)
+        .groupby(CLAVES_MENSUALES, as_index=False, sort=False)[['dias', 'dias_ocupados']]
+        .sum()
+    )
+
+
+def descomponer_fechas(fechas):
+    """
+    Año y mes de una columna de fechas 'YYYY-MM-DD' leída como categoría.
+
+    Cada fecha distinta se convierte una sola vez, no una vez por fila.
+
+    Returns:
+        tuple: (array booleano de fechas válidas, año y mes de las válidas)
+    """
+    categorias = pd.DatetimeIndex(pd.to_datetime(fechas.cat.categories, format='%Y-%m-%d', errors='coerce'))
+    codigos = fechas.cat.codes.to_numpy()
+    validas = codigos >= 0
+    validas[validas] = ~np.isnat(categorias.to_numpy()[codigos[validas]])
+    codigos = codigos[validas]
+    return validas, categorias.year.to_numpy()[codigos].astype('int16'), categorias.month.to_numpy()[codigos].astype('int8')
+
+
+def _agregar_bloque(bloque):
+    """
+    Días de calendario y días ocupados por listing y mes de un bloque.
+    """
+    validas = bloque['listing_id'].notna().to_numpy() & bloque['available'].notna().to_numpy()
+    fechas_validas, anio, mes = descomponer_fechas(bloque['date'])
+    validas_fecha = validas[fechas_validas]
+    validas &= fechas_validas
+
+    agregado = pd.DataFrame({
+        'listing_id': bloque['listing_id'].to_numpy(dtype='int64', na_value=0)[validas],
+        'anio': anio[validas_fecha],
+        'mes': mes[validas_fecha],
+        'dias': np.ones(int(validas.sum()), dtype='int32'),
+        'dias_ocupados': (bloque['available'].to_numpy()[validas] == 'f').astype('int32'),
+    })
+    return agregado.groupby(CLAVES_MENSUALES, as_index=False, sort=False)[['dias', 'dias_ocupados']].sum()
+
+
+def leer_calendario_ocupacion(ruta_calendario, tamano_bloque=TAMANO_BLOQUE_CALENDARIO):
+    """
+    Lee un calendar.csv(.gz) de Inside Airbnb por bloques y agrega la ocupación mensual.
+
+    Args:
+        ruta_calendario: ruta a calendar.csv.gz
+        tamano_bloque: filas leídas en cada bloque
+
+    Returns:
+        tuple: (DataFrame con una fila por listing y mes: 'listing_id',
+            'anio', 'mes', 'dias' y 'dias_ocupados'; dict con 'total_registros',
+            'fechas_nulas', 'disponibilidad_nula', 'precios_nulos', 'listings',
+            'bloques' y 'tiempo_s')
+    """
+    inicio = time.perf_counter()
+    resumen = {
+        'total_registros': 0,
+        'fechas_nulas': 0,
+        'disponibilidad_nula': 0,
+        'precios_nulos': 0,
+        'bloques': 0,
+    }
+
+    lector = pd.read_csv(
+        Path(ruta_calendario),
+        usecols=lambda col: col in COLUMNAS_CALENDARIO,
+        # listing_id como entero con nulos: un bloque con un id vacío no pasa a float64
+        # (que redondea los ids de 18-19 dígitos)
+        dtype={'listing_id': 'Int64', 'date': 'category', 'available': 'category', 'price': 'category'},
+        chunksize=tamano_bloque,
+    )
+
+    parciales = []
+    filas_parciales = 0
+    with lector:
+        for bloque in lector:
+            resumen['total_registros'] += len(bloque)
+            resumen['fechas_nulas'] += int(bloque['date'].isna().sum())
+            resumen['disponibilidad_nula'] += int(bloque['available'].isna().sum())
+            if 'price' in bloque.columns:
+                resumen['precios_nulos'] += int(bloque['price'].isna().sum())
+            resumen['bloques'] += 1
+
+            parcial = _agregar_bloque(bloque)
+            parciales.append(parcial)
+            filas_parciales += len(parcial)
+
+            # Los agregados parciales se suman en cuanto ocupan demasiado
+            if filas_parciales > MAX_FILAS_PARCIALES:
+                parciales = [_consolidar(parciales)]
+                filas_parciales = len(parciales[0])
+
+    if parciales:
+        mensual = _consolidar(parciales).sort_values(CLAVES_MENSUALES, ignore_index=True)
+    else:
+        mensual = pd.DataFrame({
+            'listing_id': pd.Series(dtype='int64'),
+            'anio': pd.Series(dtype='int16'),
+            'mes': pd.Series(dtype='int8'),
+            'dias': pd.Series(dtype='int32'),
+            'dias_ocupados': pd.Series(dtype='int32'),
+        })
+
+    resumen['listings'] = int(mensual['listing_id'].nunique())
+    resumen['tiempo_s'] = time.perf_counter() - inicio
+    return mensual, resumen
+
+
+def _claves_periodo(periodo):
+    """
+    Columnas temporales de agrupación para 'mes', 'anio' o 'total'.
+    """
+    if periodo == 'total':
+        return []
+    if periodo == 'mes':
+        return ['anio', 'mes']
+    if periodo == 'anio':
+        return ['anio']
+    raise ValueError(f"Periodo no válido: {periodo!r} (usa 'mes', 'anio' o 'total')")
+
+
+def _tasa_ocupacion(agregado):
+    """
+    Añade 'tasa_ocupacion_pct' (días ocupados sobre días de calendario).
+    """
+    agregado['tasa_ocupacion_pct'] = (agregado['dias_ocupados'] / agregado['dias'] * 100).round(2)
+    return agregado
+
+
+def ocupacion_por_listing(mensual, periodo='mes'):
+    """
+    Tasa de ocupación de cada listing por mes, por año o en todo el calendario.
+
+    Args:
+        mensual: agregado mensual devuelto por leer_calendario_ocupacion
+        periodo: 'mes', 'anio' o 'total'
+
+    Returns:
+        DataFrame: 'listing_id', columnas del periodo, 'dias', 'dias_ocupados'
+            y 'tasa_ocupacion_pct'
+    """
+    claves = ['listing_id'] + _claves_periodo(periodo)
+    agregado = mensual.groupby(claves, as_index=False)[['dias', 'dias_ocupados']].sum()
+    return _tasa_ocupacion(agregado)
+
+
+def ocupacion_por_barrio(mensual, listings, periodo='mes', columna_barrio='neighbourhood_cleansed'):
+    """
+    Tasa de ocupación de cada barrio por mes, por año o en todo el calendario.
+
+    Los listings del calendario que no están en listings (p. ej. descartados
+    en la limpieza) no se cuentan.
+
+    Args:
+        mensual: agregado mensual devuelto por leer_calendario_ocupacion
+        listings: DataFrame de listings con 'id' y la columna de barrio
+        periodo: 'mes', 'anio' o 'total'
+        columna_barrio: columna de listings con el barrio
+
+    Returns:
+        DataFrame: 'barrio', columnas del periodo, 'listings', 'dias',
+            'dias_ocupados' y 'tasa_ocupacion_pct'
+    """
+    barrio_por_listing = listings.drop_duplicates('id').set_index('id')[columna_barrio]
+    con_barrio = mensual.assign(barrio=mensual['listing_id'].map(barrio_por_listing))
+    con_barrio = con_barrio[con_barrio['barrio'].notna()]
+
+    agregado = (
+        con_barrio.groupby(['barrio'] + _claves_periodo(periodo), as_index=False, observed=True)
+        .agg(
+            listings=('listing_id', 'nunique'),
+            dias=('dias', 'sum'),
+            dias_ocupados=('dias_ocupados', 'sum'),
+        )
+    )
+    return _tasa_ocupacion(agregado)
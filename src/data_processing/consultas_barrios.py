@@ -0,0 +1,440 @@
+"""
+Motor de consultas en memoria sobre los datasets compartidos
+=============================================================
+
+Cada sección del dashboard filtraba los DataFrames del almacén con máscaras
+booleanas sobre la tabla completa (df[df['ciudad'].str.lower() == ...]), a
+menudo tras un .copy() de toda la tabla, y repetía el mismo filtro de ciudad
+en cada rerun de cada slider.
+
+MotorConsultas ejecuta consultas parametrizadas (ciudad, columnas y una lista
+de predicados) sobre las tablas del almacén, sin SQL textual y sin copiar las
+tablas:
+
+- Particiones: la primera consulta a una tabla agrupa sus filas por ciudad
+  (en minúsculas) y guarda las posiciones de cada ciudad. El filtro de ciudad
+  no recorre la tabla: selecciona directamente las posiciones de su partición.
+- Empuje de predicados: cada predicado (columna, operador, valor) se evalúa
+  solo sobre las posiciones que han superado los anteriores, leyendo
+  únicamente la columna que necesita (array de NumPy guardado por columna).
+- Índices de umbral: para las columnas numéricas se guarda, por ciudad, un
+  IndiceUmbral con los valores ordenados, sus posiciones y sus sumas
+  acumuladas. El primer predicado de rango (>, >=, <, <=) de una consulta se
+  resuelve por búsqueda binaria en O(log n) en lugar de recorrer la
+  partición, y el número de filas, el máximo o un cuantil por encima de un
+  umbral se obtienen sin materializar filas.
+- Rankings: los top-k por ciudad y métrica (antes nlargest en cada pestaña)
+  salen de un IndiceRanking por tabla, columna y ciudad, construido por
+  selección parcial y compartido por todas las pestañas, que también da la
+  posición de un barrio en el ranking.
+- Proyección: el resultado se materializa al final, con solo las columnas
+  pedidas y las filas seleccionadas, en el mismo orden y con el mismo índice
+  que la máscara booleana equivalente.
+
+Los resultados son DataFrames nuevos: el llamador puede modificarlos sin
+alterar los datos compartidos.
+"""
+
+import operator
+import threading
+
+import numpy as np
+import pandas as pd
+
+COLUMNA_PARTICION = 'ciudad'
+
+# Columna con el nombre del barrio (etiqueta de las filas de los rankings)
+COLUMNA_BARRIO = 'barrio'
+
+# Filas que se ordenan al construir un ranking (los top del dashboard son de 5, 10 y 15)
+PROFUNDIDAD_RANKING = 50
+
+# Operadores de comparación admitidos en los predicados (además de 'in')
+OPERADORES = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+# Operadores que se resuelven con el índice de umbral de la columna
+OPERADORES_RANGO = ('>', '>=', '<', '<=')
+
+
+def _array_columna(serie):
+    """
+    Valores de una columna como array de NumPy para evaluar predicados.
+
+    Las columnas numéricas de pandas con nulos (Int64, Float64...) pasan a
+    float64 con NaN; el resto se entrega tal cual o como objetos.
+    """
+    if isinstance(serie.dtype, np.dtype):
+        return serie.to_numpy()
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.to_numpy(dtype='float64', na_value=np.nan)
+    return serie.to_numpy(dtype=object)
+
+
+def _evaluar_predicado(valores, operador, valor):
+    """
+    Máscara booleana de un predicado sobre los valores candidatos de una columna.
+    """
+    if operador == 'in':
+        return pd.Series(valores).isin(list(valor)).to_numpy()
+    if operador not in OPERADORES:
+        raise ValueError(f"Operador no admitido: {operador!r}")
+    if valores.dtype == object:
+        # Comparación elemento a elemento con nulos como no coincidentes
+        return pd.Series(valores, dtype=object).pipe(OPERADORES[operador], valor).fillna(False).to_numpy(dtype=bool)
+    return np.asarray(OPERADORES[operador](valores, valor), dtype=bool)
+
+
+class IndiceUmbral:
+    """
+    Valores no nulos de una columna numérica ordenados, con sus posiciones en
+    la tabla y sus sumas acumuladas, para responder umbrales por búsqueda binaria.
+
+    Args:
+        valores: array de valores de la columna (numérico)
+        posiciones: posiciones en la tabla de cada valor
+    """
+
+    def __init__(self, valores, posiciones):
+        valores = np.asarray(valores)
+        posiciones = np.asarray(posiciones)
+        if valores.dtype.kind == 'f':
+            validos = ~np.isnan(valores)
+            valores, posiciones = valores[validos], posiciones[validos]
+        orden = np.argsort(valores, kind='stable')
+        self.valores = valores[orden]
+        self.posiciones = posiciones[orden]
+        self.sumas = np.concatenate([[0], np.cumsum(self.valores)])
+
+    def __len__(self):
+        return len(self.valores)
+
+    def _rango(self, operador, umbral):
+        """
+        Tramo [inicio, fin) de los valores ordenados que cumplen `valor operador umbral`.
+        """
+        if pd.isna(umbral):
+            return 0, 0
+        n = len(self.valores)
+        if operador == '>':
+            return int(np.searchsorted(self.valores, umbral, side='right')), n
+        if operador == '>=':
+            return int(np.searchsorted(self.valores, umbral, side='left')), n
+        if operador == '<':
+            return 0, int(np.searchsorted(self.valores, umbral, side='left'))
+        if operador == '<=':
+            return 0, int(np.searchsorted(self.valores, umbral, side='right'))
+        raise ValueError(f"Operador no admitido: {operador!r}")
+
+    def seleccionar(self, operador, umbral):
+        """
+        Posiciones (en orden de la tabla) de las filas que cumplen el umbral.
+        """
+        inicio, fin = self._rango(operador, umbral)
+        return np.sort(self.posiciones[inicio:fin])
+
+    def resumen(self, operador, umbral):
+        """
+        Número de filas, suma, mínimo y máximo de los valores que cumplen el umbral.
+        """
+        inicio, fin = self._rango(operador, umbral)
+        if fin <= inicio:
+            return {'filas': 0, 'suma': 0, 'minimo': np.nan, 'maximo': np.nan}
+        return {
+            'filas': fin - inicio,
+            'suma': self.sumas[fin] - self.sumas[inicio],
+            'minimo': self.valores[inicio],
+            'maximo': self.valores[fin - 1],
+        }
+
+    def maximo(self):
+        return self.valores[-1] if len(self.valores) else np.nan
+
+    def cuantil(self, q):
+        """
+        Cuantil con interpolación lineal (mismo resultado que Series.quantile).
+        """
+        n = len(self.valores)
+        if n == 0:
+            return np.nan
+        h = q * (n - 1)
+        inferior = int(np.floor(h))
+        superior = min(inferior + 1, n - 1)
+        a, b = float(self.valores[inferior]), float(self.valores[superior])
+        t = h - inferior
+        # Misma forma de interpolar que NumPy (desde el extremo más cercano)
+        return b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+
+
+class IndiceRanking:
+    """
+    Ranking descendente de una columna numérica, en el mismo orden que
+    nlargest (a igual valor, primero la fila anterior de la tabla; las filas
+    sin valor, al final).
+
+    Solo se ordenan las `profundidad` primeras filas, seleccionadas con
+    np.argpartition en O(n); si se pide un top mayor, el ranking se amplía. La
+    posición de cada fila en el ranking completo se calcula al primer uso de
+    rango.
+
+    Args:
+        valores: array de valores de la columna (numérico)
+        posiciones: posiciones en la tabla de cada valor
+        etiquetas: etiqueta de cada fila para rango (por defecto, su posición)
+        profundidad: filas ordenadas inicialmente
+    """
+
+    def __init__(self, valores, posiciones, etiquetas=None, profundidad=PROFUNDIDAD_RANKING):
+        valores = np.asarray(valores)
+        posiciones = np.asarray(posiciones)
+        etiquetas = posiciones if etiquetas is None else np.asarray(etiquetas)
+        self._posiciones_nulas = np.empty(0, dtype=posiciones.dtype)
+        if valores.dtype.kind == 'f':
+            validos = ~np.isnan(valores)
+            self._posiciones_nulas = posiciones[~validos]
+            valores, posiciones, etiquetas = valores[validos], posiciones[validos], etiquetas[validos]
+        self._valores = valores
+        self._posiciones = posiciones
+        self._etiquetas = etiquetas
+        # Clave de orden ascendente equivalente al orden descendente de los valores
+        self._clave = -valores if valores.dtype.kind in 'if' else -valores.astype('float64')
+        self._orden = np.empty(0, dtype=np.intp)
+        self._rangos = None
+        self._lock = threading.Lock()
+        self._ampliar(profundidad)
+
+    def __len__(self):
+        return len(self._valores)
+
+    def _ordenar(self, seleccion):
+        """
+        Índices seleccionados ordenados por valor descendente y posición ascendente.
+        """
+        return seleccion[np.lexsort((self._posiciones[seleccion], self._clave[seleccion]))]
+
+    def _ampliar(self, profundidad):
+        n = len(self._valores)
+        if profundidad >= n:
+            self._orden = self._ordenar(np.arange(n))
+            return
+        # Selección parcial: las filas con valor >= el profundidad-ésimo mayor (incluidos empates)
+        k = n - profundidad
+        umbral = self._valores[np.argpartition(self._valores, k)[k]]
+        self._orden = self._ordenar(np.flatnonzero(self._valores >= umbral))[:profundidad]
+
+    def top(self, k):
+        """
+        Posiciones en la tabla de las k filas con mayor valor, en orden de ranking.
+        """
+        if k > len(self._orden) and len(self._orden) < len(self._valores):
+            with self._lock:
+                if k > len(self._orden):
+                    self._ampliar(max(k, 2 * len(self._orden)))
+        posiciones = self._posiciones[self._orden[:k]]
+        if k > len(posiciones) and len(self._posiciones_nulas):
+            posiciones = np.concatenate([posiciones, self._posiciones_nulas[:k - len(posiciones)]])
+        return posiciones
+
+    def rango(self, etiqueta):
+        """
+        Puesto (1 = mayor valor) de una fila por su etiqueta, o None si no está en el ranking.
+        """
+        if self._rangos is None:
+            with self._lock:
+                if self._rangos is None:
+                    orden = self._ordenar(np.arange(len(self._valores)))
+                    # Recorrido inverso: con etiquetas repetidas queda el mejor puesto
+                    self._rangos = dict(zip(
+                        self._etiquetas[orden][::-1].tolist(), range(len(orden), 0, -1)
+                    ))
+        return self._rangos.get(etiqueta)
+
+
+class MotorConsultas:
+    """
+    Consultas parametrizadas con particiones por ciudad sobre un dict de DataFrames.
+
+    Args:
+        tablas: diccionario nombre -> DataFrame (no se copian)
+        columna_particion: columna por la que se particionan las tablas
+    """
+
+    def __init__(self, tablas, columna_particion=COLUMNA_PARTICION):
+        self._tablas = {
+            nombre: df for nombre, df in (tablas or {}).items() if isinstance(df, pd.DataFrame)
+        }
+        self._columna_particion = columna_particion
+        self._particiones = {}
+        self._columnas = {}
+        self._indices_umbral = {}
+        self._rankings = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, tabla):
+        return tabla in self._tablas
+
+    def _particion(self, tabla):
+        """
+        Posiciones de las filas de cada ciudad (en minúsculas), o None si la
+        tabla no tiene columna de partición. Se calcula al primer uso.
+        """
+        with self._lock:
+            if tabla in self._particiones:
+                return self._particiones[tabla]
+
+        df = self._tablas[tabla]
+        particion = None
+        if self._columna_particion in df.columns:
+            grupos = {}
+            posiciones = df.groupby(self._columna_particion, sort=False, observed=True).indices
+            for clave, pos in posiciones.items():
+                grupos.setdefault(str(clave).lower(), []).append(pos)
+            particion = {
+                clave: np.sort(np.concatenate(partes)) if len(partes) > 1 else partes[0]
+                for clave, partes in grupos.items()
+            }
+
+        with self._lock:
+            return self._particiones.setdefault(tabla, particion)
+
+    def _columna(self, tabla, columna):
+        clave = (tabla, columna)
+        with self._lock:
+            if clave in self._columnas:
+                return self._columnas[clave]
+        valores = _array_columna(self._tablas[tabla][columna])
+        with self._lock:
+            return self._columnas.setdefault(clave, valores)
+
+    def _candidatas(self, tabla, ciudad):
+        """
+        Posiciones de la partición de una ciudad (todas las filas si ciudad es
+        None o la tabla no tiene columna de ciudad).
+        """
+        particion = self._particion(tabla) if ciudad is not None else None
+        if particion is not None:
+            return particion.get(str(ciudad).lower(), np.empty(0, dtype=np.intp))
+        return np.arange(len(self._tablas[tabla]))
+
+    def _indexable(self, tabla, columna):
+        return (
+            columna in self._tablas[tabla].columns
+            and self._columna(tabla, columna).dtype.kind in 'iuf'
+        )
+
+    def indice_umbral(self, tabla, columna, ciudad=None):
+        """
+        IndiceUmbral de una columna numérica en las filas de una ciudad (se construye al primer uso).
+        """
+        clave = (tabla, columna, str(ciudad).lower() if ciudad is not None else None)
+        with self._lock:
+            if clave in self._indices_umbral:
+                return self._indices_umbral[clave]
+
+        if not self._indexable(tabla, columna):
+            raise ValueError(f"La columna {columna!r} de {tabla!r} no es numérica")
+        candidatas = self._candidatas(tabla, ciudad)
+        indice = IndiceUmbral(self._columna(tabla, columna)[candidatas], candidatas)
+
+        with self._lock:
+            return self._indices_umbral.setdefault(clave, indice)
+
+    def ranking(self, tabla, columna, ciudad=None):
+        """
+        IndiceRanking de una columna numérica en las filas de una ciudad, con
+        los barrios como etiquetas si la tabla los tiene (se construye al primer uso).
+        """
+        clave = (tabla, columna, str(ciudad).lower() if ciudad is not None else None)
+        with self._lock:
+            if clave in self._rankings:
+                return self._rankings[clave]
+
+        if not self._indexable(tabla, columna):
+            raise ValueError(f"La columna {columna!r} de {tabla!r} no es numérica")
+        candidatas = self._candidatas(tabla, ciudad)
+        etiquetas = None
+        if COLUMNA_BARRIO in self._tablas[tabla].columns:
+            etiquetas = self._columna(tabla, COLUMNA_BARRIO)[candidatas]
+        indice = IndiceRanking(self._columna(tabla, columna)[candidatas], candidatas, etiquetas)
+
+        with self._lock:
+            return self._rankings.setdefault(clave, indice)
+
+    def top(self, tabla, columna, k, ciudad=None, columnas=None):
+        """
+        Las k filas con mayor valor de una columna (mismo resultado que nlargest(k, columna)).
+
+        Returns:
+            DataFrame: filas en orden de ranking, con el índice de la tabla
+        """
+        df = self._tablas[tabla]
+        pos = self.ranking(tabla, columna, ciudad).top(k)
+        if columnas is not None:
+            df = df[[col for col in columnas if col in df.columns]]
+        return df.take(pos)
+
+    def posiciones(self, tabla, ciudad=None, filtros=None):
+        """
+        Posiciones (ordenadas) de las filas que cumplen la consulta.
+
+        Args:
+            tabla: nombre de la tabla
+            ciudad: ciudad a seleccionar (sin distinguir mayúsculas); se ignora
+                si la tabla no tiene columna de ciudad
+            filtros: lista de predicados (columna, operador, valor) con
+                operador en OPERADORES o 'in' (valor: lista de valores). El
+                primer predicado de rango sobre una columna numérica se
+                resuelve con su índice de umbral.
+
+        Returns:
+            np.ndarray: posiciones de las filas en la tabla
+        """
+        df = self._tablas[tabla]
+        filtros = list(filtros or [])
+        rango = next(
+            (f for f in filtros if f[1] in OPERADORES_RANGO and self._indexable(tabla, f[0])),
+            None
+        )
+        if rango is not None:
+            filtros.remove(rango)
+            columna, operador, valor = rango
+            candidatas = self.indice_umbral(tabla, columna, ciudad).seleccionar(operador, valor)
+        else:
+            candidatas = self._candidatas(tabla, ciudad)
+
+        for columna, operador, valor in filtros:
+            if len(candidatas) == 0:
+                break
+            if columna not in df.columns:
+                raise KeyError(columna)
+            mascara = _evaluar_predicado(self._columna(tabla, columna)[candidatas], operador, valor)
+            candidatas = candidatas[mascara]
+        return candidatas
+
+    def consultar(self, tabla, ciudad=None, columnas=None, filtros=None):
+        """
+        Filas de una tabla que cumplen la consulta (ver posiciones).
+
+        Args:
+            columnas: columnas del resultado (por defecto, todas)
+
+        Returns:
+            DataFrame: filas seleccionadas, en el orden y con el índice de la tabla
+        """
+        df = self._tablas[tabla]
+        pos = self.posiciones(tabla, ciudad=ciudad, filtros=filtros)
+        if columnas is not None:
+            df = df[[col for col in columnas if col in df.columns]]
+        return df.take(pos)
+
+    def contar(self, tabla, ciudad=None, filtros=None):
+        """
+        Número de filas que cumplen la consulta, sin materializarlas.
+        """
+        return len(self.posiciones(tabla, ciudad=ciudad, filtros=filtros))
@@ -0,0 +1,141 @@
+"""
+Esquema de tipos compactos para los listings unificados
+========================================================
+
+listings_precios guardaba ciudad, barrio, tipo de alojamiento y licencia como
+cadenas (object) y los numéricos como float64/int64. Este módulo declara el
+esquema del DataFrame unificado y lo aplica al cargarlo:
+
+- Cadenas de baja cardinalidad como category (un código por fila y una sola
+  copia de cada valor).
+- Coordenadas en float32 (precisión inferior al metro a estas latitudes) y
+  disponibilidad en int16.
+- El precio se mantiene en float64: todas las medias de precio de los KPIs
+  se calculan sobre él.
+- La licencia se guarda como bool (un byte por fila): True/False tal cual y,
+  si llega el texto de Inside Airbnb, True cuando hay un número de licencia
+  (como en la ingesta).
+
+Las columnas enteras con nulos usan el tipo nullable equivalente (Int16,
+Int64) en lugar de fallar o pasar a float. aplicar_esquema valida que estén
+las columnas obligatorias (si no, lanza ValueError); los valores que no se
+pueden convertir al tipo declarado (textos en columnas numéricas, decimales o
+valores fuera de rango en columnas enteras) quedan como nulos y se cuentan
+por columna en el informe, sin impedir la carga. El informe incluye también
+la memoria antes y después.
+"""
+
+import numpy as np
+import pandas as pd
+
+BYTES_POR_MB = 1024 * 1024
+
+# Tipo declarado de cada columna de listings_unificado que usa el dashboard
+ESQUEMA_LISTINGS = {
+    'id': 'int64',
+    'ciudad': 'category',
+    'neighbourhood_cleansed': 'category',
+    'room_type': 'category',
+    'license': 'bool',
+    'price': 'float64',
+    'availability_365': 'int16',
+    'latitude': 'float32',
+    'longitude': 'float32',
+}
+
+COLUMNAS_OBLIGATORIAS = ['ciudad', 'neighbourhood_cleansed', 'price']
+
+
+def _convertir_columna(serie, tipo):
+    """
+    Convierte una columna al tipo del esquema.
+
+    Returns:
+        tuple: (Series convertida, número de valores no nulos que no se
+            pudieron convertir y quedan como nulos)
+    """
+    if tipo == 'category':
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            return serie, 0
+        return serie.astype('category'), 0
+
+    if tipo == 'bool':
+        if pd.api.types.is_bool_dtype(serie):
+            return serie, 0
+        # Texto de Inside Airbnb: con número de licencia -> True; vacío, nulo o 'False' -> False
+        texto = serie.astype('string').str.strip().fillna('')
+        return ((texto != '') & (texto != 'False')).astype('bool'), 0
+
+    valores = pd.to_numeric(serie, errors='coerce')
+    if tipo.startswith('int'):
+        limites = np.iinfo(tipo)
+        valores = valores.where(
+            (valores % 1 == 0) & valores.between(limites.min, limites.max)
+        )
+    invalidos = int((valores.isna() & serie.notna()).sum())
+    if tipo.startswith('int') and valores.isna().any():
+        return valores.astype(tipo.capitalize()), invalidos
+    return valores.astype(tipo), invalidos
+
+
+def memoria_columnas(df):
+    """
+    Memoria en bytes de cada columna (incluye el contenido de las cadenas).
+    """
+    return df.memory_usage(index=False, deep=True)
+
+
+def aplicar_esquema(df, esquema=None):
+    """
+    Valida los listings contra el esquema y convierte las columnas a tipos compactos.
+
+    Las columnas que no están en el esquema se conservan sin cambios.
+
+    Args:
+        df: DataFrame de listings unificado
+        esquema: diccionario columna -> tipo (por defecto ESQUEMA_LISTINGS)
+
+    Returns:
+        tuple: (DataFrame con el esquema aplicado, dict con 'mb_antes',
+            'mb_despues', 'reduccion_pct', 'columnas' (tabla por columna con
+            tipo anterior, tipo nuevo, MB antes y después y valores no
+            convertibles) y 'valores_invalidos' (dict columna -> número de
+            valores que quedaron como nulos, solo las columnas con alguno))
+
+    Raises:
+        ValueError: si faltan columnas obligatorias
+    """
+    esquema = esquema or ESQUEMA_LISTINGS
+    faltan = [col for col in COLUMNAS_OBLIGATORIAS if col not in df.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas obligatorias en los listings: {', '.join(faltan)}")
+
+    memoria_antes = memoria_columnas(df)
+    tipos_antes = df.dtypes.astype(str)
+
+    conversiones, invalidos = {}, {}
+    for col, tipo in esquema.items():
+        if col in df.columns:
+            conversiones[col], invalidos[col] = _convertir_columna(df[col], tipo)
+    compacto = df.assign(**conversiones)
+
+    memoria_despues = memoria_columnas(compacto)
+    columnas = pd.DataFrame({
+        'tipo_antes': tipos_antes,
+        'tipo_despues': compacto.dtypes.astype(str),
+        'mb_antes': memoria_antes / BYTES_POR_MB,
+        'mb_despues': memoria_despues / BYTES_POR_MB,
+        'valores_invalidos': pd.Series(invalidos, dtype='int64'),
+    })
+    columnas['valores_invalidos'] = columnas['valores_invalidos'].fillna(0).astype('int64')
+
+    mb_antes = memoria_antes.sum() / BYTES_POR_MB
+    mb_despues = memoria_despues.sum() / BYTES_POR_MB
+    informe = {
+        'mb_antes': mb_antes,
+        'mb_despues': mb_despues,
+        'reduccion_pct': (1 - mb_despues / mb_antes) * 100 if mb_antes else 0.0,
+        'columnas': columnas,
+        'valores_invalidos': {col: n for col, n in invalidos.items() if n},
+    }
+    return compacto, informe
@@ -0,0 +1,254 @@
+"""
+Ingesta de ciudades en paralelo (un proceso por ciudad)
+========================================================
+
+El notebook persona_a cargaba, validaba, limpiaba y unificaba las ciudades
+de CIUDADES una detrás de otra, así que el tiempo total era la suma de todas.
+Cada ciudad es independiente hasta la unión final: procesar_ciudad hace todo
+el trabajo de una ciudad (carga con calendario y reseñas en streaming,
+validación de calidad, limpieza de coordenadas y precios y su parte del
+dataset unificado) e ingerir_ciudades lo reparte en un ProcessPoolExecutor.
+
+- Cada ciudad se ejecuta en un proceso nuevo (max_tasks_per_child=1), de modo
+  que la memoria máxima registrada es la de esa ciudad. max_tasks_per_child
+  solo existe desde Python 3.11: en 3.9 y 3.10 los procesos se reutilizan y
+  la memoria máxima de una ciudad puede incluir la de otra anterior del mismo
+  proceso (memoria_inicial_mb lo deja ver).
+- Los resultados se devuelven en el orden de la lista de ciudades, sea cual
+  sea el orden en que terminen, y el dataset unificado se concatena en ese
+  mismo orden: la salida es idéntica a la ejecución secuencial.
+- Cada ciudad deja un registro con su tiempo, su memoria y el número de filas
+  procesadas (o el error, si la carga falló).
+
+Las funciones de procesado reproducen las celdas del notebook sin imprimir,
+porque se ejecutan en otros procesos.
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from src.data_processing.calendario_ocupacion import leer_calendario_ocupacion, ocupacion_por_listing
+from src.data_processing.memoria import memoria_proceso_mb
+from src.data_processing.precios import convertir_precios, mascara_precios_validos
+from src.data_processing.resenas_actividad import leer_resenas_mensuales
+
+try:
+    import geopandas as gpd
+except ImportError:
+    gpd = None
+
+# Rangos de coordenadas válidos por ciudad
+RANGOS_COORDENADAS = {
+    'madrid': {'lat_min': 40.2, 'lat_max': 40.7, 'lng_min': -4.0, 'lng_max': -3.4},
+    'barcelona': {'lat_min': 41.2, 'lat_max': 41.6, 'lng_min': 1.9, 'lng_max': 2.4},
+    'mallorca': {'lat_min': 39.2, 'lat_max': 39.9, 'lng_min': 2.3, 'lng_max': 3.5},
+}
+
+# Un proceso nuevo por ciudad (el argumento solo existe desde Python 3.11)
+OPCIONES_POOL = {'max_tasks_per_child': 1} if sys.version_info >= (3, 11) else {}
+
+# Columnas de barrio posibles en listings.csv, por orden de preferencia
+COLUMNAS_BARRIO = ['neighbourhood_cleansed', 'neighbourhood', 'neighborhood_cleansed', 'neighborhood']
+
+# Columnas del dataset unificado: las del notebook más 'price' (precio limpio) y
+# 'license' (con o sin licencia), que son las que lee el dashboard
+COLUMNAS_UNIFICADO = [
+    'id', 'ciudad', 'name', 'neighbourhood_cleansed', 'distrito',
+    'latitude', 'longitude', 'room_type', 'accommodates',
+    'price', 'price_clean', 'minimum_nights', 'availability_365', 'license', 'ocupacion_calendario_pct',
+]
+
+
+def cargar_datos_ciudad(ciudad, directorio_raw):
+    """
+    Carga los ficheros de Inside Airbnb de una ciudad (calendario y reseñas en streaming).
+
+    Returns:
+        dict: 'listings', 'ocupacion_calendario', 'resumen_calendario',
+            'resenas_mensuales', 'resumen_resenas', 'neighbourhoods' y
+            'neighbourhoods_geo' (None si geopandas no está instalado)
+    """
+    ruta_ciudad = Path(directorio_raw) / ciudad
+
+    datos = {'listings': pd.read_csv(ruta_ciudad / 'listings.csv')}
+    datos['ocupacion_calendario'], datos['resumen_calendario'] = leer_calendario_ocupacion(
+        ruta_ciudad / 'calendar.csv.gz'
+    )
+    datos['resenas_mensuales'], datos['resumen_resenas'] = leer_resenas_mensuales(ruta_ciudad / 'reviews.csv.gz')
+    datos['neighbourhoods'] = pd.read_csv(ruta_ciudad / 'neighbourhoods.csv')
+    datos['neighbourhoods_geo'] = gpd.read_file(ruta_ciudad / 'neighbourhoods.geojson') if gpd is not None else None
+
+    for clave in ['listings', 'ocupacion_calendario', 'resenas_mensuales', 'neighbourhoods', 'neighbourhoods_geo']:
+        if datos[clave] is not None:
+            datos[clave]['ciudad'] = ciudad
+    return datos
+
+
+def validar_calidad_datos(datos):
+    """
+    Indicadores de calidad de listings, calendario y reseñas de una ciudad.
+    """
+    listings = datos['listings']
+    columna_barrio = next((col for col in COLUMNAS_BARRIO if col in listings.columns), None)
+
+    return {
+        'listings': {
+            'total_registros': len(listings),
+            'duplicados_id': int(listings['id'].duplicated().sum()),
+            'coordenadas_nulas': int(listings[['latitude', 'longitude']].isnull().any(axis=1).sum()),
+            'precios_nulos': int(listings['price'].isnull().sum()) if 'price' in listings.columns else 0,
+            'precios_cero': int((listings['price'] == 0).sum()) if 'price' in listings.columns else 0,
+            'barrios_nulos': int(listings[columna_barrio].isnull().sum()) if columna_barrio else 0,
+            'columna_barrio_encontrada': columna_barrio,
+        },
+        'calendar': {
+            'total_registros': datos['resumen_calendario']['total_registros'],
+            'fechas_nulas': datos['resumen_calendario']['fechas_nulas'],
+            'disponibilidad_nula': datos['resumen_calendario']['disponibilidad_nula'],
+            'precios_calendar_nulos': datos['resumen_calendario']['precios_nulos'],
+        },
+        'reviews': {
+            'total_registros': datos['resumen_resenas']['total_registros'],
+            'fechas_nulas': datos['resumen_resenas']['fechas_nulas'],
+        },
+    }
+
+
+def limpiar_coordenadas(listings, ciudad):
+    """
+    Listings con coordenadas dentro del rango de su ciudad (sin cambios si no hay rango).
+    """
+    rangos = RANGOS_COORDENADAS.get(ciudad)
+    if rangos is None:
+        return listings
+
+    validas = (
+        listings['latitude'].between(rangos['lat_min'], rangos['lat_max'])
+        & listings['longitude'].between(rangos['lng_min'], rangos['lng_max'])
+    )
+    return listings[validas].copy()
+
+
+def limpiar_precios(listings):
+    """
+    Añade 'price_clean' y descarta los precios nulos, <= 0 o fuera de los percentiles 1 y 99.
+    """
+    if 'price' not in listings.columns:
+        return listings
+
+    listings['price_clean'] = convertir_precios(listings['price'])
+    mascara, _, _ = mascara_precios_validos(listings['price_clean'])
+    return listings[mascara].copy()
+
+
+def unificar_ciudad(datos, ciudad):
+    """
+    Parte de una ciudad del dataset unificado a partir de sus datos limpios
+    (listings con 'price_clean' y ocupación del calendario).
+
+    Incluye las columnas de listings_unificado.csv que consume el dashboard:
+    'price' con el precio ya limpio y 'license' como booleano (True si el
+    listing declara un número de licencia).
+    """
+    df = datos['listings'].copy()
+    df['ciudad'] = ciudad
+
+    # Estandarizar nombres de columnas importantes
+    if 'neighbourhood' in df.columns:
+        df['neighbourhood_cleansed'] = df['neighbourhood']
+    elif 'neighborhood' in df.columns:
+        df['neighbourhood_cleansed'] = df['neighborhood']
+
+    # Ocupación real del calendario (días no disponibles / días de calendario)
+    ocupacion_listing = ocupacion_por_listing(datos['ocupacion_calendario'], periodo='total')
+    df['ocupacion_calendario_pct'] = df['id'].map(ocupacion_listing.set_index('listing_id')['tasa_ocupacion_pct'])
+
+    if 'neighbourhood_cleansed' in df.columns:
+        df['distrito'] = df['neighbourhood_cleansed']
+
+    # Columnas del dashboard: precio numérico y licencia declarada o no
+    if 'price_clean' in df.columns:
+        df['price'] = df['price_clean']
+    if 'license' in df.columns:
+        df['license'] = (df['license'].astype('string').str.strip().fillna('') != '').astype('bool')
+
+    return df[[col for col in COLUMNAS_UNIFICADO if col in df.columns]].copy()
+
+
+def procesar_ciudad(ciudad, directorio_raw):
+    """
+    Carga, valida, limpia y unifica una ciudad (se ejecuta en un proceso del pool).
+
+    Returns:
+        dict: 'datos' (ficheros cargados, o None si la carga falló),
+            'validaciones', 'limpios' (listings limpios y resto de datos),
+            'unificado' (parte de la ciudad del dataset unificado) y
+            'registro' (ciudad, pid, tiempo_s, memoria_inicial_mb,
+            memoria_pico_mb, filas de listings antes y después de limpiar y
+            error)
+    """
+    inicio = time.perf_counter()
+    registro = {'ciudad': ciudad, 'pid': os.getpid(), 'memoria_inicial_mb': memoria_proceso_mb(), 'error': None}
+    resultado = {'datos': None, 'validaciones': None, 'limpios': None, 'unificado': None}
+
+    try:
+        datos = cargar_datos_ciudad(ciudad, directorio_raw)
+        listings_limpios = limpiar_precios(limpiar_coordenadas(datos['listings'], ciudad))
+
+        resultado['datos'] = datos
+        resultado['validaciones'] = validar_calidad_datos(datos)
+        resultado['limpios'] = {
+            'listings': listings_limpios,
+            'ocupacion_calendario': datos['ocupacion_calendario'],
+            'resenas_mensuales': datos['resenas_mensuales'],
+            'neighbourhoods': datos['neighbourhoods'],
+            'neighbourhoods_geo': datos['neighbourhoods_geo'],
+        }
+        resultado['unificado'] = unificar_ciudad(resultado['limpios'], ciudad)
+        registro['listings'] = len(datos['listings'])
+        registro['listings_limpios'] = len(listings_limpios)
+    except Exception as e:
+        registro['error'] = str(e)
+
+    registro['tiempo_s'] = time.perf_counter() - inicio
+    registro['memoria_pico_mb'] = memoria_proceso_mb()
+    resultado['registro'] = registro
+    return resultado
+
+
+def ingerir_ciudades(ciudades, directorio_raw, procesos=None):
+    """
+    Procesa cada ciudad en su propio proceso y une los resultados en orden.
+
+    Args:
+        ciudades: lista de ciudades (define el orden de la salida)
+        directorio_raw: directorio con una carpeta de Inside Airbnb por ciudad
+        procesos: procesos simultáneos (por defecto, uno por ciudad hasta el
+            número de núcleos); con 1 las ciudades se procesan de una en una
+
+    Returns:
+        tuple: (dict ciudad -> resultado de procesar_ciudad en el orden de
+            ciudades, DataFrame unificado de todas las ciudades, DataFrame con
+            el registro de tiempo y memoria de cada ciudad)
+    """
+    ciudades = list(ciudades)
+    procesos = procesos or min(len(ciudades), os.cpu_count() or 1)
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(procesos, 1), **OPCIONES_POOL) as pool:
+        futuros = {ciudad: pool.submit(procesar_ciudad, ciudad, str(directorio_raw)) for ciudad in ciudades}
+        resultados = {ciudad: futuros[ciudad].result() for ciudad in ciudades}
+    tiempo_total = time.perf_counter() - inicio
+
+    partes = [r['unificado'] for r in resultados.values() if r['unificado'] is not None]
+    unificado = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+    registros = pd.DataFrame([r['registro'] for r in resultados.values()])
+    registros.attrs['tiempo_total_s'] = tiempo_total
+    registros.attrs['procesos'] = procesos
+    return resultados, unificado, registros
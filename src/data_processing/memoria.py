@@ -0,0 +1,31 @@
+"""
+Memoria máxima del proceso
+==========================
+
+El informe de memoria del dashboard (almacen_compartido) y el registro de
+cada ciudad de la ingesta en paralelo (ingesta_ciudades) leen la memoria
+residente máxima del proceso con resource.getrusage. ru_maxrss está en KB en
+Linux y en bytes en macOS; memoria_proceso_mb la devuelve en MB en ambos.
+En Windows el módulo resource no existe y devuelve None.
+"""
+
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BYTES_POR_MB = 1024 * 1024
+
+# Bytes por unidad de ru_maxrss: bytes en macOS y KB en Linux
+BYTES_RU_MAXRSS = 1 if sys.platform == 'darwin' else 1024
+
+
+def memoria_proceso_mb():
+    """
+    Memoria residente máxima del proceso en MB, o None si no está disponible.
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * BYTES_RU_MAXRSS / BYTES_POR_MB
@@ -0,0 +1,463 @@
+"""
+Pipeline por lotes: ingesta → KPIs → clustering → predicciones
+===============================================================
+
+La cadena completa solo se podía ejecutar abriendo a mano los notebooks
+persona_a y persona_b, en orden, lo que impide programarla o perfilarla.
+Este módulo ejecuta las mismas funciones como etapas desde la línea de
+comandos:
+
+    ingesta         data/raw/<ciudad>/*            → listings_unificado.csv, ocupación y reseñas por barrio
+    kpis_basicos    listings_unificado.csv         → kpis_por_ciudad.csv, kpis_por_barrio.csv
+    impacto_urbano  kpis_por_ciudad.csv            → kpis_impacto_urbano.csv
+    almacen_kpis    listings_unificado.csv         → kpis/manifiesto.json (almacén del dashboard)
+    clustering      kpis_por_barrio.csv            → barrios_clustering.csv
+    predicciones    kpis_impacto_urbano.csv        → predicciones_impacto_urbano.csv
+    base_datos      CSV procesados                 → airbnb_consultores_turismo.db (SQLite)
+
+El estado de cada etapa se guarda en data/processed/cache/pipeline.json: una
+huella (SHA-1 del nombre de la etapa, del código de los módulos que usa, de
+sus parámetros y del contenido de sus ficheros de entrada) y el SHA-1 de
+cada salida. Una etapa se omite si su huella no ha cambiado y sus salidas
+siguen en disco sin modificar. Los hashes de los ficheros se reutilizan
+mientras no cambien su tamaño ni su fecha de modificación, así que una
+ejecución sin cambios no vuelve a leer los CSV.
+
+Como las entradas se comparan por contenido, si una etapa se repite y
+produce las mismas salidas, las etapas siguientes se siguen omitiendo.
+
+La ingesta necesita los ficheros de Inside Airbnb en data/raw; si no están,
+se omite y las etapas siguientes parten de los ficheros ya procesados.
+
+    python -m src.data_processing.pipeline
+    python -m src.data_processing.pipeline --etapas clustering predicciones --forzar
+    python -m src.data_processing.pipeline --perfil outputs/perfiles
+"""
+
+import argparse
+import cProfile
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.analysis import impacto_urbano, kpis, modelos_barrios
+from src.data_processing import (
+    almacen_kpis, base_datos, calendario_ocupacion, ingesta_ciudades, precios, resenas_actividad,
+)
+from src.data_processing.almacen_kpis import construir_almacen_kpis, hash_fichero
+from src.data_processing.base_datos import cargar_csvs_en_base_datos
+from src.data_processing.cache_listings import DIRECTORIO_CACHE, firma_csv
+from src.data_processing.calendario_ocupacion import ocupacion_por_barrio
+from src.data_processing.ingesta_ciudades import ingerir_ciudades
+from src.data_processing.resenas_actividad import actividad_por_barrio, resenas_barrio_mensual
+
+NOMBRE_ESTADO = 'pipeline.json'
+
+# Se incrementa si cambia el formato del estado: invalida todas las etapas
+VERSION_ESTADO = 1
+
+CIUDADES = ['madrid', 'barcelona', 'mallorca']
+
+# Ficheros de Inside Airbnb de cada ciudad en data/raw/<ciudad>/
+FICHEROS_RAW = ['listings.csv', 'calendar.csv.gz', 'reviews.csv.gz', 'neighbourhoods.csv', 'neighbourhoods.geojson']
+
+RUTAS_POR_DEFECTO = {
+    'raw': 'data/raw',
+    'procesado': 'data/processed',
+    'externo': 'data/external',
+}
+
+
+def _leer_csv(rutas, nombre):
+    return pd.read_csv(Path(rutas['procesado']) / nombre)
+
+
+def _escribir_csv(df, rutas, nombre):
+    df.to_csv(Path(rutas['procesado']) / nombre, index=False, encoding='utf-8')
+    return len(df)
+
+
+def _entradas_ingesta(rutas, parametros):
+    return [
+        Path(rutas['raw']) / ciudad / fichero
+        for ciudad in parametros['ciudades']
+        for fichero in FICHEROS_RAW
+        if (Path(rutas['raw']) / ciudad / fichero).exists()
+    ]
+
+
+def _sin_datos_ingesta(rutas, parametros):
+    if not _entradas_ingesta(rutas, parametros):
+        return f"no hay ficheros de Inside Airbnb en {rutas['raw']}"
+    return None
+
+
+def _entradas_base_datos(rutas, parametros):
+    return [
+        Path(rutas['procesado']) / f"{tabla}.csv"
+        for tabla in base_datos.TABLAS_CSV
+        if (Path(rutas['procesado']) / f"{tabla}.csv").exists()
+    ]
+
+
+def etapa_ingesta(rutas, parametros):
+    """
+    Carga, limpia y unifica las ciudades en paralelo y exporta listings, ocupación y reseñas.
+    """
+    resultados, unificado, registros = ingerir_ciudades(
+        parametros['ciudades'], rutas['raw'], procesos=parametros.get('procesos')
+    )
+    errores = registros[registros['error'].notna()]
+    if not errores.empty:
+        raise RuntimeError('; '.join(f"{r.ciudad}: {r.error}" for r in errores.itertuples()))
+
+    ocupaciones, resenas, actividades = [], [], []
+    for ciudad, resultado in resultados.items():
+        limpios = resultado['limpios']
+        for tabla, datos in [
+            (ocupaciones, ocupacion_por_barrio(limpios['ocupacion_calendario'], limpios['listings'], periodo='mes')),
+            (resenas, resenas_barrio_mensual(limpios['resenas_mensuales'], limpios['listings'])),
+            (actividades, actividad_por_barrio(limpios['resenas_mensuales'], limpios['listings'])),
+        ]:
+            datos.insert(0, 'ciudad', ciudad)
+            tabla.append(datos)
+
+    return {
+        'listings_unificado.csv': _escribir_csv(unificado, rutas, 'listings_unificado.csv'),
+        'ocupacion_barrio_mensual.csv': _escribir_csv(
+            pd.concat(ocupaciones, ignore_index=True), rutas, 'ocupacion_barrio_mensual.csv'
+        ),
+        'resenas_barrio_mensual.csv': _escribir_csv(
+            pd.concat(resenas, ignore_index=True), rutas, 'resenas_barrio_mensual.csv'
+        ),
+        'actividad_resenas_barrio.csv': _escribir_csv(
+            pd.concat(actividades, ignore_index=True), rutas, 'actividad_resenas_barrio.csv'
+        ),
+    }
+
+
+def etapa_kpis_basicos(rutas, parametros):
+    """
+    KPIs básicos por ciudad y barrio del dataset unificado.
+    """
+    df_listings = _leer_csv(rutas, 'listings_unificado.csv')
+    # Los listings_unificado.csv anteriores a la ingesta del pipeline solo traen 'price'
+    if 'price_clean' not in df_listings.columns and 'price' in df_listings.columns:
+        df_listings['price_clean'] = precios.convertir_precios(df_listings['price'])
+    df_demograficos = pd.read_csv(Path(rutas['externo']) / 'datos_demograficos.csv')
+
+    df_kpis_ciudad, df_kpis_barrio = impacto_urbano.calcular_kpis_basicos(df_listings, df_demograficos)
+    return {
+        'kpis_por_ciudad.csv': _escribir_csv(df_kpis_ciudad, rutas, 'kpis_por_ciudad.csv'),
+        'kpis_por_barrio.csv': _escribir_csv(df_kpis_barrio, rutas, 'kpis_por_barrio.csv'),
+    }
+
+
+def etapa_impacto_urbano(rutas, parametros):
+    """
+    KPIs de impacto urbano por ciudad frente a los alquileres reales.
+    """
+    df_precios_reales = pd.read_csv(Path(rutas['externo']) / 'precios_alquileres_reales_procesados.csv')
+    df_impacto = impacto_urbano.calcular_kpis_impacto_urbano(_leer_csv(rutas, 'kpis_por_ciudad.csv'), df_precios_reales)
+    return {'kpis_impacto_urbano.csv': _escribir_csv(df_impacto, rutas, 'kpis_impacto_urbano.csv')}
+
+
+def etapa_almacen_kpis(rutas, parametros):
+    """
+    Almacén versionado de KPIs del dashboard (solo recalcula las ciudades cambiadas).
+    """
+    manifiesto, info = construir_almacen_kpis(Path(rutas['procesado']) / 'listings_unificado.csv')
+    if manifiesto is None:
+        raise RuntimeError("pyarrow no está instalado: no se puede escribir el almacén de KPIs")
+    resultado = {f"kpis/{nombre}": info_tabla['filas'] for nombre, info_tabla in manifiesto['tablas'].items()}
+    resultado['ciudades_recalculadas'] = ', '.join(info['ciudades_recalculadas']) or 'ninguna'
+    return resultado
+
+
+def etapa_clustering(rutas, parametros):
+    """
+    Clustering de barrios sobre sus KPIs.
+    """
+    df_clustering = modelos_barrios.generar_clustering_barrios_reales(_leer_csv(rutas, 'kpis_por_barrio.csv'))
+    return {'barrios_clustering.csv': _escribir_csv(df_clustering, rutas, 'barrios_clustering.csv')}
+
+
+def etapa_predicciones(rutas, parametros):
+    """
+    Predicciones del índice de impacto urbano por ciudad y escenario.
+    """
+    df_predicciones = modelos_barrios.generar_predicciones_impacto_reales(_leer_csv(rutas, 'kpis_impacto_urbano.csv'))
+    return {'predicciones_impacto_urbano.csv': _escribir_csv(df_predicciones, rutas, 'predicciones_impacto_urbano.csv')}
+
+
+def etapa_base_datos(rutas, parametros):
+    """
+    Carga masiva de los CSV procesados en la base de datos SQLite que consulta el dashboard.
+    """
+    return cargar_csvs_en_base_datos(rutas['procesado'])['tablas']
+
+
+# Etapas en orden de ejecución. 'entradas' y 'salidas' son ficheros relativos
+# a un directorio de rutas; 'modulos' son los módulos cuyo código forma parte
+# de la huella; 'parametros' son los parámetros que cambian el resultado y
+# 'sin_datos' (opcional) indica por qué la etapa no se puede ejecutar.
+ETAPAS = {
+    'ingesta': {
+        'funcion': etapa_ingesta,
+        'entradas': _entradas_ingesta,
+        'salidas': [
+            ('procesado', 'listings_unificado.csv'),
+            ('procesado', 'ocupacion_barrio_mensual.csv'),
+            ('procesado', 'resenas_barrio_mensual.csv'),
+            ('procesado', 'actividad_resenas_barrio.csv'),
+        ],
+        'modulos': [ingesta_ciudades, calendario_ocupacion, resenas_actividad, precios],
+        'parametros': ['ciudades'],
+        'sin_datos': _sin_datos_ingesta,
+    },
+    'kpis_basicos': {
+        'funcion': etapa_kpis_basicos,
+        'entradas': [('procesado', 'listings_unificado.csv'), ('externo', 'datos_demograficos.csv')],
+        'salidas': [('procesado', 'kpis_por_ciudad.csv'), ('procesado', 'kpis_por_barrio.csv')],
+        'modulos': [impacto_urbano, precios],
+        'parametros': [],
+    },
+    'impacto_urbano': {
+        'funcion': etapa_impacto_urbano,
+        'entradas': [('procesado', 'kpis_por_ciudad.csv'), ('externo', 'precios_alquileres_reales_procesados.csv')],
+        'salidas': [('procesado', 'kpis_impacto_urbano.csv')],
+        'modulos': [impacto_urbano],
+        'parametros': [],
+    },
+    'almacen_kpis': {
+        'funcion': etapa_almacen_kpis,
+        'entradas': [('procesado', 'listings_unificado.csv')],
+        'salidas': [('procesado', f"{almacen_kpis.DIRECTORIO_ALMACEN_KPIS}/{almacen_kpis.NOMBRE_MANIFIESTO}")],
+        'modulos': [almacen_kpis, kpis],
+        'parametros': [],
+    },
+    'clustering': {
+        'funcion': etapa_clustering,
+        'entradas': [('procesado', 'kpis_por_barrio.csv')],
+        'salidas': [('procesado', 'barrios_clustering.csv')],
+        'modulos': [modelos_barrios],
+        'parametros': ['sklearn'],
+    },
+    'predicciones': {
+        'funcion': etapa_predicciones,
+        'entradas': [('procesado', 'kpis_impacto_urbano.csv')],
+        'salidas': [('procesado', 'predicciones_impacto_urbano.csv')],
+        'modulos': [modelos_barrios],
+        'parametros': ['sklearn'],
+    },
+    'base_datos': {
+        'funcion': etapa_base_datos,
+        'entradas': _entradas_base_datos,
+        'salidas': [('procesado', base_datos.NOMBRE_BASE_DATOS)],
+        'modulos': [base_datos],
+        'parametros': [],
+    },
+}
+
+
+def ruta_estado(directorio_procesado):
+    """
+    Fichero de estado del pipeline (data/processed/cache/pipeline.json).
+    """
+    return Path(directorio_procesado) / DIRECTORIO_CACHE / NOMBRE_ESTADO
+
+
+def leer_estado(directorio_procesado):
+    """
+    Estado guardado del pipeline, o uno vacío si no existe, no es legible o es de otra versión.
+    """
+    try:
+        with open(ruta_estado(directorio_procesado), 'r', encoding='utf-8') as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        estado = None
+    if not estado or estado.get('version') != VERSION_ESTADO:
+        return {'version': VERSION_ESTADO, 'etapas': {}, 'ficheros': {}}
+    return estado
+
+
+def guardar_estado(estado, directorio_procesado):
+    ruta = ruta_estado(directorio_procesado)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = ruta.with_suffix(ruta.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    tmp_path.replace(ruta)
+
+
+def hash_con_firma(ruta, ficheros):
+    """
+    SHA-1 de un fichero, reutilizando el guardado en `ficheros` si no cambian su tamaño ni su fecha.
+
+    Returns:
+        str: SHA-1 del contenido, o None si el fichero no existe
+    """
+    ruta = Path(ruta)
+    if not ruta.exists():
+        return None
+    clave = str(ruta.resolve())
+    firma = firma_csv(ruta)
+    previa = ficheros.get(clave)
+    if previa and previa['size'] == firma['size'] and previa['mtime_ns'] == firma['mtime_ns']:
+        return previa['sha1']
+    ficheros[clave] = {**firma, 'sha1': hash_fichero(ruta)}
+    return ficheros[clave]['sha1']
+
+
+def _rutas_etapa(etapa, clave, rutas, parametros):
+    definicion = ETAPAS[etapa][clave]
+    if callable(definicion):
+        return definicion(rutas, parametros)
+    return [Path(rutas[directorio]) / nombre for directorio, nombre in definicion]
+
+
+def huella_etapa(etapa, rutas, parametros, ficheros):
+    """
+    Huella de una etapa: su código, sus parámetros y el contenido de sus entradas.
+
+    Returns:
+        tuple: (SHA-1 de la huella, lista de entradas que no existen)
+    """
+    entradas = _rutas_etapa(etapa, 'entradas', rutas, parametros)
+    hashes_entradas = {str(ruta): hash_con_firma(ruta, ficheros) for ruta in entradas}
+    contenido = {
+        'etapa': etapa,
+        'codigo': [hash_fichero(modulo.__file__) for modulo in ETAPAS[etapa]['modulos']],
+        'parametros': {nombre: parametros.get(nombre) for nombre in ETAPAS[etapa]['parametros']},
+        'entradas': list(hashes_entradas.values()),
+    }
+    faltan = [ruta for ruta, sha1 in hashes_entradas.items() if sha1 is None]
+    return hashlib.sha1(json.dumps(contenido, sort_keys=True).encode('utf-8')).hexdigest(), faltan
+
+
+def _salidas_vigentes(etapa, registro, rutas, parametros, ficheros):
+    salidas = _rutas_etapa(etapa, 'salidas', rutas, parametros)
+    hashes = {str(ruta): hash_con_firma(ruta, ficheros) for ruta in salidas}
+    return None not in hashes.values() and hashes == registro.get('salidas')
+
+
+def ejecutar_pipeline(etapas=None, rutas=None, ciudades=None, procesos=None, forzar=False, directorio_perfil=None):
+    """
+    Ejecuta las etapas del pipeline en orden, omitiendo las que no han cambiado.
+
+    Args:
+        etapas: nombres de las etapas a ejecutar (por defecto, todas)
+        rutas: dict con los directorios 'raw', 'procesado' y 'externo'
+        ciudades: ciudades de la ingesta (por defecto, CIUDADES)
+        procesos: procesos simultáneos de la ingesta (ver ingerir_ciudades)
+        forzar: ejecutar las etapas aunque su huella no haya cambiado
+        directorio_perfil: si se indica, guarda un perfil de cProfile
+            (<etapa>.prof) de cada etapa ejecutada
+
+    Returns:
+        DataFrame: una fila por etapa con 'etapa', 'estado' ('ejecutada',
+            'omitida', 'sin_datos' o 'error'), 'tiempo_s', 'motivo' y
+            'resultado' (filas escritas por fichero)
+    """
+    rutas = {**RUTAS_POR_DEFECTO, **(rutas or {})}
+    etapas = [etapa for etapa in ETAPAS if etapas is None or etapa in etapas]
+    parametros = {
+        'ciudades': list(ciudades or CIUDADES),
+        'procesos': procesos,
+        'sklearn': modelos_barrios.SKLEARN_DISPONIBLE,
+    }
+    if directorio_perfil is not None:
+        Path(directorio_perfil).mkdir(parents=True, exist_ok=True)
+
+    estado = leer_estado(rutas['procesado'])
+    registros = []
+    for etapa in etapas:
+        inicio = time.perf_counter()
+        huella, faltan = huella_etapa(etapa, rutas, parametros, estado['ficheros'])
+        registro_previo = estado['etapas'].get(etapa, {})
+        registro = {'etapa': etapa, 'estado': None, 'motivo': None, 'resultado': None}
+        sin_datos = ETAPAS[etapa].get('sin_datos', lambda rutas, parametros: None)(rutas, parametros)
+
+        if sin_datos:
+            registro.update(estado='sin_datos', motivo=sin_datos)
+        elif faltan:
+            registro.update(estado='error', motivo=f"faltan entradas: {', '.join(faltan)}")
+        elif (
+            not forzar
+            and registro_previo.get('huella') == huella
+            and _salidas_vigentes(etapa, registro_previo, rutas, parametros, estado['ficheros'])
+        ):
+            registro.update(estado='omitida', motivo='entradas sin cambios', resultado=registro_previo.get('resultado'))
+        else:
+            if forzar:
+                motivo = 'forzada'
+            elif not registro_previo:
+                motivo = 'primera ejecución'
+            elif registro_previo.get('huella') != huella:
+                motivo = 'entradas o código modificados'
+            else:
+                motivo = 'salidas modificadas o ausentes'
+
+            perfil = cProfile.Profile() if directorio_perfil is not None else None
+            try:
+                if perfil is not None:
+                    perfil.enable()
+                resultado = ETAPAS[etapa]['funcion'](rutas, parametros)
+            except Exception as e:
+                registro.update(estado='error', motivo=f"{type(e).__name__}: {e}")
+            else:
+                salidas = _rutas_etapa(etapa, 'salidas', rutas, parametros)
+                estado['etapas'][etapa] = {
+                    'huella': huella,
+                    'salidas': {str(ruta): hash_con_firma(ruta, estado['ficheros']) for ruta in salidas},
+                    'resultado': resultado,
+                    'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+                }
+                guardar_estado(estado, rutas['procesado'])
+                registro.update(estado='ejecutada', motivo=motivo, resultado=resultado)
+            finally:
+                if perfil is not None:
+                    perfil.disable()
+                    perfil.dump_stats(Path(directorio_perfil) / f"{etapa}.prof")
+
+        registro['tiempo_s'] = time.perf_counter() - inicio
+        registros.append(registro)
+        if registro['estado'] == 'error':
+            break
+
+    # Guarda también los hashes de ficheros calculados en las etapas omitidas
+    guardar_estado(estado, rutas['procesado'])
+    return pd.DataFrame(registros, columns=['etapa', 'estado', 'tiempo_s', 'motivo', 'resultado'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ejecuta el pipeline de datos por etapas con caché en disco")
+    parser.add_argument('--etapas', nargs='+', choices=list(ETAPAS), help="etapas a ejecutar (por defecto, todas)")
+    parser.add_argument('--forzar', action='store_true', help="ejecutar las etapas aunque sus entradas no hayan cambiado")
+    parser.add_argument('--ciudades', nargs='+', default=CIUDADES, help="ciudades de la ingesta")
+    parser.add_argument('--procesos', type=int, help="procesos simultáneos de la ingesta")
+    parser.add_argument('--raw', default=RUTAS_POR_DEFECTO['raw'], help="directorio con los datos de Inside Airbnb")
+    parser.add_argument('--procesado', default=RUTAS_POR_DEFECTO['procesado'], help="directorio de datos procesados")
+    parser.add_argument('--externo', default=RUTAS_POR_DEFECTO['externo'], help="directorio de datos externos")
+    parser.add_argument('--perfil', help="directorio donde guardar un perfil cProfile (.prof) por etapa ejecutada")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    registros = ejecutar_pipeline(
+        etapas=args.etapas,
+        rutas={'raw': args.raw, 'procesado': args.procesado, 'externo': args.externo},
+        ciudades=args.ciudades,
+        procesos=args.procesos,
+        forzar=args.forzar,
+        directorio_perfil=args.perfil,
+    )
+
+    iconos = {'ejecutada': '✅', 'omitida': '⏭️', 'sin_datos': '➖', 'error': '❌'}
+    for registro in registros.itertuples():
+        print(f"{iconos[registro.estado]} {registro.etapa:<15} {registro.estado:<10} {registro.tiempo_s:7.2f}s  {registro.motivo}")
+    print(f"Pipeline completado en {time.perf_counter() - inicio:.2f}s (estado en {ruta_estado(args.procesado)})")
+    sys.exit(1 if (registros['estado'] == 'error').any() else 0)
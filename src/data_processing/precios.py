@@ -0,0 +1,153 @@
+"""
+Conversión vectorizada de precios de Inside Airbnb
+===================================================
+
+limpiar_precios (notebook persona_a) aplicaba convertir_precio fila a fila
+con Series.apply para quitar '$', ',' y '€' de cada precio y convertirlo a
+float. En los snapshots grandes era la parte más lenta de la limpieza.
+
+convertir_precios hace la misma conversión sobre la columna entera:
+
+- Los precios se factorizan y cada texto distinto se convierte una sola vez
+  (un snapshot tiene unos pocos miles de precios distintos).
+- Los símbolos se quitan con una única expresión regular y la conversión a
+  número se hace con pd.to_numeric.
+
+Mantiene la semántica de convertir_precio: los nulos y los textos que no son
+un número dan NaN. mascara_precios_validos aplica el mismo filtro de
+extremos que limpiar_precios (percentiles 1 y 99 y precio > 0).
+
+`python -m src.data_processing.precios` compara ambas versiones sobre una
+muestra sintética de un millón de precios.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Símbolos que se eliminan del texto del precio
+PATRON_SIMBOLOS_PRECIO = r'[$,€]'
+
+# Percentiles del filtro de precios extremos
+CUANTIL_INFERIOR = 0.01
+CUANTIL_SUPERIOR = 0.99
+
+# Filas de la muestra del benchmark
+FILAS_BENCHMARK = 1_000_000
+
+
+def convertir_precio(precio_str):
+    """
+    Conversión fila a fila de un precio (versión original de limpiar_precios).
+
+    Se conserva como referencia para el benchmark y las comprobaciones.
+    """
+    if pd.isna(precio_str):
+        return np.nan
+
+    if isinstance(precio_str, str):
+        precio_clean = precio_str.replace('$', '').replace(',', '').replace('€', '').strip()
+    else:
+        precio_clean = str(precio_str)
+
+    try:
+        return float(precio_clean)
+    except ValueError:
+        return np.nan
+
+
+def convertir_precios(precios):
+    """
+    Convierte una columna de precios ('$1,234.00', '85 €', 85...) a float64.
+
+    Args:
+        precios: Series de precios como texto o numéricos
+
+    Returns:
+        Series: precios en float64 con el mismo índice; NaN si el valor es
+            nulo o no es un número
+    """
+    if pd.api.types.is_numeric_dtype(precios) and not pd.api.types.is_bool_dtype(precios):
+        return precios.astype('float64')
+
+    # Cada precio distinto se convierte una vez y se reparte con los códigos
+    codigos, unicos = pd.factorize(precios)
+    textos = pd.Series(unicos, dtype='string')
+    valores = pd.to_numeric(
+        textos.str.replace(PATRON_SIMBOLOS_PRECIO, '', regex=True).str.strip(),
+        errors='coerce',
+    ).to_numpy(dtype='float64', na_value=np.nan)
+
+    convertidos = np.full(len(codigos), np.nan)
+    con_valor = codigos >= 0
+    convertidos[con_valor] = valores[codigos[con_valor]]
+    return pd.Series(convertidos, index=precios.index, name=precios.name)
+
+
+def mascara_precios_validos(precios, cuantil_inferior=CUANTIL_INFERIOR, cuantil_superior=CUANTIL_SUPERIOR):
+    """
+    Filtro de precios extremos de limpiar_precios.
+
+    Returns:
+        tuple: (máscara booleana de precios entre los dos percentiles y > 0,
+            precio del percentil inferior, precio del percentil superior)
+    """
+    minimo = precios.quantile(cuantil_inferior)
+    maximo = precios.quantile(cuantil_superior)
+    mascara = (precios >= minimo) & (precios <= maximo) & (precios > 0)
+    return mascara, minimo, maximo
+
+
+def muestra_precios(n_filas=FILAS_BENCHMARK, semilla=0):
+    """
+    Precios sintéticos con el formato de listings.csv ('$1,234.00'), nulos y textos inválidos.
+    """
+    rng = np.random.default_rng(semilla)
+    importes = np.round(rng.lognormal(4.5, 0.8, n_filas))
+    precios = pd.Series([f"${importe:,.2f}" for importe in importes], dtype=object)
+    precios[rng.random(n_filas) < 0.02] = np.nan
+    precios[rng.random(n_filas) < 0.001] = 'consultar'
+    return precios
+
+
+def benchmark_precios(n_filas=FILAS_BENCHMARK):
+    """
+    Filas por segundo de convertir_precio (apply) y de convertir_precios.
+
+    Returns:
+        dict: filas, segundos y filas por segundo de cada versión, aceleración
+            y si ambas versiones dan los mismos precios
+    """
+    precios = muestra_precios(n_filas)
+
+    inicio = time.perf_counter()
+    por_filas = precios.apply(convertir_precio)
+    segundos_apply = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vectorizado = convertir_precios(precios)
+    segundos_vectorizado = time.perf_counter() - inicio
+
+    return {
+        'filas': n_filas,
+        'segundos_apply': segundos_apply,
+        'segundos_vectorizado': segundos_vectorizado,
+        'filas_s_apply': n_filas / segundos_apply,
+        'filas_s_vectorizado': n_filas / segundos_vectorizado,
+        'aceleracion': segundos_apply / segundos_vectorizado,
+        'iguales': bool(np.array_equal(por_filas.to_numpy(dtype=float), vectorizado.to_numpy(), equal_nan=True)),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compara la conversión de precios fila a fila y vectorizada")
+    parser.add_argument('--filas', type=int, default=FILAS_BENCHMARK, help="filas de la muestra sintética")
+    args = parser.parse_args()
+
+    resultado = benchmark_precios(args.filas)
+    print(f"Muestra: {resultado['filas']:,} precios")
+    print(f"  apply(convertir_precio): {resultado['segundos_apply']:.2f}s ({resultado['filas_s_apply']:,.0f} filas/s)")
+    print(f"  convertir_precios:       {resultado['segundos_vectorizado']:.2f}s ({resultado['filas_s_vectorizado']:,.0f} filas/s)")
+    print(f"  Aceleración: x{resultado['aceleracion']:.0f} - mismos precios: {'sí' if resultado['iguales'] else 'no'}")
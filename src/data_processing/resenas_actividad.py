@@ -0,0 +1,236 @@
+"""
+Actividad real a partir de reviews.csv.gz en streaming
+=======================================================
+
+cargar_datos_ciudad leía reviews.csv.gz completo (con el texto de cada
+comentario) y después solo se usaba su número de filas. La fecha de cada
+reseña es, sin embargo, la mejor señal disponible de la actividad real de un
+listing: un anuncio sin reseñas recientes probablemente ya no se alquila.
+
+leer_resenas_mensuales recorre el fichero por bloques leyendo solo
+listing_id y date (los comentarios no se cargan) y cuenta reseñas por
+listing y mes. A partir de ese agregado:
+
+- resenas_barrio_mensual: reseñas por barrio y mes.
+- actividad_por_listing / actividad_por_barrio: reseñas de los últimos
+  MESES_ACTIVIDAD meses, reseñas por mes y una estimación de estancias y
+  noches reservadas al mes (modelo de Inside Airbnb: una de cada
+  1 / TASA_RESENA estancias deja reseña y cada estancia dura al menos
+  NOCHES_POR_ESTANCIA noches).
+
+actividad_por_barrio devuelve una fila por barrio con tipos compactos, que
+el dashboard usa como señal de saturación basada en actividad sin leer el
+fichero de reseñas.
+"""
+
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.data_processing.calendario_ocupacion import MAX_FILAS_PARCIALES, descomponer_fechas
+
+# Filas de reviews.csv.gz procesadas en cada bloque
+TAMANO_BLOQUE_RESENAS = 1_000_000
+
+# Columnas de reviews.csv.gz que se leen
+COLUMNAS_RESENAS = ['listing_id', 'date']
+
+# Claves de agrupación del agregado mensual
+CLAVES_MENSUALES = ['listing_id', 'anio', 'mes']
+
+# Meses hasta la última reseña del fichero que cuentan como actividad reciente
+MESES_ACTIVIDAD = 12
+
+# Proporción de estancias que dejan reseña (modelo de ocupación de Inside Airbnb)
+TASA_RESENA = 0.5
+
+# Noches mínimas por estancia en la estimación de noches reservadas
+NOCHES_POR_ESTANCIA = 3
+
+
+def _agregar_bloque(bloque):
+    """
+    Reseñas por listing y mes de un bloque.
+    """
+    validas, anio, mes = descomponer_fechas(bloque['date'])
+    con_listing = bloque['listing_id'].notna().to_numpy()
+    validas_listing = con_listing[validas]
+
+    agregado = pd.DataFrame({
+        'listing_id': bloque['listing_id'].to_numpy(dtype='int64', na_value=0)[validas & con_listing],
+        'anio': anio[validas_listing],
+        'mes': mes[validas_listing],
+    })
+    return agregado.groupby(CLAVES_MENSUALES, as_index=False, sort=False).size().rename(columns={'size': 'resenas'})
+
+
+def _consolidar(parciales):
+    """
+    Suma agregados parciales con las mismas claves en un único DataFrame.
+    """
+    if len(parciales) == 1:
+        return parciales[0]
+    return (
+        pd.concat(parciales, ignore_index=True)
+        .groupby(CLAVES_MENSUALES, as_index=False, sort=False)['resenas']
+        .sum()
+    )
+
+
+def leer_resenas_mensuales(ruta_resenas, tamano_bloque=TAMANO_BLOQUE_RESENAS):
+    """
+    Lee un reviews.csv(.gz) de Inside Airbnb por bloques y cuenta reseñas por listing y mes.
+
+    Args:
+        ruta_resenas: ruta a reviews.csv.gz
+        tamano_bloque: filas leídas en cada bloque
+
+    Returns:
+        tuple: (DataFrame con una fila por listing y mes con reseñas:
+            'listing_id', 'anio', 'mes' y 'resenas'; dict con
+            'total_registros', 'fechas_nulas', 'listings', 'bloques' y
+            'tiempo_s')
+    """
+    inicio = time.perf_counter()
+    resumen = {'total_registros': 0, 'fechas_nulas': 0, 'bloques': 0}
+
+    lector = pd.read_csv(
+        Path(ruta_resenas),
+        usecols=COLUMNAS_RESENAS,
+        # listing_id como entero con nulos: un bloque con un id vacío no pasa a float64
+        # (que redondea los ids de 18-19 dígitos)
+        dtype={'listing_id': 'Int64', 'date': 'category'},
+        chunksize=tamano_bloque,
+    )
+
+    parciales = []
+    filas_parciales = 0
+    with lector:
+        for bloque in lector:
+            resumen['total_registros'] += len(bloque)
+            resumen['fechas_nulas'] += int(bloque['date'].isna().sum())
+            resumen['bloques'] += 1
+            parcial = _agregar_bloque(bloque)
+            parciales.append(parcial)
+            filas_parciales += len(parcial)
+
+            # Los agregados parciales se suman en cuanto ocupan demasiado
+            if filas_parciales > MAX_FILAS_PARCIALES:
+                parciales = [_consolidar(parciales)]
+                filas_parciales = len(parciales[0])
+
+    if parciales:
+        mensual = _consolidar(parciales).sort_values(CLAVES_MENSUALES, ignore_index=True)
+        mensual['resenas'] = mensual['resenas'].astype('int32')
+    else:
+        mensual = pd.DataFrame({
+            'listing_id': pd.Series(dtype='int64'),
+            'anio': pd.Series(dtype='int16'),
+            'mes': pd.Series(dtype='int8'),
+            'resenas': pd.Series(dtype='int32'),
+        })
+
+    resumen['listings'] = int(mensual['listing_id'].nunique())
+    resumen['tiempo_s'] = time.perf_counter() - inicio
+    return mensual, resumen
+
+
+def _con_barrio(mensual, listings, columna_barrio):
+    """
+    Agregado mensual con el barrio de cada listing (sin los listings desconocidos).
+    """
+    barrio_por_listing = listings.drop_duplicates('id').set_index('id')[columna_barrio]
+    con_barrio = mensual.assign(barrio=mensual['listing_id'].map(barrio_por_listing))
+    return con_barrio[con_barrio['barrio'].notna()]
+
+
+def resenas_barrio_mensual(mensual, listings, columna_barrio='neighbourhood_cleansed'):
+    """
+    Reseñas por barrio y mes.
+
+    Returns:
+        DataFrame: 'barrio', 'anio', 'mes', 'listings' (con reseñas ese mes)
+            y 'resenas'
+    """
+    return (
+        _con_barrio(mensual, listings, columna_barrio)
+        .groupby(['barrio', 'anio', 'mes'], as_index=False, observed=True)
+        .agg(listings=('listing_id', 'nunique'), resenas=('resenas', 'sum'))
+    )
+
+
+def actividad_por_listing(mensual, meses=MESES_ACTIVIDAD):
+    """
+    Reseñas recientes de cada listing y estimación de su actividad mensual.
+
+    La ventana son los `meses` meses que terminan en el último mes con
+    reseñas del fichero (la fecha del scraping).
+
+    Returns:
+        DataFrame: 'listing_id', 'resenas_recientes', 'resenas_mes',
+            'estancias_mes_estimadas' y 'noches_mes_estimadas'
+    """
+    indice_mes = mensual['anio'].astype('int32') * 12 + mensual['mes'].astype('int32')
+    recientes = mensual[indice_mes > indice_mes.max() - meses] if len(mensual) else mensual
+
+    actividad = (
+        recientes.groupby('listing_id', as_index=False)['resenas'].sum()
+        .rename(columns={'resenas': 'resenas_recientes'})
+    )
+    actividad['resenas_mes'] = (actividad['resenas_recientes'] / meses).astype('float32')
+    actividad['estancias_mes_estimadas'] = (actividad['resenas_mes'] / TASA_RESENA).astype('float32')
+    actividad['noches_mes_estimadas'] = (actividad['estancias_mes_estimadas'] * NOCHES_POR_ESTANCIA).astype('float32')
+    return actividad
+
+
+def actividad_por_barrio(mensual, listings, meses=MESES_ACTIVIDAD, columna_barrio='neighbourhood_cleansed'):
+    """
+    Señal de actividad real por barrio a partir de las reseñas recientes.
+
+    Args:
+        mensual: agregado mensual devuelto por leer_resenas_mensuales
+        listings: DataFrame de listings con 'id' y la columna de barrio
+        meses: meses de la ventana de actividad reciente
+        columna_barrio: columna de listings con el barrio
+
+    Returns:
+        DataFrame: una fila por barrio con 'barrio', 'listings',
+            'listings_activos' (con alguna reseña en la ventana),
+            'pct_activos', 'resenas_recientes', 'resenas_mes',
+            'resenas_mes_por_listing' y 'noches_mes_estimadas'
+    """
+    listings_barrio = listings.drop_duplicates('id')[['id', columna_barrio]].rename(
+        columns={'id': 'listing_id', columna_barrio: 'barrio'}
+    )
+    listings_barrio = listings_barrio[listings_barrio['barrio'].notna()]
+
+    actividad = listings_barrio.merge(actividad_por_listing(mensual, meses), on='listing_id', how='left')
+    actividad['activo'] = actividad['resenas_recientes'].fillna(0) > 0
+
+    por_barrio = (
+        actividad.groupby('barrio', as_index=False, observed=True)
+        .agg(
+            listings=('listing_id', 'size'),
+            listings_activos=('activo', 'sum'),
+            resenas_recientes=('resenas_recientes', 'sum'),
+            resenas_mes=('resenas_mes', 'sum'),
+            noches_mes_estimadas=('noches_mes_estimadas', 'sum'),
+        )
+    )
+    por_barrio['barrio'] = por_barrio['barrio'].astype(object)
+    por_barrio['pct_activos'] = (por_barrio['listings_activos'] / por_barrio['listings'] * 100).round(1)
+    por_barrio['resenas_mes_por_listing'] = por_barrio['resenas_mes'] / por_barrio['listings']
+
+    return por_barrio.astype({
+        'listings': 'int32',
+        'listings_activos': 'int32',
+        'resenas_recientes': 'int32',
+        'resenas_mes': 'float32',
+        'noches_mes_estimadas': 'float32',
+        'pct_activos': 'float32',
+        'resenas_mes_por_listing': 'float32',
+    })[[
+        'barrio', 'listings', 'listings_activos', 'pct_activos', 'resenas_recientes',
+        'resenas_mes', 'resenas_mes_por_listing', 'noches_mes_estimadas',
+    ]]
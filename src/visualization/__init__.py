@@ -0,0 +1,3 @@
+"""
+Visualización: geometría preparada de barrios para los mapas del dashboard.
+"""
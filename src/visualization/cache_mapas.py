@@ -0,0 +1,117 @@
+"""
+Caché LRU acotada para figuras y mapas del dashboard
+=====================================================
+
+Los mapas coropléticos de Plotly incrustan el GeoJSON completo de la ciudad y
+se reconstruían en cada rerun, aunque los datos y los parámetros fueran los
+mismos. CacheLRU guarda el resultado serializado bajo una clave hashable
+(ciudad, métrica, filtro de críticos, umbral...) y devuelve directamente la
+versión guardada en las vistas repetidas.
+
+La caché tiene un número máximo de entradas: al superarlo se descarta la
+menos usada recientemente. Lleva contadores de aciertos, fallos y descartes
+para el informe de rendimiento.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Caché LRU acotada y segura entre hilos (sesiones de Streamlit).
+
+    Args:
+        max_entradas: número máximo de entradas guardadas
+        nombre: nombre descriptivo para el informe de rendimiento
+    """
+
+    def __init__(self, max_entradas=32, nombre='cache'):
+        if max_entradas < 1:
+            raise ValueError("max_entradas debe ser al menos 1")
+        self.max_entradas = max_entradas
+        self.nombre = nombre
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.descartes = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __contains__(self, clave):
+        with self._lock:
+            return clave in self._entradas
+
+    def obtener(self, clave, construir):
+        """
+        Devuelve el valor guardado para la clave o lo construye y lo guarda.
+
+        Args:
+            clave: clave hashable que identifica el resultado
+            construir: función sin argumentos que genera el valor si no está
+
+        Returns:
+            valor guardado o recién construido (None no se guarda)
+        """
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave]
+            self.fallos += 1
+
+        # La construcción se hace fuera del lock para no bloquear otras sesiones
+        valor = construir()
+        if valor is None:
+            return None
+
+        with self._lock:
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.descartes += 1
+
+        return valor
+
+    def invalidar(self, filtro=None):
+        """
+        Elimina entradas de la caché.
+
+        Args:
+            filtro: función clave -> bool; si es None se vacía toda la caché
+
+        Returns:
+            int: número de entradas eliminadas
+        """
+        with self._lock:
+            if filtro is None:
+                eliminadas = len(self._entradas)
+                self._entradas.clear()
+                return eliminadas
+
+            claves = [clave for clave in self._entradas if filtro(clave)]
+            for clave in claves:
+                del self._entradas[clave]
+            return len(claves)
+
+    def estadisticas(self):
+        """
+        Contadores de la caché para el informe de rendimiento.
+
+        Returns:
+            dict: entradas, capacidad, aciertos, fallos, descartes y tasa de acierto
+        """
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'nombre': self.nombre,
+                'entradas': len(self._entradas),
+                'capacidad': self.max_entradas,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'descartes': self.descartes,
+                'tasa_acierto': self.aciertos / consultas if consultas else 0.0,
+            }
@@ -0,0 +1,229 @@
+"""
+Centroides y áreas de barrios ponderados por área
+==================================================
+
+El centroide anterior promediaba los vértices del anillo exterior del primer
+polígono de cada barrio. Ese promedio depende de la densidad de vértices e
+ignora el resto de partes de un MultiPolygon (islas, municipios de Mallorca) y
+los huecos.
+
+Este módulo calcula, con la fórmula del área de Gauss (shoelace) vectorizada
+en NumPy, el área y el centroide de cada barrio sobre todos sus polígonos y
+anillos (los huecos restan). Las coordenadas se proyectan antes a kilómetros
+con una proyección equirectangular centrada en cada barrio, suficiente a la
+escala de un barrio.
+
+El resultado se guarda como tabla auxiliar junto a cada GeoJSON
+(neighbourhoods_<ciudad>_centroides.csv) con el hash del GeoJSON de origen, y
+solo se recalcula si el GeoJSON cambia.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Kilómetros por grado de latitud y de longitud en el ecuador
+KM_POR_GRADO_LAT = 110.574
+KM_POR_GRADO_LON = 111.320
+
+SUFIJO_TABLA_CENTROIDES = '_centroides.csv'
+
+COLUMNAS_TABLA_CENTROIDES = [
+    'feature',
+    'neighbourhood',
+    'neighbourhood_group',
+    'lat',
+    'lon',
+    'area_km2',
+    'n_partes',
+    'geojson_sha1',
+]
+
+
+def _poligonos_feature(geometry):
+    """
+    Lista de polígonos (lista de anillos) de una geometría Polygon o MultiPolygon.
+    """
+    tipo = geometry.get('type')
+    coordenadas = geometry.get('coordinates') or []
+    if tipo == 'Polygon':
+        return [coordenadas]
+    if tipo == 'MultiPolygon':
+        return list(coordenadas)
+    return []
+
+
+def calcular_centroides_geojson(geojson):
+    """
+    Calcula área y centroide ponderado por área de cada feature del GeoJSON.
+
+    Todos los anillos de todas las features se concatenan en un único array
+    y las sumas de la fórmula shoelace se acumulan por anillo con np.bincount.
+
+    Args:
+        geojson: GeoJSON (FeatureCollection) de barrios
+
+    Returns:
+        DataFrame: una fila por feature con 'feature', 'neighbourhood',
+            'neighbourhood_group', 'lat', 'lon', 'area_km2' y 'n_partes'
+    """
+    features = (geojson or {}).get('features', [])
+    n_features = len(features)
+
+    anillos = []
+    anillo_feature = []
+    anillo_exterior = []
+    n_partes = np.zeros(n_features, dtype='int64')
+
+    for i, feature in enumerate(features):
+        poligonos = _poligonos_feature(feature.get('geometry') or {})
+        n_partes[i] = len(poligonos)
+        for poligono in poligonos:
+            for k, anillo in enumerate(poligono):
+                if len(anillo) < 3:
+                    continue
+                anillos.append(np.asarray(anillo, dtype=float)[:, :2])
+                anillo_feature.append(i)
+                # El primer anillo es el exterior, el resto son huecos
+                anillo_exterior.append(k == 0)
+
+    propiedades = [feature.get('properties') or {} for feature in features]
+    tabla = pd.DataFrame({
+        'feature': np.arange(n_features, dtype='int64'),
+        'neighbourhood': [p.get('neighbourhood') for p in propiedades],
+        'neighbourhood_group': [p.get('neighbourhood_group') for p in propiedades],
+        'lat': np.nan,
+        'lon': np.nan,
+        'area_km2': 0.0,
+        'n_partes': n_partes,
+    })
+
+    if not anillos:
+        return tabla
+
+    longitudes = np.array([len(anillo) for anillo in anillos])
+    puntos = np.concatenate(anillos)
+    anillo_feature = np.asarray(anillo_feature)
+    anillo_exterior = np.asarray(anillo_exterior)
+
+    id_anillo = np.repeat(np.arange(len(anillos)), longitudes)
+    id_feature = anillo_feature[id_anillo]
+
+    # Índice del vértice siguiente dentro de cada anillo (el último enlaza con el primero)
+    inicio = np.cumsum(longitudes) - longitudes
+    siguiente = np.arange(len(puntos)) + 1
+    siguiente[inicio + longitudes - 1] = inicio
+
+    # Proyección equirectangular centrada en la latitud media de cada barrio
+    lon, lat = puntos[:, 0], puntos[:, 1]
+    vertices_feature = np.bincount(id_feature, minlength=n_features)
+    lat_media = np.bincount(id_feature, weights=lat, minlength=n_features) / np.maximum(vertices_feature, 1)
+    escala_lon = np.cos(np.radians(lat_media)) * KM_POR_GRADO_LON
+
+    x = lon * escala_lon[id_feature]
+    y = lat * KM_POR_GRADO_LAT
+    x_sig, y_sig = x[siguiente], y[siguiente]
+    cruce = x * y_sig - x_sig * y
+
+    n_anillos = len(anillos)
+    area_anillo = 0.5 * np.bincount(id_anillo, weights=cruce, minlength=n_anillos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cx_anillo = np.bincount(id_anillo, weights=(x + x_sig) * cruce, minlength=n_anillos) / (6 * area_anillo)
+        cy_anillo = np.bincount(id_anillo, weights=(y + y_sig) * cruce, minlength=n_anillos) / (6 * area_anillo)
+
+    # La orientación de los anillos no es fiable: exteriores suman, huecos restan
+    peso = np.where(anillo_exterior, 1.0, -1.0) * np.abs(area_anillo)
+    valido = np.isfinite(cx_anillo) & np.isfinite(cy_anillo)
+    peso = np.where(valido, peso, 0.0)
+
+    area_feature = np.bincount(anillo_feature, weights=peso, minlength=n_features)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cx = np.bincount(anillo_feature, weights=peso * np.where(valido, cx_anillo, 0), minlength=n_features) / area_feature
+        cy = np.bincount(anillo_feature, weights=peso * np.where(valido, cy_anillo, 0), minlength=n_features) / area_feature
+
+    centroide_lon = cx / escala_lon
+    centroide_lat = cy / KM_POR_GRADO_LAT
+
+    # Barrios degenerados (área nula): promedio de vértices
+    lon_media = np.bincount(id_feature, weights=lon, minlength=n_features) / np.maximum(vertices_feature, 1)
+    degenerado = ~(area_feature > 0) & (vertices_feature > 0)
+    centroide_lon = np.where(degenerado, lon_media, centroide_lon)
+    centroide_lat = np.where(degenerado, lat_media, centroide_lat)
+    sin_vertices = vertices_feature == 0
+    centroide_lon[sin_vertices] = np.nan
+    centroide_lat[sin_vertices] = np.nan
+
+    tabla['lat'] = centroide_lat
+    tabla['lon'] = centroide_lon
+    tabla['area_km2'] = np.maximum(area_feature, 0.0)
+
+    return tabla
+
+
+def hash_geojson(geojson_path):
+    """
+    Hash SHA-1 del contenido del GeoJSON (no depende de la fecha del fichero).
+    """
+    return hashlib.sha1(Path(geojson_path).read_bytes()).hexdigest()
+
+
+def ruta_tabla_centroides(geojson_path):
+    """
+    Ruta de la tabla auxiliar de un GeoJSON (neighbourhoods_<ciudad>_centroides.csv).
+    """
+    geojson_path = Path(geojson_path)
+    return geojson_path.with_name(f"{geojson_path.stem}{SUFIJO_TABLA_CENTROIDES}")
+
+
+def cargar_tabla_centroides(geojson_path, geojson=None, guardar=True):
+    """
+    Devuelve la tabla de centroides de un GeoJSON, leyéndola de disco si está vigente.
+
+    Si la tabla no existe o se generó con otro GeoJSON (hash distinto), se
+    recalcula y, si guardar es True, se reescribe junto al GeoJSON.
+
+    Args:
+        geojson_path: ruta del fichero neighbourhoods_*.geojson
+        geojson: GeoJSON ya cargado (se lee del fichero si es None)
+        guardar: False para no escribir la tabla en disco
+
+    Returns:
+        DataFrame: tabla con las columnas de COLUMNAS_TABLA_CENTROIDES
+    """
+    geojson_path = Path(geojson_path)
+    ruta_tabla = ruta_tabla_centroides(geojson_path)
+    sha1 = hash_geojson(geojson_path)
+
+    if ruta_tabla.exists():
+        try:
+            tabla = pd.read_csv(ruta_tabla)
+            if (
+                set(COLUMNAS_TABLA_CENTROIDES).issubset(tabla.columns)
+                and (tabla['geojson_sha1'] == sha1).all()
+            ):
+                return tabla[COLUMNAS_TABLA_CENTROIDES]
+        except Exception:
+            # Tabla ilegible: se recalcula
+            pass
+
+    if geojson is None:
+        with open(geojson_path, 'r', encoding='utf-8') as f:
+            geojson = json.load(f)
+
+    tabla = calcular_centroides_geojson(geojson)
+    tabla['geojson_sha1'] = sha1
+    tabla = tabla[COLUMNAS_TABLA_CENTROIDES]
+
+    if guardar:
+        try:
+            tmp_path = ruta_tabla.with_suffix('.csv.tmp')
+            tabla.to_csv(tmp_path, index=False)
+            tmp_path.replace(ruta_tabla)
+        except OSError:
+            # La tabla es una optimización: si no se puede escribir, se usa en memoria
+            pass
+
+    return tabla
@@ -0,0 +1,173 @@
+"""
+Agrupación de listings en el servidor por nivel de zoom
+========================================================
+
+Un marcador folium por listing deja el mapa inutilizable a partir de unos
+miles de puntos. IndiceClustersListings agrupa los listings de una ciudad en
+una rejilla absoluta cuyo tamaño de celda depende del zoom (una celda ocupa
+PIXELES_CELDA_CLUSTER píxeles en pantalla), y devuelve para un zoom y un
+bounding box los clusters ya agregados (número de listings, posición media y
+precio medio).
+
+- Las agregaciones de cada zoom se calculan una vez (np.unique + np.bincount)
+  y se reutilizan en todas las consultas.
+- El número de marcadores está acotado: si en el bounding box hay más
+  clusters que max_marcadores se sube a un zoom más agregado.
+- A partir de ZOOM_LISTINGS_INDIVIDUALES, si caben, se devuelven los
+  listings individuales con sus atributos.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Zoom más agregado que se usa para acotar el número de marcadores
+ZOOM_MIN_CLUSTERS = 6
+
+# Zoom a partir del cual se muestran listings individuales
+ZOOM_LISTINGS_INDIVIDUALES = 17
+
+# Lado de una celda de agrupación en píxeles de pantalla
+PIXELES_CELDA_CLUSTER = 64
+
+# Máximo de marcadores devueltos por consulta
+MAX_MARCADORES = 400
+
+# Píxeles de una tesela de mapa (web mercator)
+PIXELES_TESELA = 256
+
+
+def tamano_celda_grados(zoom):
+    """
+    Lado de la celda de agrupación en grados para un nivel de zoom.
+    """
+    return 360.0 / (PIXELES_TESELA * 2 ** zoom) * PIXELES_CELDA_CLUSTER
+
+
+class IndiceClustersListings:
+    """
+    Índice de clusters de listings por zoom sobre una rejilla absoluta.
+
+    Args:
+        latitudes: latitud de cada listing
+        longitudes: longitud de cada listing
+        atributos: DataFrame opcional alineado con los puntos (id, precio...),
+            usado en la vista de listings individuales; su columna 'price' se
+            promedia en cada cluster
+    """
+
+    def __init__(self, latitudes, longitudes, atributos=None):
+        lat = np.asarray(latitudes, dtype=float)
+        lon = np.asarray(longitudes, dtype=float)
+        validos = np.isfinite(lat) & np.isfinite(lon)
+
+        # Puntos ordenados por latitud para filtrar el bounding box con searchsorted
+        orden = np.flatnonzero(validos)[np.argsort(lat[validos], kind='stable')]
+        self.lat = lat[orden]
+        self.lon = lon[orden]
+        self.atributos = atributos.iloc[orden].reset_index(drop=True) if atributos is not None else None
+
+        precio = None
+        if self.atributos is not None and 'price' in self.atributos.columns:
+            precio = pd.to_numeric(self.atributos['price'], errors='coerce').to_numpy(dtype=float)
+        self._precio = precio
+
+        self._niveles = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _nivel(self, zoom):
+        """
+        Clusters de todos los listings para un zoom (se calculan al primer uso).
+        """
+        nivel = self._niveles.get(zoom)
+        if nivel is not None:
+            return nivel
+
+        with self._lock:
+            nivel = self._niveles.get(zoom)
+            if nivel is None and len(self.lat) == 0:
+                nivel = pd.DataFrame({'lat': [], 'lon': [], 'n': []})
+            elif nivel is None:
+                tamano = tamano_celda_grados(zoom)
+                fila = np.floor(self.lat / tamano).astype(np.int64)
+                columna = np.floor(self.lon / tamano).astype(np.int64)
+                # Clave entera única por celda (fila, columna) para agrupar con np.unique en 1D
+                fila -= fila.min()
+                columna -= columna.min()
+                _, id_cluster = np.unique(fila * (columna.max() + 1) + columna, return_inverse=True)
+
+                n = np.bincount(id_cluster)
+                nivel = pd.DataFrame({
+                    'lat': np.bincount(id_cluster, weights=self.lat) / n,
+                    'lon': np.bincount(id_cluster, weights=self.lon) / n,
+                    'n': n,
+                })
+                if self._precio is not None:
+                    con_precio = np.isfinite(self._precio)
+                    suma = np.bincount(id_cluster[con_precio], weights=self._precio[con_precio], minlength=len(n))
+                    cuenta = np.bincount(id_cluster[con_precio], minlength=len(n))
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        nivel['precio_medio'] = suma / cuenta
+            self._niveles[zoom] = nivel
+        return nivel
+
+    def _en_bbox(self, bbox):
+        """
+        Posiciones de los listings dentro de [min_lon, min_lat, max_lon, max_lat].
+        """
+        if bbox is None:
+            return np.arange(len(self.lat))
+        min_lon, min_lat, max_lon, max_lat = bbox
+        inicio = np.searchsorted(self.lat, min_lat, side='left')
+        fin = np.searchsorted(self.lat, max_lat, side='right')
+        posiciones = np.arange(inicio, fin)
+        lon = self.lon[inicio:fin]
+        return posiciones[(lon >= min_lon) & (lon <= max_lon)]
+
+    def clusters(self, zoom, bbox=None, max_marcadores=MAX_MARCADORES):
+        """
+        Marcadores para un zoom y un bounding box, con número acotado.
+
+        Args:
+            zoom: nivel de zoom del mapa
+            bbox: [min_lon, min_lat, max_lon, max_lat] o None para toda la ciudad
+            max_marcadores: máximo de marcadores devueltos
+
+        Returns:
+            tuple: (DataFrame con 'lat', 'lon', 'n' y 'precio_medio' si hay
+                precios, más los atributos en la vista individual; zoom de
+                agregación usado, o None si son listings individuales)
+        """
+        zoom = int(zoom)
+
+        if zoom >= ZOOM_LISTINGS_INDIVIDUALES:
+            posiciones = self._en_bbox(bbox)
+            if len(posiciones) <= max_marcadores:
+                listings = pd.DataFrame({
+                    'lat': self.lat[posiciones],
+                    'lon': self.lon[posiciones],
+                    'n': 1,
+                })
+                if self.atributos is not None:
+                    listings = pd.concat(
+                        [listings, self.atributos.iloc[posiciones].reset_index(drop=True)], axis=1
+                    )
+                return listings, None
+            zoom = ZOOM_LISTINGS_INDIVIDUALES - 1
+
+        for zoom_nivel in range(zoom, ZOOM_MIN_CLUSTERS - 1, -1):
+            nivel = self._nivel(zoom_nivel)
+            if bbox is not None:
+                min_lon, min_lat, max_lon, max_lat = bbox
+                nivel = nivel[
+                    nivel['lat'].between(min_lat, max_lat) & nivel['lon'].between(min_lon, max_lon)
+                ]
+            if len(nivel) <= max_marcadores:
+                return nivel.reset_index(drop=True), zoom_nivel
+
+        # Incluso al zoom más agregado hay demasiados: se conservan los más grandes
+        return nivel.nlargest(max_marcadores, 'n').reset_index(drop=True), ZOOM_MIN_CLUSTERS
@@ -0,0 +1,85 @@
+"""
+Capa de densidad de listings por rejilla
+=========================================
+
+El mapa de distribución solo dibujaba los 15 barrios con más listings y las
+coordenadas de cada listing de listings_precios no se mostraban nunca. Un
+marcador por listing bloquea el navegador a partir de unos miles de puntos.
+
+rejilla_densidad agrega todas las coordenadas en una rejilla regular de
+celdas de tamaño fijo en metros (contando solo las celdas ocupadas, así que
+una coordenada errónea lejos de la ciudad no agranda la rejilla), y puntos_heatmap
+convierte las celdas no vacías en los puntos ponderados de una capa de calor
+(folium.plugins.HeatMap). El navegador recibe unos pocos miles de celdas en
+lugar de cientos de miles de puntos, con el mismo aspecto de densidad.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Metros por grado de latitud (aproximado)
+METROS_POR_GRADO_LAT = 111_320
+
+# Lado de cada celda de la rejilla en metros
+TAMANO_CELDA_M = 150
+
+# Máximo de celdas enviadas a la capa de calor
+MAX_CELDAS_HEATMAP = 5000
+
+
+def rejilla_densidad(latitudes, longitudes, tamano_celda_m=TAMANO_CELDA_M):
+    """
+    Cuenta listings por celda de una rejilla regular en metros.
+
+    Args:
+        latitudes: array de latitudes
+        longitudes: array de longitudes
+        tamano_celda_m: lado de cada celda en metros
+
+    Returns:
+        DataFrame: una fila por celda no vacía con 'lat' y 'lon' (centro de
+            la celda) y 'n' (listings en la celda)
+    """
+    lat = np.asarray(latitudes, dtype=float)
+    lon = np.asarray(longitudes, dtype=float)
+    validos = np.isfinite(lat) & np.isfinite(lon)
+    lat, lon = lat[validos], lon[validos]
+    if len(lat) == 0:
+        return pd.DataFrame({'lat': [], 'lon': [], 'n': []})
+
+    # Tamaño de celda en grados a la latitud mediana de los puntos
+    alto = tamano_celda_m / METROS_POR_GRADO_LAT
+    ancho = alto / max(np.cos(np.radians(np.median(lat))), 1e-6)
+
+    min_lat, min_lon = lat.min(), lon.min()
+    fila = ((lat - min_lat) / alto).astype(np.int64)
+    columna = ((lon - min_lon) / ancho).astype(np.int64)
+    n_columnas = int(columna.max()) + 1
+
+    # Solo las celdas con algún punto: un np.bincount denso reservaría toda la
+    # caja que envuelve los puntos, enorme si hay una coordenada (0, 0) o invertida
+    id_celda, conteos = np.unique(fila * n_columnas + columna, return_counts=True)
+
+    return pd.DataFrame({
+        'lat': min_lat + (id_celda // n_columnas + 0.5) * alto,
+        'lon': min_lon + (id_celda % n_columnas + 0.5) * ancho,
+        'n': conteos,
+    })
+
+
+def puntos_heatmap(rejilla, max_celdas=MAX_CELDAS_HEATMAP):
+    """
+    Puntos [lat, lon, peso] para folium.plugins.HeatMap a partir de la rejilla.
+
+    Si hay más celdas que max_celdas se conservan las más densas. El peso es
+    la raíz del conteo normalizada a [0, 1], para que las celdas del centro no
+    saturen la escala de color.
+    """
+    if rejilla.empty:
+        return []
+    if len(rejilla) > max_celdas:
+        rejilla = rejilla.nlargest(max_celdas, 'n')
+
+    peso = np.sqrt(rejilla['n'].to_numpy(dtype=float))
+    peso = peso / peso.max()
+    return np.column_stack([rejilla['lat'].to_numpy(), rejilla['lon'].to_numpy(), peso]).round(5).tolist()
@@ -0,0 +1,68 @@
+"""
+Registro de disponibilidad de mapas por ciudad
+===============================================
+
+El resumen de mapas de la vista general construía el mapa de distribución
+completo solo para comprobar que no era None. Este registro responde "qué
+mapas hay disponibles para esta ciudad" a partir de los KPIs por barrio y de
+la geometría preparada, sin construir ningún mapa. Se calcula una vez al
+crear el almacén de datos compartido.
+"""
+
+MAPA_DISTRIBUCION = 'distribucion'
+MAPA_PRECIOS = 'precios'
+MAPA_SATURACION = 'saturacion'
+
+TIPOS_MAPA = [MAPA_DISTRIBUCION, MAPA_PRECIOS, MAPA_SATURACION]
+
+# Columnas de precio que puede usar el mapa de precios
+COLUMNAS_PRECIO = ['price', 'precio_medio', 'precio_medio_euros', 'average_price']
+
+
+def calcular_disponibilidad_mapas(kpis_barrio, geometrias):
+    """
+    Calcula qué mapas se pueden construir para cada ciudad.
+
+    Reproduce las condiciones de los constructores de mapas:
+    - distribución: hay KPIs de barrio para la ciudad
+    - precios: alguna columna de precio tiene valores para la ciudad
+    - saturación (coroplético): hay geometría de barrios para la ciudad
+
+    Args:
+        kpis_barrio: DataFrame de KPIs por barrio (columna 'ciudad' en minúsculas)
+        geometrias: diccionario ciudad -> GeometriaCiudad
+
+    Returns:
+        dict: ciudad -> dict tipo de mapa -> bool
+    """
+    geometrias = geometrias or {}
+    disponibilidad = {}
+
+    ciudades = set(geometrias)
+    conteos = {}
+    precios = {}
+    if kpis_barrio is not None and not kpis_barrio.empty and 'ciudad' in kpis_barrio.columns:
+        por_ciudad = kpis_barrio.groupby('ciudad', sort=False)
+        conteos = por_ciudad.size().to_dict()
+        columnas_precio = [col for col in COLUMNAS_PRECIO if col in kpis_barrio.columns]
+        if columnas_precio:
+            precios = por_ciudad[columnas_precio].count().sum(axis=1).to_dict()
+        ciudades |= set(conteos)
+
+    for ciudad in ciudades:
+        geometria = geometrias.get(ciudad)
+        disponibilidad[ciudad] = {
+            MAPA_DISTRIBUCION: conteos.get(ciudad, 0) > 0,
+            MAPA_PRECIOS: precios.get(ciudad, 0) > 0,
+            MAPA_SATURACION: geometria is not None and len(geometria) > 0,
+        }
+
+    return disponibilidad
+
+
+def mapas_disponibles(disponibilidad, ciudad):
+    """
+    Lista de tipos de mapa disponibles para una ciudad, en el orden de TIPOS_MAPA.
+    """
+    por_tipo = disponibilidad.get(str(ciudad).lower(), {})
+    return [tipo for tipo in TIPOS_MAPA if por_tipo.get(tipo, False)]
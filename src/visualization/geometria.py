@@ -0,0 +1,311 @@
+"""
+Capa de geometría preparada por ciudad
+=======================================
+
+Los mapas del dashboard recorrían todas las features del GeoJSON en cada
+render para escribir 'neighbourhood_norm' (mutando el GeoJSON cacheado) y
+recalculaban centroides normalizando nombres con expresiones regulares en
+cada llamada.
+
+GeometriaCiudad se construye una sola vez por ciudad al cargar los datos y
+contiene:
+
+- un GeoJSON preparado (copia ligera con 'neighbourhood_norm' ya calculado,
+  que comparte las geometrías con el original sin modificarlo)
+- las claves normalizadas de cada barrio
+- centroides ponderados por área, áreas y bounding boxes por barrio
+  (ver src.visualization.centroides)
+- variantes simplificadas del GeoJSON por nivel de zoom, generadas bajo
+  demanda (ver src.visualization.simplificacion)
+- un índice espacial de polígonos (ver src.visualization.indice_espacial)
+  con el que se asigna cada listing a su barrio por coordenadas; los barrios
+  de los listings (centroides de los mapas folium y claves de los mapas
+  coropléticos) se resuelven así a su polígono sin comparar nombres
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.visualization.centroides import calcular_centroides_geojson
+from src.visualization.indice_espacial import IndiceEspacialBarrios, feature_por_barrio
+from src.visualization.simplificacion import (
+    ZOOMS_VARIANTES,
+    elegir_zoom_variante,
+    simplificar_para_zoom,
+    tamano_geojson_bytes,
+)
+
+def clave_choropleth(nombre):
+    """
+    Clave usada para unir barrios con el GeoJSON en los mapas coropléticos.
+    """
+    if pd.isna(nombre):
+        return ""
+    return str(nombre).lower().strip().replace(" ", "_").replace("-", "_")
+
+
+def _bbox_feature(geometry):
+    """
+    Bounding box [min_lon, min_lat, max_lon, max_lat] de todos los anillos.
+    """
+    tipo = geometry.get('type')
+    coordenadas = geometry.get('coordinates', [])
+    if tipo == 'Polygon':
+        anillos = coordenadas
+    elif tipo == 'MultiPolygon':
+        anillos = [anillo for poligono in coordenadas for anillo in poligono]
+    else:
+        return [np.nan, np.nan, np.nan, np.nan]
+
+    anillos = [anillo for anillo in anillos if len(anillo) > 0]
+    if not anillos:
+        return [np.nan, np.nan, np.nan, np.nan]
+
+    puntos = np.concatenate([np.asarray(anillo, dtype=float)[:, :2] for anillo in anillos])
+    min_lon, min_lat = puntos.min(axis=0)
+    max_lon, max_lat = puntos.max(axis=0)
+    return [min_lon, min_lat, max_lon, max_lat]
+
+
+class GeometriaCiudad:
+    """
+    Geometría de barrios de una ciudad preparada para los mapas.
+
+    Args:
+        ciudad: clave de la ciudad en minúsculas
+        geojson: GeoJSON original (no se modifica)
+        tabla_centroides: tabla de cargar_tabla_centroides (se calcula si es None)
+    """
+
+    def __init__(self, ciudad, geojson, tabla_centroides=None):
+        self.ciudad = ciudad
+        self.geojson_original = geojson
+
+        features = geojson.get('features', []) if geojson else []
+
+        if tabla_centroides is None or len(tabla_centroides) != len(features):
+            tabla_centroides = calcular_centroides_geojson(geojson)
+        tabla_centroides = tabla_centroides.sort_values('feature')
+        centroides = [
+            None if np.isnan(lat) or np.isnan(lon) else [float(lat), float(lon)]
+            for lat, lon in zip(tabla_centroides['lat'].to_numpy(), tabla_centroides['lon'].to_numpy())
+        ]
+        self.areas_km2 = tabla_centroides['area_km2'].to_numpy(dtype=float)
+
+        self.nombres = []
+        self.claves_norm = []
+        features_preparadas = []
+        bboxes = []
+
+        for i, feature in enumerate(features):
+            propiedades = feature.get('properties') or {}
+            geometry = feature.get('geometry') or {}
+            nombre = propiedades.get('neighbourhood', '')
+
+            clave = clave_choropleth(nombre) if 'neighbourhood' in propiedades else None
+
+            self.nombres.append(nombre)
+            self.claves_norm.append(clave)
+            bboxes.append(_bbox_feature(geometry))
+
+            propiedades_preparadas = dict(propiedades)
+            if clave is not None:
+                propiedades_preparadas['neighbourhood_norm'] = clave
+            features_preparadas.append({
+                **feature,
+                'properties': propiedades_preparadas,
+            })
+
+        self.geojson = {**(geojson or {}), 'features': features_preparadas}
+        self.centroides = centroides
+        self.bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        self.claves_disponibles = frozenset(clave for clave in self.claves_norm if clave is not None)
+
+        self._variantes = {}
+        self._bytes_variantes = {}
+        self._lock_variantes = threading.Lock()
+
+        self._indice_espacial = None
+        self._feature_por_barrio = {}
+        self._posicion_listings = {}
+
+    def __len__(self):
+        return len(self.nombres)
+
+    @property
+    def indice_espacial(self):
+        """
+        Índice espacial de los polígonos de la ciudad (se construye al primer uso).
+        """
+        if self._indice_espacial is None:
+            with self._lock_variantes:
+                if self._indice_espacial is None:
+                    self._indice_espacial = IndiceEspacialBarrios(self.geojson_original)
+        return self._indice_espacial
+
+    def localizar(self, longitudes, latitudes):
+        """
+        Índice de la feature que contiene cada punto (SIN_BARRIO si ninguna).
+        """
+        return self.indice_espacial.localizar(longitudes, latitudes)
+
+    def asignar_listings(self, nombres_barrio, longitudes, latitudes):
+        """
+        Asigna los listings de la ciudad a sus polígonos por coordenadas.
+
+        Cada barrio (neighbourhood_cleansed) queda asociado al polígono que
+        contiene la mayoría de sus listings, y se guarda además la posición
+        media de sus listings para barrios sin polígono.
+
+        Args:
+            nombres_barrio: barrio de cada listing
+            longitudes: longitud de cada listing
+            latitudes: latitud de cada listing
+
+        Returns:
+            np.ndarray: índice de feature de cada listing (SIN_BARRIO si ninguna)
+        """
+        longitudes = np.asarray(longitudes, dtype=float)
+        latitudes = np.asarray(latitudes, dtype=float)
+        id_feature = self.localizar(longitudes, latitudes)
+
+        self._feature_por_barrio = {
+            str(barrio).lower(): indice
+            for barrio, indice in feature_por_barrio(nombres_barrio, id_feature).items()
+            if self.centroides[indice] is not None
+        }
+
+        posiciones = pd.DataFrame({
+            'barrio': np.asarray(nombres_barrio, dtype=object),
+            'lat': latitudes,
+            'lon': longitudes,
+        }).dropna()
+        medias = posiciones.groupby('barrio', sort=False)[['lat', 'lon']].mean()
+        self._posicion_listings = {
+            str(barrio).lower(): [float(lat), float(lon)]
+            for barrio, lat, lon in zip(medias.index, medias['lat'], medias['lon'])
+        }
+
+        return id_feature
+
+    @property
+    def barrios_asignados(self):
+        """
+        Número de barrios de listings resueltos a un polígono por coordenadas.
+        """
+        return len(self._feature_por_barrio)
+
+    def geojson_para_zoom(self, zoom):
+        """
+        GeoJSON preparado y simplificado para un nivel de zoom (ver ZOOMS_VARIANTES).
+
+        La variante se genera la primera vez que se pide y se reutiliza después.
+        """
+        zoom_variante = elegir_zoom_variante(zoom, ZOOMS_VARIANTES)
+        variante = self._variantes.get(zoom_variante)
+        if variante is None:
+            with self._lock_variantes:
+                variante = self._variantes.get(zoom_variante)
+                if variante is None:
+                    variante = simplificar_para_zoom(self.geojson, zoom_variante)
+                    self._bytes_variantes[zoom_variante] = tamano_geojson_bytes(variante)
+                    self._variantes[zoom_variante] = variante
+        return variante
+
+    def informe_tamano(self, zoom):
+        """
+        Tamaño del GeoJSON enviado al navegador a ese zoom frente al original.
+
+        Returns:
+            dict: 'zoom_variante', 'kb_original', 'kb_variante' y 'reduccion_pct'
+        """
+        zoom_variante = elegir_zoom_variante(zoom, ZOOMS_VARIANTES)
+        self.geojson_para_zoom(zoom)
+        if 'original' not in self._bytes_variantes:
+            self._bytes_variantes['original'] = tamano_geojson_bytes(self.geojson)
+
+        bytes_original = self._bytes_variantes['original']
+        bytes_variante = self._bytes_variantes[zoom_variante]
+        return {
+            'zoom_variante': zoom_variante,
+            'kb_original': bytes_original / 1024,
+            'kb_variante': bytes_variante / 1024,
+            'reduccion_pct': (1 - bytes_variante / bytes_original) * 100 if bytes_original else 0.0,
+        }
+
+    def buscar_feature(self, nombre_barrio):
+        """
+        Índice de la feature de un barrio según la asignación espacial de sus
+        listings (asignar_listings), sin comparar nombres.
+
+        Returns:
+            int | None: posición de la feature en el GeoJSON (None si ningún
+                listing del barrio cae en un polígono)
+        """
+        if not nombre_barrio or pd.isna(nombre_barrio):
+            return None
+        return self._feature_por_barrio.get(str(nombre_barrio).lower())
+
+    def claves_barrios(self, nombres_barrio):
+        """
+        Clave 'neighbourhood_norm' del polígono asignado a cada barrio, para unir
+        una tabla por barrio con el GeoJSON en los mapas coropléticos.
+
+        Args:
+            nombres_barrio: Serie de nombres de barrio
+
+        Returns:
+            Serie: clave de cada barrio ("" si no tiene polígono asignado)
+        """
+        claves = {
+            barrio: self.claves_norm[indice]
+            for barrio, indice in self._feature_por_barrio.items()
+            if self.claves_norm[indice] is not None
+        }
+        return (
+            nombres_barrio.astype(object).where(nombres_barrio.notna(), "")
+            .astype(str).str.lower().map(claves).fillna("")
+        )
+
+    def centroide(self, nombre_barrio):
+        """
+        Centroide [lat, lon] de un barrio, o None si no hay coincidencia.
+
+        Los barrios sin polígono usan la posición media de sus listings.
+        """
+        indice = self.buscar_feature(nombre_barrio)
+        if indice is None:
+            if not nombre_barrio or pd.isna(nombre_barrio):
+                return None
+            return self._posicion_listings.get(str(nombre_barrio).lower())
+        return self.centroides[indice]
+
+    def bbox(self, nombre_barrio):
+        """
+        Bounding box [min_lon, min_lat, max_lon, max_lat] de un barrio, o None.
+        """
+        indice = self.buscar_feature(nombre_barrio)
+        if indice is None:
+            return None
+        return self.bboxes[indice].tolist()
+
+
+def preparar_geometrias(geodatos, tablas_centroides=None):
+    """
+    Construye la geometría preparada de cada ciudad a partir de sus GeoJSON.
+
+    Args:
+        geodatos: diccionario ciudad -> GeoJSON
+        tablas_centroides: diccionario ciudad -> tabla de centroides (opcional)
+
+    Returns:
+        dict: ciudad -> GeometriaCiudad
+    """
+    tablas_centroides = tablas_centroides or {}
+    return {
+        ciudad: GeometriaCiudad(ciudad, geojson, tablas_centroides.get(ciudad))
+        for ciudad, geojson in (geodatos or {}).items()
+        if geojson is not None
+    }
@@ -0,0 +1,276 @@
+"""
+Índice espacial de barrios para asignar listings a polígonos
+=============================================================
+
+Los listings se asociaban a los polígonos del GeoJSON solo comparando el
+nombre de neighbourhood_cleansed con el de la feature, y los barrios sin
+coincidencia acababan en posiciones ficticias del mapa.
+
+IndiceEspacialBarrios asigna cada punto (longitud, latitud) al polígono que
+lo contiene:
+
+1. Una rejilla regular sobre la extensión de la ciudad indica, para cada
+   celda, qué barrios pueden contener puntos de esa celda (por bounding box).
+2. Los puntos se ordenan por celda, de modo que los candidatos de cada barrio
+   se obtienen como rangos contiguos del array ordenado.
+3. Para cada barrio se aplica ray casting vectorizado (regla par-impar sobre
+   todos sus anillos, de modo que los huecos y las partes de un MultiPolygon
+   se resuelven solos) contra los puntos candidatos. Las aristas de cada
+   barrio se agrupan en bandas horizontales: cada punto solo se compara con
+   las aristas de la banda de su latitud, que son las únicas que puede cruzar
+   su rayo.
+
+Escala a millones de puntos en pocos segundos sin dependencias geográficas.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Celdas por lado de la rejilla del índice
+CELDAS_POR_LADO = 64
+
+# Aristas por banda horizontal (aproximado) en el ray casting de cada barrio
+ARISTAS_POR_BANDA = 8
+
+# Máximo de pares punto x arista evaluados por bloque (limita la memoria)
+MAX_PARES_POR_BLOQUE = 4_000_000
+
+SIN_BARRIO = -1
+
+
+def _aristas_feature(geometry):
+    """
+    Aristas (x1, y1, x2, y2) de todos los anillos de una geometría.
+    """
+    tipo = geometry.get('type')
+    coordenadas = geometry.get('coordinates') or []
+    if tipo == 'Polygon':
+        anillos = coordenadas
+    elif tipo == 'MultiPolygon':
+        anillos = [anillo for poligono in coordenadas for anillo in poligono]
+    else:
+        return np.empty((0, 4))
+
+    aristas = []
+    for anillo in anillos:
+        puntos = np.asarray(anillo, dtype=float)
+        if len(puntos) < 3:
+            continue
+        puntos = puntos[:, :2]
+        if not np.array_equal(puntos[0], puntos[-1]):
+            puntos = np.vstack([puntos, puntos[:1]])
+        aristas.append(np.hstack([puntos[:-1], puntos[1:]]))
+
+    return np.vstack(aristas) if aristas else np.empty((0, 4))
+
+
+def _cruces_rayo(x, y, aristas):
+    """
+    Ray casting vectorizado: máscara de puntos dentro del conjunto de aristas.
+
+    Las aristas deben incluir todas las que pueden cruzar el rayo horizontal
+    de cada punto (las de su banda).
+    """
+    dentro = np.zeros(len(x), dtype=bool)
+    if len(aristas) == 0 or len(x) == 0:
+        return dentro
+
+    x1, y1, x2, y2 = (aristas[:, k] for k in range(4))
+    pendiente_inversa = (x2 - x1) / (y2 - y1)
+
+    tamano_bloque = max(1, MAX_PARES_POR_BLOQUE // max(1, len(x1)))
+    for inicio in range(0, len(x), tamano_bloque):
+        px = x[inicio:inicio + tamano_bloque, None]
+        py = y[inicio:inicio + tamano_bloque, None]
+        cruza = ((y1 > py) != (y2 > py)) & (px < x1 + (py - y1) * pendiente_inversa)
+        dentro[inicio:inicio + tamano_bloque] = (np.count_nonzero(cruza, axis=1) % 2) == 1
+
+    return dentro
+
+
+class _BandasAristas:
+    """
+    Aristas de un barrio agrupadas en bandas horizontales (estructura CSR).
+    """
+
+    def __init__(self, aristas):
+        # Las aristas horizontales nunca cruzan el rayo
+        aristas = aristas[aristas[:, 1] != aristas[:, 3]]
+        self.aristas = aristas
+        self.n_bandas = max(1, len(aristas) // ARISTAS_POR_BANDA)
+
+        if len(aristas) == 0:
+            self.y0, self.alto = 0.0, 1.0
+            self.offsets = np.zeros(self.n_bandas + 1, dtype=np.int64)
+            self.indices = np.empty(0, dtype=np.int64)
+            return
+
+        y_min = np.minimum(aristas[:, 1], aristas[:, 3])
+        y_max = np.maximum(aristas[:, 1], aristas[:, 3])
+        self.y0 = y_min.min()
+        self.alto = max((y_max.max() - self.y0) / self.n_bandas, 1e-12)
+
+        # Cada arista se registra en todas las bandas que atraviesa
+        banda_ini = self.banda(y_min)
+        banda_fin = self.banda(y_max)
+        repeticiones = banda_fin - banda_ini + 1
+        id_arista = np.repeat(np.arange(len(aristas)), repeticiones)
+        desplazamiento = np.arange(len(id_arista)) - np.repeat(np.cumsum(repeticiones) - repeticiones, repeticiones)
+        id_banda = np.repeat(banda_ini, repeticiones) + desplazamiento
+
+        orden = np.argsort(id_banda, kind='stable')
+        self.indices = id_arista[orden]
+        self.offsets = np.zeros(self.n_bandas + 1, dtype=np.int64)
+        np.cumsum(np.bincount(id_banda, minlength=self.n_bandas), out=self.offsets[1:])
+
+    def banda(self, y):
+        return np.clip(((np.asarray(y) - self.y0) / self.alto).astype(int), 0, self.n_bandas - 1)
+
+    def contiene(self, x, y):
+        """
+        Máscara de puntos dentro del barrio (regla par-impar sobre todos sus anillos).
+        """
+        dentro = np.zeros(len(x), dtype=bool)
+        if len(x) == 0 or len(self.aristas) == 0:
+            return dentro
+
+        banda_punto = self.banda(y)
+        orden = np.argsort(banda_punto, kind='stable')
+        bandas_ordenadas = banda_punto[orden]
+        limites = np.searchsorted(bandas_ordenadas, np.arange(self.n_bandas + 1))
+
+        for b in np.unique(bandas_ordenadas):
+            puntos = orden[limites[b]:limites[b + 1]]
+            aristas = self.aristas[self.indices[self.offsets[b]:self.offsets[b + 1]]]
+            dentro[puntos] = _cruces_rayo(x[puntos], y[puntos], aristas)
+
+        return dentro
+
+
+class IndiceEspacialBarrios:
+    """
+    Índice de rejilla sobre los polígonos de barrios de una ciudad.
+
+    Args:
+        geojson: FeatureCollection de barrios
+        celdas_por_lado: resolución de la rejilla
+    """
+
+    def __init__(self, geojson, celdas_por_lado=CELDAS_POR_LADO):
+        features = (geojson or {}).get('features', [])
+        self.n_features = len(features)
+        self.celdas_por_lado = celdas_por_lado
+        self._aristas = [_aristas_feature(feature.get('geometry') or {}) for feature in features]
+        self._bandas = [_BandasAristas(aristas) for aristas in self._aristas]
+
+        bboxes = np.full((self.n_features, 4), np.nan)
+        for i, aristas in enumerate(self._aristas):
+            if len(aristas):
+                xs = aristas[:, [0, 2]]
+                ys = aristas[:, [1, 3]]
+                bboxes[i] = [xs.min(), ys.min(), xs.max(), ys.max()]
+        self.bboxes = bboxes
+
+        validos = ~np.isnan(bboxes[:, 0])
+        if validos.any():
+            self.extension = (
+                bboxes[validos, 0].min(), bboxes[validos, 1].min(),
+                bboxes[validos, 2].max(), bboxes[validos, 3].max(),
+            )
+        else:
+            self.extension = (0.0, 0.0, 0.0, 0.0)
+
+        # Rango de celdas (columna, fila) que cubre el bounding box de cada barrio
+        self._celdas_feature = {}
+        for i in np.flatnonzero(validos):
+            c0, f0 = self._celda(bboxes[i, 0], bboxes[i, 1])
+            c1, f1 = self._celda(bboxes[i, 2], bboxes[i, 3])
+            self._celdas_feature[i] = (int(c0), int(f0), int(c1), int(f1))
+
+    def _celda(self, x, y):
+        """
+        Columna y fila de la rejilla para coordenadas (se recortan a la extensión).
+        """
+        min_x, min_y, max_x, max_y = self.extension
+        ancho = max(max_x - min_x, 1e-12)
+        alto = max(max_y - min_y, 1e-12)
+        n = self.celdas_por_lado
+        columna = np.clip(((np.asarray(x) - min_x) / ancho * n).astype(int), 0, n - 1)
+        fila = np.clip(((np.asarray(y) - min_y) / alto * n).astype(int), 0, n - 1)
+        return columna, fila
+
+    def localizar(self, longitudes, latitudes):
+        """
+        Índice de la feature que contiene cada punto.
+
+        Args:
+            longitudes: array de longitudes
+            latitudes: array de latitudes
+
+        Returns:
+            np.ndarray: índice de feature por punto (SIN_BARRIO si ninguno)
+        """
+        x = np.asarray(longitudes, dtype=float)
+        y = np.asarray(latitudes, dtype=float)
+        resultado = np.full(len(x), SIN_BARRIO, dtype=np.int32)
+        if len(x) == 0 or self.n_features == 0:
+            return resultado
+
+        min_x, min_y, max_x, max_y = self.extension
+        en_extension = np.flatnonzero(
+            np.isfinite(x) & np.isfinite(y) & (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+        )
+        if len(en_extension) == 0:
+            return resultado
+
+        # Puntos ordenados por fila y columna de la rejilla
+        columna, fila = self._celda(x[en_extension], y[en_extension])
+        n = self.celdas_por_lado
+        id_celda = fila * n + columna
+        orden = np.argsort(id_celda, kind='stable')
+        puntos_ordenados = en_extension[orden]
+        celdas_ordenadas = id_celda[orden]
+
+        for i, (c0, f0, c1, f1) in self._celdas_feature.items():
+            # Cada fila del bounding box es un rango contiguo de celdas
+            filas = np.arange(f0, f1 + 1)
+            inicios = np.searchsorted(celdas_ordenadas, filas * n + c0, side='left')
+            finales = np.searchsorted(celdas_ordenadas, filas * n + c1, side='right')
+            if not np.any(finales > inicios):
+                continue
+            candidatos = np.concatenate([puntos_ordenados[a:b] for a, b in zip(inicios, finales) if b > a])
+
+            # Solo puntos sin asignar y dentro del bounding box exacto
+            candidatos = candidatos[resultado[candidatos] == SIN_BARRIO]
+            bbox = self.bboxes[i]
+            cx, cy = x[candidatos], y[candidatos]
+            en_bbox = (cx >= bbox[0]) & (cx <= bbox[2]) & (cy >= bbox[1]) & (cy <= bbox[3])
+            candidatos = candidatos[en_bbox]
+            if len(candidatos) == 0:
+                continue
+
+            dentro = self._bandas[i].contiene(x[candidatos], y[candidatos])
+            resultado[candidatos[dentro]] = i
+
+        return resultado
+
+
+def feature_por_barrio(nombres_barrio, id_feature):
+    """
+    Polígono que contiene la mayoría de los listings de cada barrio.
+
+    Args:
+        nombres_barrio: nombre del barrio de cada listing (neighbourhood_cleansed)
+        id_feature: feature asignada a cada listing por IndiceEspacialBarrios
+
+    Returns:
+        dict: nombre de barrio -> índice de feature
+    """
+    pares = pd.DataFrame({'barrio': np.asarray(nombres_barrio), 'feature': np.asarray(id_feature)})
+    pares = pares[(pares['feature'] != SIN_BARRIO) & pares['barrio'].notna()]
+    if pares.empty:
+        return {}
+
+    conteos = pares.groupby(['barrio', 'feature'], sort=False).size().reset_index(name='n')
+    mayoritario = conteos.sort_values('n', ascending=False, kind='stable').drop_duplicates('barrio')
+    return dict(zip(mayoritario['barrio'], mayoritario['feature'].astype(int)))
@@ -0,0 +1,333 @@
+"""
+Simplificación de geometría de barrios por nivel de zoom
+=========================================================
+
+Los neighbourhoods_*.geojson tienen coordenadas a resolución completa
+(~17.000 vértices y ~400 KB por ciudad) y cada mapa coroplético de Plotly los
+incrusta enteros en la figura que se envía al navegador.
+
+Este módulo genera variantes compactas del GeoJSON para cada nivel de zoom:
+
+1. Detecta los vértices de unión (donde cambia el conjunto de barrios que
+   comparten el vértice) y los fija, de modo que cada frontera compartida se
+   simplifica como un arco independiente y queda idéntica en los dos barrios
+   (no aparecen huecos ni solapes entre vecinos).
+2. Simplifica cada arco con Douglas-Peucker (distancias con NumPy) usando una
+   tolerancia de medio píxel al zoom de la variante.
+3. Cuantiza las coordenadas a los decimales que permite esa tolerancia y
+   descarta los anillos que quedan por debajo de esa resolución.
+
+Las variantes se generan al cargar (GeometriaCiudad.geojson_para_zoom, bajo
+demanda) y no se guardan en disco. El informe de tamaños de cada ciudad se
+obtiene sin conexión con:
+
+    python -m src.visualization.simplificacion
+"""
+
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Niveles de zoom para los que se generan variantes: el zoom inicial de los
+# mapas coropléticos del dashboard (Plotly aplica el zoom del usuario en el
+# navegador, sin volver a pedir la geometría)
+ZOOMS_VARIANTES = (10,)
+
+# Tolerancia de simplificación en píxeles de pantalla
+PIXELES_TOLERANCIA = 0.5
+
+# Resolución (en decimales) usada para detectar vértices compartidos
+DECIMALES_TOPOLOGIA = 7
+
+
+def tolerancia_para_zoom(zoom, pixeles=PIXELES_TOLERANCIA):
+    """
+    Tolerancia en grados equivalente a 'pixeles' píxeles (teselas de 256 px) a ese zoom.
+    """
+    return pixeles * 360.0 / (256 * 2 ** zoom)
+
+
+def decimales_para_tolerancia(tolerancia):
+    """
+    Decimales de cuantización cuyo paso no supera la mitad de la tolerancia.
+    """
+    return max(0, int(math.ceil(-math.log10(tolerancia / 2))))
+
+
+def elegir_zoom_variante(zoom, zooms=ZOOMS_VARIANTES):
+    """
+    Zoom de la variante a usar: la más detallada que no supere el zoom pedido.
+    """
+    zooms = sorted(zooms)
+    candidatos = [z for z in zooms if z <= zoom]
+    return candidatos[-1] if candidatos else zooms[0]
+
+
+def _douglas_peucker(puntos, tolerancia):
+    """
+    Máscara de vértices conservados por Douglas-Peucker (extremos siempre incluidos).
+    """
+    n = len(puntos)
+    conservar = np.zeros(n, dtype=bool)
+    if n == 0:
+        return conservar
+    conservar[0] = conservar[-1] = True
+
+    pila = [(0, n - 1)]
+    while pila:
+        i, j = pila.pop()
+        if j <= i + 1:
+            continue
+
+        a = puntos[i]
+        b = puntos[j]
+        tramo = puntos[i + 1:j]
+        ab = b - a
+        longitud = np.hypot(ab[0], ab[1])
+        if longitud == 0:
+            distancias = np.hypot(tramo[:, 0] - a[0], tramo[:, 1] - a[1])
+        else:
+            distancias = np.abs(ab[0] * (tramo[:, 1] - a[1]) - ab[1] * (tramo[:, 0] - a[0])) / longitud
+
+        k = int(np.argmax(distancias))
+        if distancias[k] > tolerancia:
+            indice = i + 1 + k
+            conservar[indice] = True
+            pila.append((i, indice))
+            pila.append((indice, j))
+
+    return conservar
+
+
+def _anillos_geojson(geojson):
+    """
+    Recorre los anillos del GeoJSON como (feature, polígono, anillo, coordenadas).
+    """
+    for i, feature in enumerate(geojson.get('features', [])):
+        geometry = feature.get('geometry') or {}
+        tipo = geometry.get('type')
+        if tipo == 'Polygon':
+            poligonos = [geometry.get('coordinates') or []]
+        elif tipo == 'MultiPolygon':
+            poligonos = geometry.get('coordinates') or []
+        else:
+            continue
+        for p, poligono in enumerate(poligonos):
+            for r, anillo in enumerate(poligono):
+                yield i, p, r, np.asarray(anillo, dtype=float)[:, :2]
+
+
+def _firmas_vertices(anillos):
+    """
+    Para cada vértice de cada anillo, identificador del conjunto de anillos que lo contienen.
+
+    Returns:
+        list: un array de firmas por anillo (misma longitud que el anillo sin cierre)
+    """
+    escala = 10 ** DECIMALES_TOPOLOGIA
+    abiertos = [np.round(anillo[:-1] * escala).astype(np.int64) if len(anillo) > 1 else
+                np.round(anillo * escala).astype(np.int64) for anillo in anillos]
+    if not abiertos or sum(len(a) for a in abiertos) == 0:
+        return [np.zeros(len(a), dtype=np.int64) for a in abiertos]
+
+    longitudes = np.array([len(a) for a in abiertos])
+    todos = np.concatenate(abiertos)
+    id_anillo = np.repeat(np.arange(len(abiertos)), longitudes)
+    _, id_vertice = np.unique(todos, axis=0, return_inverse=True)
+    id_vertice = id_vertice.ravel()
+
+    # Conjunto de anillos de cada vértice -> identificador entero de ese conjunto
+    pares = pd.DataFrame({'vertice': id_vertice, 'anillo': id_anillo}).drop_duplicates()
+    conjuntos = pares.sort_values(['vertice', 'anillo']).groupby('vertice')['anillo'].agg(tuple)
+    id_conjunto = pd.factorize(conjuntos)[0]
+    firma_por_vertice = np.empty(len(conjuntos), dtype=np.int64)
+    firma_por_vertice[conjuntos.index.to_numpy()] = id_conjunto
+    firmas = firma_por_vertice[id_vertice]
+
+    return np.split(firmas, np.cumsum(longitudes)[:-1])
+
+
+def _simplificar_anillo(anillo, firmas, tolerancia, escala_lon):
+    """
+    Simplifica un anillo cerrado fijando los vértices de unión con otros anillos.
+    """
+    abierto = anillo[:-1] if len(anillo) > 1 and np.array_equal(anillo[0], anillo[-1]) else anillo
+    n = len(abierto)
+    if n < 4:
+        return anillo
+
+    proyectado = abierto * np.array([escala_lon, 1.0])
+
+    # Vértices de unión: el conjunto de anillos que lo comparten cambia respecto a un vecino
+    fijos = (firmas != np.roll(firmas, 1)) | (firmas != np.roll(firmas, -1))
+    indices_fijos = np.flatnonzero(fijos)
+
+    if len(indices_fijos) == 0:
+        # Sin uniones: anclar en el vértice menor (lexicográfico) y el más lejano a él,
+        # que no dependen del vértice inicial del anillo
+        ancla = int(np.lexsort((abierto[:, 1], abierto[:, 0]))[0])
+        distancias = np.hypot(*(proyectado - proyectado[ancla]).T)
+        indices_fijos = np.array(sorted({ancla, int(np.argmax(distancias))}))
+
+    conservar = np.zeros(n, dtype=bool)
+    conservar[indices_fijos] = True
+
+    # Arcos entre vértices fijos consecutivos (recorrido circular)
+    for k, inicio in enumerate(indices_fijos):
+        fin = indices_fijos[(k + 1) % len(indices_fijos)]
+        if fin > inicio:
+            indices = np.arange(inicio, fin + 1)
+        else:
+            indices = np.concatenate([np.arange(inicio, n), np.arange(0, fin + 1)])
+        if len(indices) <= 2:
+            continue
+
+        arco = proyectado[indices]
+        # Sentido canónico para que los dos barrios de una frontera obtengan el mismo arco
+        invertir = tuple(abierto[indices[0]]) > tuple(abierto[indices[-1]])
+        if invertir:
+            mascara = _douglas_peucker(arco[::-1], tolerancia)[::-1]
+        else:
+            mascara = _douglas_peucker(arco, tolerancia)
+        conservar[indices[mascara]] = True
+
+    simplificado = abierto[conservar]
+    if len(simplificado) < 3:
+        return anillo
+    return np.vstack([simplificado, simplificado[:1]])
+
+
+def _cuantizar_anillo(anillo, decimales):
+    """
+    Redondea las coordenadas y elimina vértices consecutivos repetidos.
+
+    Devuelve None si el anillo queda degenerado (menos de 4 vértices): su
+    tamaño está por debajo de la resolución de la variante, y conservarlo con
+    otra precisión lo separaría de la frontera cuantizada de sus vecinos.
+    """
+    redondeado = np.round(anillo, decimales)
+    if len(redondeado) > 1:
+        distinto = np.any(redondeado[1:] != redondeado[:-1], axis=1)
+        redondeado = np.vstack([redondeado[:1], redondeado[1:][distinto]])
+    if len(redondeado) < 4:
+        return None
+    return redondeado
+
+
+def simplificar_geojson(geojson, tolerancia, decimales=None):
+    """
+    Devuelve una copia simplificada del GeoJSON conservando la topología compartida.
+
+    Args:
+        geojson: FeatureCollection de barrios (no se modifica)
+        tolerancia: tolerancia de Douglas-Peucker en grados de latitud
+        decimales: decimales de cuantización (por defecto según la tolerancia)
+
+    Returns:
+        dict: FeatureCollection con las mismas propiedades y geometría simplificada
+    """
+    if decimales is None:
+        decimales = decimales_para_tolerancia(tolerancia)
+
+    entradas = list(_anillos_geojson(geojson))
+    anillos = [anillo for _, _, _, anillo in entradas]
+    firmas = _firmas_vertices(anillos)
+
+    latitudes = np.concatenate([anillo[:, 1] for anillo in anillos]) if anillos else np.array([0.0])
+    escala_lon = math.cos(math.radians(float(np.mean(latitudes))))
+
+    # Los anillos degenerados se descartan; sin anillo exterior se descarta el polígono
+    coordenadas = {}
+    for (i, p, r, anillo), firmas_anillo in zip(entradas, firmas):
+        poligonos = coordenadas.setdefault(i, {})
+        if r > 0 and p not in poligonos:
+            continue
+        simplificado = _simplificar_anillo(anillo, firmas_anillo, tolerancia, escala_lon)
+        cuantizado = _cuantizar_anillo(simplificado, decimales)
+        if cuantizado is not None:
+            poligonos.setdefault(p, []).append(cuantizado.tolist())
+
+    features = []
+    for i, feature in enumerate(geojson.get('features', [])):
+        geometry = feature.get('geometry') or {}
+        if i in coordenadas:
+            poligonos = [coordenadas[i][p] for p in sorted(coordenadas[i])]
+            if geometry.get('type') == 'Polygon' and len(poligonos) == 1:
+                geometry = {'type': 'Polygon', 'coordinates': poligonos[0]}
+            else:
+                geometry = {'type': 'MultiPolygon', 'coordinates': poligonos}
+        features.append({**feature, 'geometry': geometry})
+
+    return {**geojson, 'features': features}
+
+
+def simplificar_para_zoom(geojson, zoom):
+    """
+    Variante del GeoJSON adecuada para un nivel de zoom.
+    """
+    return simplificar_geojson(geojson, tolerancia_para_zoom(zoom))
+
+
+def contar_vertices(geojson):
+    """
+    Número total de vértices del GeoJSON.
+    """
+    return sum(len(anillo) for _, _, _, anillo in _anillos_geojson(geojson))
+
+
+def tamano_geojson_bytes(geojson):
+    """
+    Tamaño del GeoJSON serializado de forma compacta, tal como viaja al navegador.
+    """
+    return len(json.dumps(geojson, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+
+
+def informe_variantes(geojson, variantes):
+    """
+    Informe de vértices y tamaño del GeoJSON original frente a cada variante.
+
+    Args:
+        geojson: GeoJSON original
+        variantes: diccionario zoom -> GeoJSON simplificado
+
+    Returns:
+        DataFrame: una fila por versión con vértices, KB y reducción (%)
+    """
+    bytes_original = tamano_geojson_bytes(geojson)
+    filas = [{
+        'variante': 'original',
+        'vertices': contar_vertices(geojson),
+        'kb': bytes_original / 1024,
+        'reduccion_pct': 0.0,
+    }]
+    for zoom in sorted(variantes):
+        tamano = tamano_geojson_bytes(variantes[zoom])
+        filas.append({
+            'variante': f"z{zoom}",
+            'vertices': contar_vertices(variantes[zoom]),
+            'kb': tamano / 1024,
+            'reduccion_pct': (1 - tamano / bytes_original) * 100 if bytes_original else 0.0,
+        })
+    return pd.DataFrame(filas)
+
+
+def informe_geojson(geojson_path, zooms=ZOOMS_VARIANTES):
+    """
+    Genera en memoria las variantes simplificadas de un neighbourhoods_*.geojson
+    y devuelve su informe de tamaños (ver informe_variantes).
+    """
+    with open(geojson_path, 'r', encoding='utf-8') as f:
+        geojson = json.load(f)
+
+    variantes = {zoom: simplificar_para_zoom(geojson, zoom) for zoom in zooms}
+    return informe_variantes(geojson, variantes)
+
+
+if __name__ == "__main__":
+    directorio = Path(__file__).resolve().parents[2] / "data" / "processed"
+    for ruta_geojson in sorted(directorio.glob("neighbourhoods_*.geojson")):
+        print(f"\n🗺️ {ruta_geojson.name}")
+        print(informe_geojson(ruta_geojson).to_string(index=False, float_format=lambda v: f"{v:.1f}"))
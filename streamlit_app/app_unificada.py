@@ -18,14 +18,36 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import folium
+from folium.plugins import HeatMap
 from streamlit_folium import st_folium
 import json
 from pathlib import Path
 import numpy as np
 import random
-import re
+import sys
+import time
+import uuid
 from datetime import datetime
 
+# Módulos compartidos del proyecto (src/) accesibles desde el dashboard
+RAIZ_PROYECTO = Path(__file__).parent.parent
+if str(RAIZ_PROYECTO) not in sys.path:
+    sys.path.insert(0, str(RAIZ_PROYECTO))
+
+from src.data_processing.almacen_compartido import AlmacenDatosCompartido, activar_copy_on_write
+from src.data_processing.almacen_kpis import limpiar_listings, obtener_kpis
+from src.data_processing.base_datos import consultar_tabla, ruta_base_datos, tabla_vigente
+from src.data_processing.cache_listings import cargar_listings_con_cache
+from src.data_processing.esquema_listings import aplicar_esquema
+from src.visualization.cache_mapas import CacheLRU
+from src.visualization.clustering_listings import ZOOM_LISTINGS_INDIVIDUALES
+from src.visualization.densidad import puntos_heatmap, rejilla_densidad
+from src.visualization.centroides import cargar_tabla_centroides
+from src.visualization.disponibilidad_mapas import MAPA_DISTRIBUCION, MAPA_PRECIOS, MAPA_SATURACION
+
+# Las vistas de los datos compartidos entre sesiones dependen de copy-on-write
+activar_copy_on_write()
+
 # Configuración de la página
 st.set_page_config(
     page_title="Dashboard Turismo Urbano - Datos Oficiales",
@@ -486,11 +508,12 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
 def cargar_datasets_verificados():
     """
     Carga el dataset principal listings_unificado.csv y calcula métricas en tiempo real.
     Enfoque simplificado y confiable usando el mismo método que app_+precio.py
+    
+    Se ejecuta una sola vez por proceso desde obtener_almacen_compartido().
     """
     try:
         # Buscar el archivo principal en las mismas rutas que app_+precio.py
@@ -514,97 +537,42 @@ def cargar_datasets_verificados():
                 st.info(f"   - {path}")
             return None
         
-        # Cargar el dataset principal
-        df_principal = pd.read_csv(data_path)
+        # Cargar el dataset principal (caché Parquet si el CSV no ha cambiado)
+        df_principal, info_carga = cargar_listings_con_cache(data_path)
         
         # Limpiar y procesar datos siguiendo la metodología original
-        
-        # Convertir precios a numérico
-        df_principal['price'] = pd.to_numeric(df_principal['price'], errors='coerce')
-        
-        # Aplicar filtros de limpieza estrictos como el original
-        # 1. Eliminar filas sin ciudad o barrio
-        df_principal = df_principal.dropna(subset=['ciudad', 'neighbourhood_cleansed'])
-        
-        # 2. Eliminar filas sin precio válido
-        df_principal = df_principal.dropna(subset=['price'])
-        
-        # 3. Eliminar precios <= 0
-        df_principal = df_principal[df_principal['price'] > 0]
-        
-        # 4. Filtrar precios extremos (>=6501)
-        df_principal = df_principal[df_principal['price'] < 6501]
+        # (precio numérico, sin ciudad/barrio vacíos, precios en (0, 6501))
+        df_principal = limpiar_listings(df_principal)
         
         # Crear estructura de datasets compatible con app_nuevo.py
         datasets = {}
         
-        # 1. Crear kpis_ciudad calculados en tiempo real
-        kpis_ciudad = []
-        for ciudad in df_principal['ciudad'].dropna().unique():
-            df_ciudad = df_principal[df_principal['ciudad'] == ciudad]
-            
-            total_listings = len(df_ciudad)
-            entire_home_count = len(df_ciudad[df_ciudad['room_type'] == 'Entire home/apt'])
-            ratio_entire_home = (entire_home_count / total_listings * 100) if total_listings > 0 else 0
-            
-            # Calcular precio medio manejando NaN
-            precio_medio = df_ciudad['price'].dropna().mean() if not df_ciudad['price'].dropna().empty else 0
-            
-            disponibilidad_media = df_ciudad['availability_365'].dropna().mean() if 'availability_365' in df_ciudad.columns and not df_ciudad['availability_365'].dropna().empty else 200
-            ocupacion_estimada = max(0, 100 - (disponibilidad_media / 365 * 100)) if disponibilidad_media > 0 else 0
-            
-            kpis_ciudad.append({
-                'ciudad': ciudad.lower(),
-                'total_listings': total_listings,
-                'precio_medio': precio_medio,
-                'precio_medio_euros': precio_medio,  # Alias para compatibilidad
-                'ratio_entire_home': ratio_entire_home,
-                'ocupacion_estimada': ocupacion_estimada,
-                'entire_home_count': entire_home_count,
-                'barrios_count': df_ciudad['neighbourhood_cleansed'].dropna().nunique()
-            })
-        
-        datasets['kpis_ciudad'] = pd.DataFrame(kpis_ciudad)
-        
-        # 2. Crear kpis_barrio calculados en tiempo real
-        kpis_barrio = []
-        for ciudad in df_principal['ciudad'].dropna().unique():
-            df_ciudad = df_principal[df_principal['ciudad'] == ciudad]
-            
-            for barrio in df_ciudad['neighbourhood_cleansed'].dropna().unique():
-                df_barrio = df_ciudad[df_ciudad['neighbourhood_cleansed'] == barrio]
-                
-                if len(df_barrio) > 0:
-                    total_listings = len(df_barrio)
-                    entire_home_count = len(df_barrio[df_barrio['room_type'] == 'Entire home/apt'])
-                    ratio_entire_home = (entire_home_count / total_listings * 100) if total_listings > 0 else 0
-                    
-                    # Calcular precio medio manejando NaN
-                    precio_medio = df_barrio['price'].dropna().mean() if not df_barrio['price'].dropna().empty else 0
-                    
-                    disponibilidad_media = df_barrio['availability_365'].dropna().mean() if 'availability_365' in df_barrio.columns and not df_barrio['availability_365'].dropna().empty else 200
-                    
-                    kpis_barrio.append({
-                        'ciudad': ciudad.lower(),
-                        'barrio': barrio,
-                        'total_listings': total_listings,
-                        'entire_home_count': entire_home_count,
-                        'ratio_entire_home': ratio_entire_home,
-                        'ratio_entire_home_pct': ratio_entire_home,  # Alias para compatibilidad
-                        'precio_medio': precio_medio,
-                        'precio_medio_euros': precio_medio,  # Alias para compatibilidad
-                        'price': precio_medio,  # Alias para compatibilidad
-                        'disponibilidad_media': disponibilidad_media,
-                        'lat_mean': df_barrio['latitude'].dropna().mean() if 'latitude' in df_barrio.columns and not df_barrio['latitude'].dropna().empty else 0,
-                        'lon_mean': df_barrio['longitude'].dropna().mean() if 'longitude' in df_barrio.columns and not df_barrio['longitude'].dropna().empty else 0
-                    })
-        
-        datasets['kpis_barrio'] = pd.DataFrame(kpis_barrio)
+        # 1-2. kpis_ciudad y kpis_barrio desde el almacén versionado (solo se recalculan las ciudades que cambiaron).
+        # Antes de aplicar_esquema: el hash de cada ciudad se calcula sobre los mismos tipos que en el pipeline
+        datasets['kpis_ciudad'], datasets['kpis_barrio'], info_kpis = obtener_kpis(data_path, df_principal)
+        
+        # Tipos compactos (categóricas, coordenadas float32...) validados contra el esquema
+        df_principal, informe_esquema = aplicar_esquema(df_principal)
         
         # 3. Mantener el dataset principal como listings_precios para compatibilidad
-        datasets['listings_precios'] = df_principal.copy()
+        # (sin copia: con copy-on-write las modificaciones posteriores no lo alteran)
+        datasets['listings_precios'] = df_principal
+        
+        # 4-5. Ocupación mensual por barrio (calendar.csv.gz) y actividad por barrio (reseñas recientes).
+        # Si la base de datos SQLite está al día con el CSV, cada vista consulta solo las filas de su
+        # ciudad (obtener_tabla_ciudad); si no, se carga el CSV entero (si se ha exportado)
+        ruta_bd = ruta_base_datos(data_path.parent)
+        tablas_sqlite = []
+        for clave, tabla in [('ocupacion_mensual', 'ocupacion_barrio_mensual'), ('actividad_resenas', 'actividad_resenas_barrio')]:
+            ruta_csv = data_path.parent / f'{tabla}.csv'
+            if tabla_vigente(ruta_bd, tabla, ruta_csv):
+                tablas_sqlite.append({'clave': clave, 'db_path': str(ruta_bd), 'tabla': tabla})
+                datasets[clave] = pd.DataFrame()
+            else:
+                datasets[clave] = pd.read_csv(ruta_csv) if ruta_csv.exists() else pd.DataFrame()
+        datasets['tablas_sqlite'] = pd.DataFrame(tablas_sqlite, columns=['clave', 'db_path', 'tabla'])
         
-        # 4. Crear datasets adicionales vacíos para mantener compatibilidad
+        # 6. Crear datasets adicionales vacíos para mantener compatibilidad
         datasets['impacto_urbano'] = pd.DataFrame()
         datasets['precios'] = pd.DataFrame()
         datasets['economia'] = pd.DataFrame()
@@ -617,7 +585,20 @@ def cargar_datasets_verificados():
         total_barrios = len(datasets['kpis_barrio'])
         
         st.success(f"✅ Dataset unificado cargado: {total_listings:,} alojamientos reales en {total_ciudades} ciudades ({total_barrios} barrios analizados)")
-        st.info(f"📊 Datos procesados: KPIs calculados en tiempo real desde listings_unificado.csv")
+        st.info(f"📊 Datos procesados: KPIs derivados de listings_unificado.csv")
+        origen_carga = "caché Parquet" if info_carga['origen'] == 'parquet' else "CSV"
+        st.info(f"⚡ Arranque en frío: {info_carga['tiempo_carga_s']:.2f}s leyendo {origen_carga} ({info_carga['filas']:,} filas, {len(info_carga['columnas'])} columnas)")
+        st.info(f"🗜️ Listings en memoria: {informe_esquema['mb_antes']:.1f} MB → {informe_esquema['mb_despues']:.1f} MB (-{informe_esquema['reduccion_pct']:.0f}%) con tipos compactos")
+        if informe_esquema['valores_invalidos']:
+            detalle = ', '.join(f"{col}: {n:,}" for col, n in informe_esquema['valores_invalidos'].items())
+            st.warning(f"⚠️ Valores no válidos cargados como nulos ({detalle})")
+        if info_kpis['origen'] == 'almacen':
+            st.info(f"📦 KPIs leídos del almacén versionado {info_kpis['version']} en {info_kpis['tiempo_s'] * 1000:.0f} ms")
+        elif info_kpis['origen'] == 'incremental':
+            ciudades_recalculadas = ', '.join(c.title() for c in info_kpis['ciudades_recalculadas']) or 'ninguna'
+            st.info(f"🔄 KPIs actualizados de forma incremental en {info_kpis['tiempo_s'] * 1000:.0f} ms (recalculadas: {ciudades_recalculadas})")
+        else:
+            st.info(f"🔄 KPIs recalculados desde los listings en {info_kpis['tiempo_s'] * 1000:.0f} ms")
         
         return datasets
         
@@ -625,6 +606,46 @@ def cargar_datasets_verificados():
         st.error(f"❌ Error al cargar el dataset principal: {str(e)}")
         return None
 
+def obtener_tabla_ciudad(datasets, clave, ciudad_seleccionada):
+    """
+    Filas de una ciudad de una tabla auxiliar por barrio.
+    
+    Con la tabla en la base de datos SQLite, consulta indexada por ciudad; si no, filtro
+    del DataFrame cargado desde el CSV.
+    """
+    tablas_sqlite = datasets.get('tablas_sqlite', pd.DataFrame())
+    origen = tablas_sqlite[tablas_sqlite['clave'] == clave] if not tablas_sqlite.empty else tablas_sqlite
+    if not origen.empty:
+        return consultar_tabla(origen['db_path'].iloc[0], origen['tabla'].iloc[0], filtros={'ciudad': ciudad_seleccionada.lower()})
+    
+    df = datasets.get(clave, pd.DataFrame())
+    if df.empty:
+        return df
+    return consultar_ciudad(clave, ciudad_seleccionada)
+
+def consultar_ciudad(clave, ciudad_seleccionada, columnas=None, filtros=None):
+    """
+    Filas de una ciudad de un dataset del almacén compartido, con filtros opcionales.
+    
+    Consulta parametrizada del motor del almacén (particiones por ciudad y predicados
+    (columna, operador, valor) evaluados solo sobre las filas de la ciudad), sin
+    máscaras ni copias de la tabla completa.
+    """
+    return obtener_almacen_compartido().consultas.consultar(
+        clave, ciudad=ciudad_seleccionada, columnas=columnas, filtros=filtros
+    )
+
+def top_ciudad(clave, ciudad_seleccionada, columna, k, columnas=None):
+    """
+    Las k filas de una ciudad con mayor valor de una columna (como nlargest).
+    
+    Sale del ranking por ciudad y métrica del almacén, que se construye una vez y
+    comparten todas las pestañas y sesiones.
+    """
+    return obtener_almacen_compartido().consultas.top(
+        clave, columna, k, ciudad=ciudad_seleccionada, columnas=columnas
+    )
+
 @st.cache_data
 def cargar_metadatos_trazabilidad():
     """
@@ -660,10 +681,15 @@ def cargar_metadatos_trazabilidad():
         st.warning(f"⚠️ No se pudieron cargar los metadatos de trazabilidad: {e}")
         return {}
 
-@st.cache_data
 def cargar_datos_geograficos():
     """
     Carga los archivos GeoJSON para crear mapas interactivos.
+    
+    Se ejecuta una sola vez por proceso desde obtener_almacen_compartido().
+    Junto a cada GeoJSON se lee (o se genera) su tabla de centroides ponderados por área.
+    
+    Returns:
+        tuple: (geodatos por ciudad, tablas de centroides por ciudad)
     """
     try:
         # Usar las mismas rutas que para los datasets
@@ -682,9 +708,10 @@ def cargar_datos_geograficos():
         
         if data_path is None:
             st.warning("⚠️ No se encontró el directorio de datos para archivos geográficos")
-            return {}
+            return {}, {}
         
         geodatos = {}
+        tablas_centroides = {}
         
         # Cargar archivos GeoJSON disponibles
         archivos_geojson = {
@@ -699,94 +726,189 @@ def cargar_datos_geograficos():
                 try:
                     with open(archivo_path, 'r', encoding='utf-8') as f:
                         geodatos[ciudad] = json.load(f)
+                    tablas_centroides[ciudad] = cargar_tabla_centroides(archivo_path, geodatos[ciudad])
                     # st.success(f"✅ GeoJSON cargado para {ciudad.title()}")
                 except Exception as e:
                     st.warning(f"⚠️ Error al cargar GeoJSON para {ciudad}: {e}")
             # else:
             #     st.info(f"ℹ️ GeoJSON no disponible para {ciudad}")
         
-        return geodatos
+        return geodatos, tablas_centroides
         
     except Exception as e:
         st.warning(f"⚠️ Error al cargar datos geográficos: {e}")
-        return {}
+        return {}, {}
 
-def calcular_centroides_barrios(geodatos):
+@st.cache_resource(show_spinner=False)
+def obtener_almacen_compartido():
     """
-    Calcula los centroides de cada barrio a partir de los datos GeoJSON.
+    Construye una sola vez por proceso el almacén de datos compartido por todas las sesiones.
     
-    Args:
-        geodatos: Diccionario con los datos GeoJSON por ciudad
-        
-    Returns:
-        dict: Diccionario con centroides por ciudad y barrio
+    A diferencia de st.cache_data, st.cache_resource no serializa ni copia el resultado:
+    todas las sesiones reciben el mismo objeto y acceden a los datos mediante vistas
+    de solo lectura.
     """
-    def normalizar_nombre(nombre):
-        """Normaliza nombres de barrios para mejorar coincidencias"""
-        if not nombre:
-            return ""
-        # Convertir a minúsculas, quitar acentos y caracteres especiales
-        nombre = nombre.lower()
-        nombre = re.sub(r'[áàäâ]', 'a', nombre)
-        nombre = re.sub(r'[éèëê]', 'e', nombre)
-        nombre = re.sub(r'[íìïî]', 'i', nombre)
-        nombre = re.sub(r'[óòöô]', 'o', nombre)
-        nombre = re.sub(r'[úùüû]', 'u', nombre)
-        nombre = re.sub(r'[ñ]', 'n', nombre)
-        nombre = re.sub(r'[^a-z0-9\s]', '', nombre)
-        nombre = re.sub(r'\s+', ' ', nombre).strip()
-        return nombre
-    
-    centroides = {}
-    
-    for ciudad, geojson_data in geodatos.items():
-        if geojson_data is None:
-            continue
+    geodatos, tablas_centroides = cargar_datos_geograficos()
+    return AlmacenDatosCompartido(cargar_datasets_verificados(), geodatos, tablas_centroides)
+
+@st.cache_resource(show_spinner=False)
+def obtener_cache_figuras():
+    """
+    Caché LRU de figuras coropléticas serializadas, compartida por todas las sesiones.
+    """
+    return CacheLRU(MAX_FIGURAS_CACHE, nombre="Figuras Plotly")
+
+@st.cache_resource(show_spinner=False)
+def obtener_cache_mapas_folium():
+    """
+    Caché LRU de los mapas folium construidos, por ciudad y versión de datos.
+    """
+    return CacheLRU(MAX_MAPAS_FOLIUM_CACHE, nombre="Mapas folium")
+
+def recargar_datos():
+    """
+    Vuelve a cargar los datos y descarta las figuras y mapas de versiones anteriores.
+    """
+    obtener_almacen_compartido.clear()
+    version = obtener_almacen_compartido().version
+    for cache in (obtener_cache_figuras(), obtener_cache_mapas_folium()):
+        cache.invalidar(lambda clave: clave[1] != version)
+
+def mostrar_informe_memoria(almacen):
+    """
+    Muestra en la barra lateral el informe de memoria de la sesión actual.
+    """
+    if 'id_sesion' not in st.session_state:
+        st.session_state['id_sesion'] = uuid.uuid4().hex
+    almacen.registrar_sesion(st.session_state['id_sesion'])
+    
+    informe = almacen.informe_memoria()
+    
+    with st.sidebar:
+        with st.expander("🧠 Memoria de la sesión"):
+            st.markdown(f"""
+            **📦 Datos compartidos:** {informe['compartido_mb']:.1f} MB  
+            • Datasets: {informe['datasets_mb']:.1f} MB  
+            • GeoJSON: {informe['geodatos_mb']:.1f} MB
             
-        centroides[ciudad] = {}
-        
-        for feature in geojson_data.get('features', []):
-            barrio_name = feature['properties'].get('neighbourhood', '')
-            geometry = feature.get('geometry', {})
+            **👥 Sesiones activas que comparten los datos:** {informe['sesiones']} 
+            ({informe['sesiones_totales']} desde el arranque)
             
-            if geometry.get('type') in ['Polygon', 'MultiPolygon']:
-                coords = geometry.get('coordinates', [])
-                
-                # Función para calcular centroide de un polígono
-                def calcular_centroide_poligono(polygon_coords):
-                    if not polygon_coords:
-                        return None
-                    
-                    # Si es MultiPolygon, tomar el primer polígono
-                    if isinstance(polygon_coords[0][0][0], list):
-                        polygon_coords = polygon_coords[0]
-                    
-                    # Tomar el anillo exterior del polígono
-                    exterior_ring = polygon_coords[0] if polygon_coords else []
-                    
-                    if len(exterior_ring) < 3:
-                        return None
-                    
-                    # Calcular centroide simple (promedio de coordenadas)
-                    lons = [coord[0] for coord in exterior_ring]
-                    lats = [coord[1] for coord in exterior_ring]
-                    
-                    centroid_lon = sum(lons) / len(lons)
-                    centroid_lat = sum(lats) / len(lats)
-                    
-                    return [centroid_lat, centroid_lon]
-                
-                centroide = calcular_centroide_poligono(coords)
-                if centroide and barrio_name:
-                    # Guardar tanto el nombre original como el normalizado
-                    nombre_normalizado = normalizar_nombre(barrio_name)
-                    centroides[ciudad][barrio_name.lower()] = centroide
-                    if nombre_normalizado != barrio_name.lower():
-                        centroides[ciudad][nombre_normalizado] = centroide
-    
-    return centroides
+            **🪶 Memoria propia de esta sesión:** vistas sin copia (≈0 MB)
+            
+            **💾 Ahorro estimado:** {informe['ahorro_estimado_mb']:.1f} MB frente a una copia por sesión 
+            ({informe['copia_evitada_por_rerun_mb']:.1f} MB de copia evitada en cada interacción)
+            """)
+            if informe['memoria_proceso_mb'] is not None:
+                st.caption(f"Memoria máxima del proceso: {informe['memoria_proceso_mb']:.0f} MB")
+            
+            if st.button("🔄 Recargar datos", help="Vuelve a leer los ficheros de datos y descarta los mapas en caché de versiones anteriores"):
+                recargar_datos()
+                st.rerun()
+
+# Secciones del dashboard (antes pestañas st.tabs, que calculaban todas en cada interacción)
+SECCION_RESUMEN = "📊 Resumen"
+SECCION_BARRIOS = "🏘️ Mapa por Barrios"
+SECCION_RATIO = "📈 Ratio Turístico"
+SECCION_ALERTAS = "⚠️ Alertas Saturación"
+SECCION_OCUPACION = "🏅 Ocupación Turística"
+SECCION_ECONOMICO = "💰 Impacto Económico"
+SECCION_RECOMENDACIONES = "💡 Recomendaciones"
+
+SECCIONES_DASHBOARD = [
+    SECCION_RESUMEN,
+    SECCION_BARRIOS,
+    SECCION_RATIO,
+    SECCION_ALERTAS,
+    SECCION_OCUPACION,
+    SECCION_ECONOMICO,
+    SECCION_RECOMENDACIONES,
+]
+
+# Número de renders guardados por sesión para el informe de latencia
+MAX_LATENCIAS_REGISTRADAS = 50
+
+# Figuras coropléticas en caché (cada una incluye el GeoJSON de su ciudad)
+MAX_FIGURAS_CACHE = 24
+
+# Mapas folium construidos en caché (st_folium los renderiza en cada visualización)
+MAX_MAPAS_FOLIUM_CACHE = 12
+
+# Zoom inicial de los mapas coropléticos (elige la variante simplificada del GeoJSON)
+ZOOM_MAPA_COROPLETICO = 10
+
+# Niveles de zoom ofrecidos en la vista de listings individuales
+ZOOMS_VISTA_LISTINGS = list(range(11, ZOOM_LISTINGS_INDIVIDUALES + 2))
+
+@st.fragment
+def mostrar_mapa_folium(mapa, **kwargs):
+    """
+    Muestra un mapa folium (de la caché de mapas) dentro de un fragmento.
+    
+    Al mover o hacer zoom en el mapa, st_folium provoca un rerun: dentro del fragmento
+    solo se vuelve a ejecutar el mapa, no toda la sección, y el mapa no se reconstruye.
+    """
+    st_folium(mapa, use_container_width=True, **kwargs)
+
+def registrar_latencia_seccion(seccion, segundos):
+    """
+    Guarda en la sesión el tiempo de render de la sección activa (últimas interacciones).
+    """
+    historial = st.session_state.setdefault('latencias_secciones', [])
+    historial.append({'seccion': seccion, 'segundos': segundos})
+    del historial[:-MAX_LATENCIAS_REGISTRADAS]
+
+def mostrar_latencias_secciones(geodatos=None, ciudad_seleccionada=None):
+    """
+    Muestra en la barra lateral la latencia por interacción de cada sección,
+    el uso de las cachés de mapas y el tamaño del GeoJSON enviado al navegador.
+    """
+    historial = st.session_state.get('latencias_secciones', [])
+    if not historial:
+        return
+    
+    ultima = historial[-1]
+    df_latencias = pd.DataFrame(historial)
+    resumen = (
+        df_latencias.groupby('seccion', sort=False)['segundos']
+        .agg(['count', 'mean', 'max'])
+        .rename(columns={'count': 'Renders', 'mean': 'Media (s)', 'max': 'Máx (s)'})
+        .round(2)
+    )
+    
+    with st.sidebar:
+        with st.expander("⏱️ Latencia por interacción", expanded=False):
+            st.markdown(f"**Último render:** {ultima['seccion']} en {ultima['segundos']:.2f}s")
+            st.caption("Solo se calcula la sección activa en cada interacción.")
+            st.dataframe(resumen, use_container_width=True)
+            
+            for cache in (obtener_cache_figuras(), obtener_cache_mapas_folium()):
+                stats = cache.estadisticas()
+                st.caption(
+                    f"{stats['nombre']}: {stats['aciertos']} aciertos, {stats['fallos']} fallos "
+                    f"({stats['entradas']}/{stats['capacidad']} en caché)"
+                )
+            
+            if geodatos and ciudad_seleccionada and ciudad_seleccionada.lower() in geodatos:
+                tamano = geodatos[ciudad_seleccionada.lower()].informe_tamano(ZOOM_MAPA_COROPLETICO)
+                st.caption(
+                    f"GeoJSON {ciudad_seleccionada} (zoom {tamano['zoom_variante']}): "
+                    f"{tamano['kb_original']:.0f} KB → {tamano['kb_variante']:.0f} KB "
+                    f"(-{tamano['reduccion_pct']:.0f}%)"
+                )
 
 def crear_mapa_distribucion_listings(datasets, ciudad_seleccionada, geodatos):
+    """
+    Devuelve el mapa de distribución de listings, desde la caché de mapas por versión
+    de datos y ciudad.
+    """
+    clave_mapa = ('distribucion', obtener_almacen_compartido().version, ciudad_seleccionada.lower())
+    return obtener_cache_mapas_folium().obtener(
+        clave_mapa,
+        lambda: construir_mapa_distribucion_listings(datasets, ciudad_seleccionada, geodatos)
+    )
+
+def construir_mapa_distribucion_listings(datasets, ciudad_seleccionada, geodatos):
     """
     Crea un mapa interactivo que muestra la distribución de listings por barrio.
     """
@@ -795,11 +917,7 @@ def crear_mapa_distribucion_listings(datasets, ciudad_seleccionada, geodatos):
         return None
     
     # Filtrar datos por ciudad
-    df_barrio = datasets['kpis_barrio'].copy()
-    if 'ciudad' in df_barrio.columns:
-        df_ciudad = df_barrio[df_barrio['ciudad'] == ciudad_seleccionada.lower()]
-    else:
-        df_ciudad = df_barrio
+    df_ciudad = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
     
     if len(df_ciudad) == 0:
         st.warning(f"⚠️ No hay datos disponibles para {ciudad_seleccionada}")
@@ -821,61 +939,39 @@ def crear_mapa_distribucion_listings(datasets, ciudad_seleccionada, geodatos):
         tiles='CartoDB dark_matter'
     )
     
+    # Capa de densidad con todos los listings de la ciudad, agregados por celdas
+    df_listings = datasets.get('listings_precios')
+    if df_listings is not None and {'ciudad', 'latitude', 'longitude'}.issubset(df_listings.columns):
+        coords = consultar_ciudad('listings_precios', ciudad_seleccionada, columnas=['latitude', 'longitude'])
+        puntos_densidad = puntos_heatmap(rejilla_densidad(coords['latitude'], coords['longitude']))
+        if puntos_densidad:
+            HeatMap(
+                puntos_densidad,
+                name=f"Densidad de listings ({len(coords):,})",
+                radius=12,
+                blur=15,
+                min_opacity=0.3
+            ).add_to(m)
+    
     # Agregar marcadores para los barrios con más listings
-    top_barrios = df_ciudad.nlargest(15, 'total_listings')
+    top_barrios = top_ciudad('kpis_barrio', ciudad_seleccionada, 'total_listings', 15)
+    capa_barrios = folium.FeatureGroup(name="Barrios con más listings").add_to(m)
     
-    # Calcular centroides de barrios desde los datos GeoJSON
-    centroides = calcular_centroides_barrios(geodatos)
-    ciudad_key = ciudad_seleccionada.lower()
+    # Centroides precalculados en la geometría preparada de la ciudad
+    geometria = geodatos.get(ciudad_seleccionada.lower()) if geodatos else None
     
-    # Contador para fallback de posicionamiento
+    # Barrios sin posición real (no se dibujan)
     fallback_count = 0
     
     for i, (_, barrio) in enumerate(top_barrios.iterrows()):
-        barrio_name = barrio['barrio'].lower()
-        
-        # Función auxiliar para normalizar nombres (misma que en calcular_centroides_barrios)
-        def normalizar_nombre(nombre):
-            if not nombre:
-                return ""
-            nombre = nombre.lower()
-            nombre = re.sub(r'[áàäâ]', 'a', nombre)
-            nombre = re.sub(r'[éèëê]', 'e', nombre)
-            nombre = re.sub(r'[íìïî]', 'i', nombre)
-            nombre = re.sub(r'[óòöô]', 'o', nombre)
-            nombre = re.sub(r'[úùüû]', 'u', nombre)
-            nombre = re.sub(r'[ñ]', 'n', nombre)
-            nombre = re.sub(r'[^a-z0-9\s]', '', nombre)
-            nombre = re.sub(r'\s+', ' ', nombre).strip()
-            return nombre
-        
-        barrio_normalizado = normalizar_nombre(barrio['barrio'])
-        
-        # Intentar obtener coordenadas reales del centroide
-        coordenadas_encontradas = False
-        if ciudad_key in centroides:
-            # Probar primero con nombre original en minúsculas
-            if barrio_name in centroides[ciudad_key]:
-                lat, lon = centroides[ciudad_key][barrio_name]
-                coordenadas_encontradas = True
-            # Si no funciona, probar con nombre normalizado
-            elif barrio_normalizado in centroides[ciudad_key]:
-                lat, lon = centroides[ciudad_key][barrio_normalizado]
-                coordenadas_encontradas = True
-        
-        if not coordenadas_encontradas:
-            # Fallback mejorado: para evitar puntos en el agua
-            if ciudad_seleccionada == "Mallorca":
-                # Para Mallorca, usar siempre el centro de Palma
-                lat = centro[0]
-                lon = centro[1]
-            else:
-                # Para otras ciudades, distribución circular pequeña alrededor del centro
-                angle = (fallback_count / max(1, len(top_barrios))) * 2 * np.pi
-                radius = 0.015 + (fallback_count % 3) * 0.008  # Radio más pequeño para evitar agua
-                lat = centro[0] + radius * np.cos(angle)
-                lon = centro[1] + radius * np.sin(angle)
+        
+        # Centroide del polígono al que el índice espacial asignó los listings del barrio
+        # (o posición media de sus listings); sin posición real el barrio no se dibuja
+        centroide = geometria.centroide(barrio['barrio']) if geometria is not None else None
+        if centroide is None:
             fallback_count += 1
+            continue
+        lat, lon = centroide
         
         # Color basado en concentración de listings
         total_listings = barrio.get('total_listings', 0)
@@ -913,7 +1009,9 @@ def crear_mapa_distribucion_listings(datasets, ciudad_seleccionada, geodatos):
             fillOpacity=0.7,
             weight=2,
             tooltip=f"{barrio['barrio']}: {total_listings:,} listings"
-        ).add_to(m)
+        ).add_to(capa_barrios)
+    
+    folium.LayerControl(collapsed=True).add_to(m)
     
     # Agregar leyenda optimizada y responsive para Streamlit
     legend_html = '''
@@ -957,6 +1055,20 @@ def crear_mapa_distribucion_listings(datasets, ciudad_seleccionada, geodatos):
     return m
 
 def crear_mapa_precios_desde_barrios(df_barrios, ciudad_seleccionada, geodatos=None):
+    """
+    Devuelve el mapa de precios, desde la caché de mapas por versión de datos, ciudad
+    y barrios mostrados.
+    """
+    # Las secciones pasan subconjuntos distintos de barrios: el contenido forma parte de la clave
+    columnas_clave = [col for col in ('barrio', 'precio_medio_euros', 'total_listings') if col in df_barrios.columns]
+    huella_barrios = int(pd.util.hash_pandas_object(df_barrios[columnas_clave], index=False).sum())
+    clave_mapa = ('precios', obtener_almacen_compartido().version, ciudad_seleccionada.lower(), huella_barrios)
+    return obtener_cache_mapas_folium().obtener(
+        clave_mapa,
+        lambda: construir_mapa_precios_desde_barrios(df_barrios, ciudad_seleccionada, geodatos)
+    )
+
+def construir_mapa_precios_desde_barrios(df_barrios, ciudad_seleccionada, geodatos=None):
     """
     Crea un mapa de precios usando los datos de barrios que tienen información de precios.
     """
@@ -976,58 +1088,21 @@ def crear_mapa_precios_desde_barrios(df_barrios, ciudad_seleccionada, geodatos=N
         tiles='CartoDB dark_matter'
     )
     
-    # Calcular centroides de barrios si están disponibles
-    centroides = calcular_centroides_barrios(geodatos) if geodatos else {}
-    ciudad_key = ciudad_seleccionada.lower()
+    # Centroides precalculados en la geometría preparada, si está disponible
+    geometria = geodatos.get(ciudad_seleccionada.lower()) if geodatos else None
     
-    # Crear marcadores para cada barrio con datos de precio
+    # Crear marcadores para cada barrio con datos de precio (sin posición real no se dibujan)
     fallback_count = 0
     
     for i, (_, barrio) in enumerate(df_barrios.iterrows()):
-        barrio_name = barrio['barrio'].lower()
-        
-        # Función auxiliar para normalizar nombres
-        def normalizar_nombre(nombre):
-            if not nombre:
-                return ""
-            nombre = nombre.lower()
-            nombre = re.sub(r'[áàäâ]', 'a', nombre)
-            nombre = re.sub(r'[éèëê]', 'e', nombre)
-            nombre = re.sub(r'[íìïî]', 'i', nombre)
-            nombre = re.sub(r'[óòöô]', 'o', nombre)
-            nombre = re.sub(r'[úùüû]', 'u', nombre)
-            nombre = re.sub(r'[ñ]', 'n', nombre)
-            nombre = re.sub(r'[^a-z0-9\s]', '', nombre)
-            nombre = re.sub(r'\s+', ' ', nombre).strip()
-            return nombre
-        
-        barrio_normalizado = normalizar_nombre(barrio['barrio'])
-        
-        # Intentar obtener coordenadas reales del centroide
-        coordenadas_encontradas = False
-        if ciudad_key in centroides:
-            # Probar primero con nombre original en minúsculas
-            if barrio_name in centroides[ciudad_key]:
-                lat, lon = centroides[ciudad_key][barrio_name]
-                coordenadas_encontradas = True
-            # Si no funciona, probar con nombre normalizado
-            elif barrio_normalizado in centroides[ciudad_key]:
-                lat, lon = centroides[ciudad_key][barrio_normalizado]
-                coordenadas_encontradas = True
-        
-        if not coordenadas_encontradas:
-            # Fallback mejorado: para evitar puntos en el agua
-            if ciudad_seleccionada == "Mallorca":
-                # Para Mallorca, usar siempre el centro de Palma
-                lat = centro[0]
-                lon = centro[1]
-            else:
-                # Para otras ciudades, distribución circular pequeña alrededor del centro
-                angle = (fallback_count / max(1, len(df_barrios))) * 2 * np.pi
-                radius = 0.015 + (fallback_count % 3) * 0.008  # Radio más pequeño para evitar agua
-                lat = centro[0] + radius * np.cos(angle)
-                lon = centro[1] + radius * np.sin(angle)
+        
+        # Centroide del polígono al que el índice espacial asignó los listings del barrio
+        # (o posición media de sus listings); sin posición real el barrio no se dibuja
+        centroide = geometria.centroide(barrio['barrio']) if geometria is not None else None
+        if centroide is None:
             fallback_count += 1
+            continue
+        lat, lon = centroide
         
         precio = barrio.get('precio_medio_euros', 0)
         
@@ -1122,9 +1197,92 @@ def crear_mapa_precios_desde_barrios(df_barrios, ciudad_seleccionada, geodatos=N
     
     return m
 
+def crear_mapa_listings_individuales(ciudad_seleccionada, geodatos, zoom, barrio=None):
+    """
+    Devuelve el mapa de listings agrupados por zoom, desde la caché de mapas por
+    versión de datos, ciudad, zoom y barrio.
+    """
+    almacen = obtener_almacen_compartido()
+    clave_mapa = ('listings', almacen.version, ciudad_seleccionada.lower(), zoom, barrio)
+    return obtener_cache_mapas_folium().obtener(
+        clave_mapa,
+        lambda: construir_mapa_listings_individuales(
+            almacen.indice_clusters(ciudad_seleccionada), ciudad_seleccionada, geodatos, zoom, barrio
+        )
+    )
+
+def construir_mapa_listings_individuales(indice, ciudad_seleccionada, geodatos, zoom, barrio=None):
+    """
+    Crea un mapa con los listings agrupados en el servidor para el zoom y barrio elegidos.
+    
+    Cada marcador es un cluster con el número de listings y su precio medio; a partir de
+    ZOOM_LISTINGS_INDIVIDUALES, si caben, se dibujan los listings uno a uno.
+    """
+    if indice is None or len(indice) == 0:
+        return None
+    
+    # Bounding box del barrio elegido (o toda la ciudad)
+    geometria = geodatos.get(ciudad_seleccionada.lower()) if geodatos else None
+    bbox = geometria.bbox(barrio) if geometria is not None and barrio else None
+    
+    marcadores, zoom_agregacion = indice.clusters(zoom, bbox)
+    if marcadores.empty:
+        return None
+    
+    m = folium.Map(
+        location=[marcadores['lat'].mean(), marcadores['lon'].mean()],
+        zoom_start=zoom,
+        tiles='CartoDB dark_matter'
+    )
+    if bbox is not None:
+        m.fit_bounds([[bbox[1], bbox[0]], [bbox[3], bbox[2]]])
+    
+    if zoom_agregacion is None:
+        # Listings individuales
+        for _, listing in marcadores.iterrows():
+            precio = listing.get('price', np.nan)
+            texto_precio = f"€{precio:.0f}/noche" if pd.notna(precio) else "sin precio"
+            popup_text = f"""
+            <div style="font-family: Arial, sans-serif; min-width: 180px;">
+            <h4 style="margin-bottom: 8px; color: #333;">Listing {listing.get('id', '')}</h4>
+            <p><b>📍 Barrio:</b> {listing.get('neighbourhood_cleansed', '')}</p>
+            <p><b>🏠 Tipo:</b> {listing.get('room_type', '')}</p>
+            <p><b>💰 Precio:</b> {texto_precio}</p>
+            </div>
+            """
+            folium.CircleMarker(
+                location=[listing['lat'], listing['lon']],
+                radius=4,
+                popup=folium.Popup(popup_text, max_width=260),
+                color='#00d4ff',
+                fillColor='#00d4ff',
+                fillOpacity=0.8,
+                weight=1,
+                tooltip=f"{listing.get('room_type', 'Listing')}: {texto_precio}"
+            ).add_to(m)
+    else:
+        # Clusters: tamaño proporcional al logaritmo del número de listings
+        for _, cluster in marcadores.iterrows():
+            n = int(cluster['n'])
+            precio_medio = cluster.get('precio_medio', np.nan)
+            texto_precio = f" · €{precio_medio:.0f} de media" if pd.notna(precio_medio) else ""
+            folium.CircleMarker(
+                location=[cluster['lat'], cluster['lon']],
+                radius=max(5, min(30, 4 + 8 * np.log10(n + 1))),
+                color='#ff8c00',
+                fillColor='#ff8c00',
+                fillOpacity=0.6,
+                weight=1,
+                tooltip=f"{n:,} listings{texto_precio}"
+            ).add_to(m)
+    
+    return m
+
 def crear_mapa_choropleth_barrios(datasets, ciudad_seleccionada, geodatos):
     """
     Crea un mapa coroplético (choropleth) usando datos geográficos reales si están disponibles.
+    
+    Devuelve la figura serializada (dict de Plotly) desde la caché de figuras.
     """
     ciudad_key = ciudad_seleccionada.lower()
     
@@ -1138,30 +1296,17 @@ def crear_mapa_choropleth_barrios(datasets, ciudad_seleccionada, geodatos):
     
     try:
         # Filtrar datos por ciudad
-        df_barrio = datasets['kpis_barrio'].copy()
-        if 'ciudad' in df_barrio.columns:
-            df_ciudad = df_barrio[df_barrio['ciudad'] == ciudad_seleccionada.lower()]
-        else:
-            df_ciudad = df_barrio
+        df_ciudad = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
         
         if len(df_ciudad) == 0:
             st.warning(f"⚠️ No hay datos de barrios para {ciudad_seleccionada}")
             return None
         
-        # Normalizar nombres de barrios para hacer match con GeoJSON
-        def normalizar_nombre(nombre):
-            if pd.isna(nombre):
-                return ""
-            return str(nombre).lower().strip().replace(" ", "_").replace("-", "_")
+        # Polígono de cada barrio según la asignación espacial de sus listings
+        df_ciudad['barrio_norm'] = geodatos[ciudad_key].claves_barrios(df_ciudad['barrio'])
         
-        df_ciudad['barrio_norm'] = df_ciudad['barrio'].apply(normalizar_nombre)
-        
-        # Normalizar nombres en GeoJSON
-        geojson_data = geodatos[ciudad_key]
-        for feature in geojson_data['features']:
-            if 'neighbourhood' in feature['properties']:
-                nombre_original = feature['properties']['neighbourhood']
-                feature['properties']['neighbourhood_norm'] = normalizar_nombre(nombre_original)
+        # GeoJSON preparado con 'neighbourhood_norm', simplificado para el zoom del mapa
+        geojson_data = geodatos[ciudad_key].geojson_para_zoom(ZOOM_MAPA_COROPLETICO)
         
         # Coordenadas del centro por ciudad
         centros = {
@@ -1201,40 +1346,45 @@ def crear_mapa_choropleth_barrios(datasets, ciudad_seleccionada, geodatos):
         if 'precio_medio_euros' in df_ciudad.columns:
             labels['precio_medio_euros'] = 'Precio Medio (€)'
         
-        # Crear el mapa coroplético
-        fig = px.choropleth_mapbox(
-            df_ciudad,
-            geojson=geojson_data,
-            locations='barrio_norm',
-            featureidkey="properties.neighbourhood_norm",
-            color=color_col,
-            hover_name='barrio',
-            hover_data=hover_data,
-            color_continuous_scale='Viridis',
-            mapbox_style="carto-darkmatter",
-            zoom=10,
-            center=centro,
-            opacity=0.8,
-            title=f"🗺️ Mapa Coroplético - {ciudad_seleccionada}",
-            labels=labels
-        )
+        # Figura serializada en caché por (versión de datos, ciudad, métrica, solo críticos, umbral)
+        clave_figura = ('choropleth', obtener_almacen_compartido().version, ciudad_key, color_col, False, None)
+        
+        def construir_figura():
+            fig = px.choropleth_mapbox(
+                df_ciudad,
+                geojson=geojson_data,
+                locations='barrio_norm',
+                featureidkey="properties.neighbourhood_norm",
+                color=color_col,
+                hover_name='barrio',
+                hover_data=hover_data,
+                color_continuous_scale='Viridis',
+                mapbox_style="carto-darkmatter",
+                zoom=ZOOM_MAPA_COROPLETICO,
+                center=centro,
+                opacity=0.8,
+                title=f"🗺️ Mapa Coroplético - {ciudad_seleccionada}",
+                labels=labels
+            )
         
-        # Personalizar el layout para tema oscuro
-        fig.update_layout(
-            height=600,
-            showlegend=True,
-            margin=dict(l=0, r=0, t=50, b=0),
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white'),
-            title=dict(
-                font=dict(size=16, color='white'),
-                x=0.5,
-                xanchor='center'
+            # Personalizar el layout para tema oscuro
+            fig.update_layout(
+                height=600,
+                showlegend=True,
+                margin=dict(l=0, r=0, t=50, b=0),
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='white'),
+                title=dict(
+                    font=dict(size=16, color='white'),
+                    x=0.5,
+                    xanchor='center'
+                )
             )
-        )
+            
+            return fig.to_plotly_json()
         
-        return fig
+        return obtener_cache_figuras().obtener(clave_figura, construir_figura)
         
     except Exception as e:
         st.warning(f"⚠️ No se pudo crear el mapa coroplético: {str(e)}")
@@ -1243,6 +1393,8 @@ def crear_mapa_choropleth_barrios(datasets, ciudad_seleccionada, geodatos):
 def crear_mapa_coropletico_avanzado(datasets, ciudad_seleccionada, geodatos, mostrar_criticos=False, umbral_saturacion=50):
     """
     Crea un mapa coroplético avanzado con filtros interactivos basado en el dashboard original.
+    
+    Devuelve la figura serializada (dict de Plotly) desde la caché de figuras.
     """
     if datasets['kpis_barrio'].empty:
         st.warning("⚠️ No hay datos de barrios para crear el mapa coroplético")
@@ -1256,11 +1408,7 @@ def crear_mapa_coropletico_avanzado(datasets, ciudad_seleccionada, geodatos, mos
     
     try:
         # Filtrar datos por ciudad seleccionada
-        df_barrio = datasets['kpis_barrio'].copy()
-        if 'ciudad' in df_barrio.columns:
-            df_map = df_barrio[df_barrio['ciudad'] == ciudad_seleccionada.lower()]
-        else:
-            df_map = df_barrio
+        df_map = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
         
         if len(df_map) == 0:
             st.warning(f"⚠️ No hay datos de barrios para {ciudad_seleccionada}")
@@ -1268,38 +1416,38 @@ def crear_mapa_coropletico_avanzado(datasets, ciudad_seleccionada, geodatos, mos
         
         # Aplicar filtro de barrios críticos según umbral (similar al dashboard original)
         if mostrar_criticos and 'ratio_entire_home_pct' in df_map.columns:
-            df_map_original = df_map.copy()  # Guardar copia para debugging
-            df_map = df_map[df_map['ratio_entire_home_pct'] > umbral_saturacion]
-            st.info(f"🔍 Mostrando solo barrios con ratio > {umbral_saturacion}%: {len(df_map)} de {len(df_map_original)} registros")
+            # Recuento y máximo por búsqueda binaria en el índice de umbral del ratio
+            indice_ratio = obtener_almacen_compartido().consultas.indice_umbral(
+                'kpis_barrio', 'ratio_entire_home_pct', ciudad_seleccionada
+            )
+            total_barrios = len(df_map)
+            criticos = indice_ratio.resumen('>', umbral_saturacion)
+            st.info(f"🔍 Mostrando solo barrios con ratio > {umbral_saturacion}%: {criticos['filas']} de {total_barrios} registros")
             
             # Si no hay barrios que cumplan el criterio, mostrar información útil
-            if len(df_map) == 0:
-                max_ratio = df_map_original['ratio_entire_home_pct'].max() if len(df_map_original) > 0 else 0
+            if criticos['filas'] == 0:
+                max_ratio = indice_ratio.maximo() if len(indice_ratio) > 0 else 0
                 st.warning(f"⚠️ No hay barrios que cumplan el criterio de saturación > {umbral_saturacion}%")
                 st.info(f"💡 El ratio máximo disponible para {ciudad_seleccionada} es {max_ratio:.1f}%. Intenta reducir el umbral de saturación en la barra lateral.")
                 return None
-        
+
+            df_map = consultar_ciudad(
+                'kpis_barrio', ciudad_seleccionada, filtros=[('ratio_entire_home_pct', '>', umbral_saturacion)]
+            )
+
         if len(df_map) == 0:
             st.warning(f"⚠️ No hay datos de barrios para {ciudad_seleccionada}")
             return None
         
-        # Normalizar nombres de barrios para hacer match con GeoJSON
-        def normalizar_nombre(nombre):
-            if pd.isna(nombre):
-                return ""
-            return str(nombre).lower().strip().replace(" ", "_").replace("-", "_")
-        
-        df_map['barrio_norm'] = df_map['barrio'].apply(normalizar_nombre)
+        # Polígono de cada barrio según la asignación espacial de sus listings
+        geometria = geodatos[ciudad_key]
+        df_map['barrio_norm'] = geometria.claves_barrios(df_map['barrio'])
         
-        # Normalizar nombres en GeoJSON
-        geojson_data = geodatos[ciudad_key]
-        for feature in geojson_data['features']:
-            if 'neighbourhood' in feature['properties']:
-                nombre_original = feature['properties']['neighbourhood']
-                feature['properties']['neighbourhood_norm'] = normalizar_nombre(nombre_original)
+        # GeoJSON preparado con 'neighbourhood_norm', simplificado para el zoom del mapa
+        geojson_data = geometria.geojson_para_zoom(ZOOM_MAPA_COROPLETICO)
         
         # Verificar coincidencias
-        geojson_barrios = [f['properties']['neighbourhood_norm'] for f in geojson_data['features'] if 'neighbourhood_norm' in f['properties']]
+        geojson_barrios = geometria.claves_disponibles
         matches = df_map['barrio_norm'].isin(geojson_barrios)
         
         if matches.sum() == 0:
@@ -1316,7 +1464,7 @@ def crear_mapa_coropletico_avanzado(datasets, ciudad_seleccionada, geodatos, mos
                 st.info(f"📋 Ejemplos de barrios en datos: {ejemplos_datos}")
             
             if len(geojson_barrios) > 0:
-                ejemplos_geojson = [f['properties'].get('neighbourhood', 'Sin nombre') for f in geojson_data['features'][:5]]
+                ejemplos_geojson = [nombre or 'Sin nombre' for nombre in geometria.nombres[:5]]
                 st.info(f"🗺️ Ejemplos de barrios en GeoJSON: {ejemplos_geojson}")
             
             return None
@@ -1386,40 +1534,49 @@ def crear_mapa_coropletico_avanzado(datasets, ciudad_seleccionada, geodatos, mos
         elif 'precio_medio' in df_viz_filtered.columns:
             labels_dict['precio_medio'] = 'Precio Medio (€)'
         
-        # Crear el mapa coroplético
-        fig = px.choropleth_mapbox(
-            df_viz_filtered,
-            geojson=geojson_data,
-            locations='barrio_norm',
-            featureidkey="properties.neighbourhood_norm",
-            color=color_col,
-            hover_name='barrio',
-            hover_data=hover_data_dict,
-            color_continuous_scale='Viridis',
-            mapbox_style="carto-darkmatter",
-            zoom=10,
-            center=centro,
-            opacity=0.8,
-            title=f"🗺️ Saturación Airbnb por Barrio - {ciudad_seleccionada}",
-            labels=labels_dict
+        # Figura serializada en caché por (versión de datos, ciudad, métrica, solo críticos, umbral);
+        # sin filtro de críticos el umbral no cambia la figura
+        clave_figura = (
+            'coropletico_avanzado', obtener_almacen_compartido().version, ciudad_key, color_col,
+            bool(mostrar_criticos), umbral_saturacion if mostrar_criticos else None
         )
         
-        # Personalizar el layout para tema oscuro (similar al dashboard original)
-        fig.update_layout(
-            height=600,
-            showlegend=True,
-            margin=dict(l=0, r=0, t=50, b=0),
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white'),
-            title=dict(
-                font=dict(size=16, color='white'),
-                x=0.5,
-                xanchor='center'
+        def construir_figura():
+            fig = px.choropleth_mapbox(
+                df_viz_filtered,
+                geojson=geojson_data,
+                locations='barrio_norm',
+                featureidkey="properties.neighbourhood_norm",
+                color=color_col,
+                hover_name='barrio',
+                hover_data=hover_data_dict,
+                color_continuous_scale='Viridis',
+                mapbox_style="carto-darkmatter",
+                zoom=ZOOM_MAPA_COROPLETICO,
+                center=centro,
+                opacity=0.8,
+                title=f"🗺️ Saturación Airbnb por Barrio - {ciudad_seleccionada}",
+                labels=labels_dict
             )
-        )
         
-        return fig
+            # Personalizar el layout para tema oscuro (similar al dashboard original)
+            fig.update_layout(
+                height=600,
+                showlegend=True,
+                margin=dict(l=0, r=0, t=50, b=0),
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='white'),
+                title=dict(
+                    font=dict(size=16, color='white'),
+                    x=0.5,
+                    xanchor='center'
+                )
+            )
+            
+            return fig.to_plotly_json()
+        
+        return obtener_cache_figuras().obtener(clave_figura, construir_figura)
         
     except Exception as e:
         st.warning(f"⚠️ No se pudo crear el mapa coroplético: {str(e)}")
@@ -1562,7 +1719,7 @@ def mostrar_vision_general(datasets, metricas, geodatos, ciudad_seleccionada):
     with col_map1:
         mapa_distribucion = crear_mapa_distribucion_listings(datasets, ciudad_seleccionada, geodatos)
         if mapa_distribucion is not None:
-            st_folium(mapa_distribucion, use_container_width=True, height=400, key="mapa_distribucion_vision")
+            mostrar_mapa_folium(mapa_distribucion, height=400, key="mapa_distribucion_vision")
         else:
             st.info(f"📊 Mapa de distribución no disponible para {ciudad_seleccionada}")
     
@@ -1585,7 +1742,7 @@ def mostrar_vision_general(datasets, metricas, geodatos, ciudad_seleccionada):
     if 'kpis_barrio' in datasets and not datasets['kpis_barrio'].empty:
         df_barrios = datasets['kpis_barrio']
         if 'ciudad' in df_barrios.columns:
-            df_ciudad_precios = df_barrios[df_barrios['ciudad'] == ciudad_seleccionada.lower()]
+            df_ciudad_precios = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
             
             precio_cols = ['price', 'precio_medio', 'precio_medio_euros', 'average_price']
             precio_col_valida = None
@@ -1611,7 +1768,7 @@ def mostrar_vision_general(datasets, metricas, geodatos, ciudad_seleccionada):
                     with col_precio1:
                         mapa_precios = crear_mapa_precios_desde_barrios(df_precios_validos, ciudad_seleccionada, geodatos)
                         if mapa_precios is not None:
-                            st_folium(mapa_precios, use_container_width=True, height=400, key="mapa_precios_vision")
+                            mostrar_mapa_folium(mapa_precios, height=400, key="mapa_precios_vision")
                         else:
                             st.info(f"📊 Mapa de precios no disponible para {ciudad_seleccionada}")
                     
@@ -1718,34 +1875,15 @@ def mostrar_vision_general(datasets, metricas, geodatos, ciudad_seleccionada):
     # Resumen de mapas disponibles
     st.markdown("#### � **Resumen de Mapas Territoriales**")
     
-    mapas_disponibles = 0
-    mapas_info = []
-    
-    # Verificar disponibilidad de cada mapa
-    if crear_mapa_distribucion_listings(datasets, ciudad_seleccionada, geodatos) is not None:
-        mapas_disponibles += 1
-        mapas_info.append("✅ **Distribución de Alojamientos**: Ubicación y concentración geográfica")
-    
-    # Verificar mapa de precios
-    precio_disponible = False
-    if 'kpis_barrio' in datasets and not datasets['kpis_barrio'].empty:
-        df_barrios = datasets['kpis_barrio']
-        if 'ciudad' in df_barrios.columns:
-            df_ciudad = df_barrios[df_barrios['ciudad'] == ciudad_seleccionada.lower()]
-            precio_cols = ['price', 'precio_medio', 'precio_medio_euros', 'average_price']
-            for col in precio_cols:
-                if col in df_ciudad.columns and len(df_ciudad[col].dropna()) > 0:
-                    precio_disponible = True
-                    break
-    
-    if precio_disponible:
-        mapas_disponibles += 1
-        mapas_info.append("✅ **Análisis de Precios**: Variación territorial de tarifas")
-    
-    # Verificar mapas coropléticos
-    if geodatos and ciudad_seleccionada.lower() in geodatos:
-        mapas_disponibles += 1
-        mapas_info.append("✅ **Saturación Territorial**: Intensidad por barrio/distrito")
+    # Registro de disponibilidad calculado una vez al cargar los datos (no construye mapas)
+    descripciones_mapas = {
+        MAPA_DISTRIBUCION: "✅ **Distribución de Alojamientos**: Ubicación y concentración geográfica",
+        MAPA_PRECIOS: "✅ **Análisis de Precios**: Variación territorial de tarifas",
+        MAPA_SATURACION: "✅ **Saturación Territorial**: Intensidad por barrio/distrito",
+    }
+    tipos_disponibles = obtener_almacen_compartido().mapas_disponibles(ciudad_seleccionada)
+    mapas_disponibles = len(tipos_disponibles)
+    mapas_info = [descripciones_mapas[tipo] for tipo in tipos_disponibles]
     
     col_resumen1, col_resumen2 = st.columns([1, 1])
     
@@ -1780,14 +1918,14 @@ def mostrar_vision_general(datasets, metricas, geodatos, ciudad_seleccionada):
         if 'kpis_barrio' in datasets and not datasets['kpis_barrio'].empty:
             df_barrios = datasets['kpis_barrio']
             if 'ciudad' in df_barrios.columns:
-                df_ciudad_pred = df_barrios[df_barrios['ciudad'].str.lower() == ciudad_seleccionada.lower()]
+                df_ciudad_pred = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
                 
                 if not df_ciudad_pred.empty and 'total_listings' in df_ciudad_pred.columns:
                     # Crear proyección de crecimiento por barrio
                     import plotly.graph_objects as go
                     
                     # Seleccionar top 5 barrios más activos
-                    top_barrios = df_ciudad_pred.nlargest(5, 'total_listings')
+                    top_barrios = top_ciudad('kpis_barrio', ciudad_seleccionada, 'total_listings', 5)
                     
                     # Simular tendencias basadas en datos reales
                     años = ['2024', '2025', '2026', '2027', '2028']
@@ -1886,7 +2024,7 @@ def mostrar_vision_general(datasets, metricas, geodatos, ciudad_seleccionada):
         if 'kpis_barrio' in datasets and not datasets['kpis_barrio'].empty:
             df_barrios = datasets['kpis_barrio']
             if 'ciudad' in df_barrios.columns:
-                df_ciudad_socio = df_barrios[df_barrios['ciudad'].str.lower() == ciudad_seleccionada.lower()]
+                df_ciudad_socio = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
                 
                 if not df_ciudad_socio.empty:
                     # Preparar datos para análisis socioeconómico
@@ -2942,15 +3080,14 @@ def mostrar_densidad_por_barrio(datasets, geodatos, ciudad_seleccionada):
     
     # Análisis de concentración por barrios
     if 'kpis_barrio' in datasets and not datasets['kpis_barrio'].empty:
-        df_barrios = datasets['kpis_barrio']
-        df_ciudad = df_barrios[df_barrios['ciudad'].str.lower() == ciudad_seleccionada.lower()]
+        df_ciudad = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
         
         if not df_ciudad.empty:
             st.subheader("📊 Rankings de Concentración")
             
             # Top 10 barrios con mayor concentración de listings
             if 'total_listings' in df_ciudad.columns:
-                top_densos = df_ciudad.nlargest(10, 'total_listings')[['barrio', 'total_listings']]
+                top_densos = top_ciudad('kpis_barrio', ciudad_seleccionada, 'total_listings', 10, columnas=['barrio', 'total_listings'])
                 
                 col1, col2 = st.columns(2)
                 
@@ -2980,7 +3117,7 @@ def mostrar_densidad_por_barrio(datasets, geodatos, ciudad_seleccionada):
             else:
                 st.warning("⚠️ Datos de concentración por barrio no disponibles")
                 # Fallback: usar total_listings si no hay densidad_listings
-                top_densos = df_ciudad.nlargest(10, 'total_listings')[['barrio', 'total_listings']]
+                top_densos = top_ciudad('kpis_barrio', ciudad_seleccionada, 'total_listings', 10, columnas=['barrio', 'total_listings'])
                 
                 col1, col2 = st.columns(2)
                 
@@ -3079,9 +3216,12 @@ def mostrar_densidad_por_barrio(datasets, geodatos, ciudad_seleccionada):
                 # Crear y mostrar mapa de precios con Folium
                 mapa_precios = crear_mapa_precios_desde_barrios(df_ciudad, ciudad_seleccionada, geodatos)
                 if mapa_precios is not None:
-                    st_folium(mapa_precios, use_container_width=True, height=500)
+                    mostrar_mapa_folium(mapa_precios, height=500, key="mapa_precios_barrios")
                 else:
                     st.info("ℹ️ Mapa de precios no disponible para esta ciudad")
+                
+                # Vista de listings individuales agrupados según el zoom
+                mostrar_listings_individuales(df_ciudad, geodatos, ciudad_seleccionada)
             
             with col_map2:
                 st.markdown("#### 💡 **Información del Mapa**")
@@ -3124,8 +3264,7 @@ def mostrar_ratio_turistico(datasets, geodatos, ciudad_seleccionada):
     
     # Análisis del ratio si hay datos disponibles
     if 'kpis_barrio' in datasets and not datasets['kpis_barrio'].empty:
-        df_barrios = datasets['kpis_barrio']
-        df_ciudad = df_barrios[df_barrios['ciudad'].str.lower() == ciudad_seleccionada.lower()]
+        df_ciudad = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
         
         if not df_ciudad.empty:
             # Verificar qué columnas están disponibles para trabajar con ratios
@@ -3191,10 +3330,13 @@ def mostrar_ratio_turistico(datasets, geodatos, ciudad_seleccionada):
                     
                     with col2:
                         st.subheader("🏆 Top Barrios por Ratio")
-                        datos_validos = df_ciudad[df_ciudad[col_ratio].notna()].copy()
+                        datos_validos = df_ciudad[df_ciudad[col_ratio].notna()]
                         
                         if not datos_validos.empty:
-                            top_ratios = datos_validos.nlargest(10, col_ratio)[['barrio', col_ratio, 'nivel_saturacion']]
+                            top_ratios = df_ciudad.loc[
+                                top_ciudad('kpis_barrio', ciudad_seleccionada, col_ratio, min(10, len(datos_validos))).index,
+                                ['barrio', col_ratio, 'nivel_saturacion']
+                            ]
                             
                             for i, (_, row) in enumerate(top_ratios.iterrows(), 1):
                                 nivel_color = "🔴" if "Alto" in str(row['nivel_saturacion']) else "🟡" if "Moderado" in str(row['nivel_saturacion']) else "🟢"
@@ -3211,7 +3353,9 @@ def mostrar_ratio_turistico(datasets, geodatos, ciudad_seleccionada):
                     if not datos_validos.empty and len(datos_validos) >= 5:
                         st.subheader(f"📈 Ranking de {col_ratio}")
                         
-                        top_ratios_grafico = datos_validos.nlargest(min(15, len(datos_validos)), col_ratio)[['barrio', col_ratio]]
+                        top_ratios_grafico = top_ciudad(
+                            'kpis_barrio', ciudad_seleccionada, col_ratio, min(15, len(datos_validos)), columnas=['barrio', col_ratio]
+                        )
                         
                         fig_ratio = px.bar(
                             top_ratios_grafico,
@@ -3320,8 +3464,9 @@ def mostrar_ratio_turistico(datasets, geodatos, ciudad_seleccionada):
                     # Top barrios
                     if len(valores_valid) >= 5:
                         st.subheader("🏆 Top Barrios - Entire Home")
-                        datos_validos = df_ciudad[df_ciudad[col_entire].notna()].copy()
-                        top_entire = datos_validos.nlargest(10, col_entire)[['barrio', col_entire]]
+                        top_entire = top_ciudad(
+                            'kpis_barrio', ciudad_seleccionada, col_entire, min(10, len(valores_valid)), columnas=['barrio', col_entire]
+                        )
                         
                         for i, (_, row) in enumerate(top_entire.iterrows(), 1):
                             st.write(f"**{i}.** {row['barrio']}: {row[col_entire]:.1f}%")
@@ -3332,7 +3477,7 @@ def mostrar_ratio_turistico(datasets, geodatos, ciudad_seleccionada):
                 # Análisis básico con total_listings
                 st.subheader("📊 Análisis de Concentración de Alojamientos")
                 
-                datos_validos = df_ciudad[df_ciudad['total_listings'].notna()].copy()
+                datos_validos = df_ciudad[df_ciudad['total_listings'].notna()]
                 
                 if not datos_validos.empty:
                     col1, col2, col3 = st.columns(3)
@@ -3348,7 +3493,9 @@ def mostrar_ratio_turistico(datasets, geodatos, ciudad_seleccionada):
                     
                     # Top barrios por listings
                     st.subheader("🏆 Top Barrios por Concentración")
-                    top_listings = datos_validos.nlargest(10, 'total_listings')[['barrio', 'total_listings']]
+                    top_listings = top_ciudad(
+                        'kpis_barrio', ciudad_seleccionada, 'total_listings', min(10, len(datos_validos)), columnas=['barrio', 'total_listings']
+                    )
                     
                     for i, (_, row) in enumerate(top_listings.iterrows(), 1):
                         st.write(f"**{i}.** {row['barrio']}: {row['total_listings']:,} listings")
@@ -3362,9 +3509,46 @@ def mostrar_ratio_turistico(datasets, geodatos, ciudad_seleccionada):
     else:
         st.warning("⚠️ No hay datos de barrios disponibles para análisis de ratio turístico")
 
-def mostrar_alertas_saturacion(datasets, geodatos, ciudad_seleccionada, mostrar_criticos, umbral_saturacion):
+@st.fragment
+def mostrar_listings_individuales(df_ciudad, geodatos, ciudad_seleccionada):
+    """
+    Vista opcional de listings individuales, agrupados en el servidor según el zoom.
+    
+    Se ejecuta como fragmento: cambiar zoom o barrio no vuelve a calcular la sección.
+    """
+    if not st.toggle("🔎 Ver listings individuales", key="vista_listings_individuales"):
+        return
+    
+    col_filtro1, col_filtro2 = st.columns([1, 2])
+    with col_filtro1:
+        barrio = st.selectbox(
+            "Barrio",
+            ["Toda la ciudad"] + sorted(df_ciudad['barrio'].dropna().astype(str).unique().tolist()),
+            key="barrio_listings_individuales"
+        )
+    with col_filtro2:
+        zoom = st.select_slider(
+            "Nivel de zoom",
+            options=ZOOMS_VISTA_LISTINGS,
+            value=ZOOMS_VISTA_LISTINGS[0],
+            key="zoom_listings_individuales",
+            help=f"Desde el zoom {ZOOM_LISTINGS_INDIVIDUALES} se muestran los listings uno a uno si caben en el mapa"
+        )
+    
+    barrio = None if barrio == "Toda la ciudad" else barrio
+    mapa_listings = crear_mapa_listings_individuales(ciudad_seleccionada, geodatos, zoom, barrio)
+    if mapa_listings is not None:
+        mostrar_mapa_folium(mapa_listings, height=500, key="mapa_listings_individuales")
+    else:
+        st.info("ℹ️ No hay listings con coordenadas para esta selección")
+
+@st.fragment
+def mostrar_alertas_saturacion(datasets, geodatos, ciudad_seleccionada):
     """
     Pestaña 4: Alertas de saturación territorial - Sistema de alertas y mapas críticos
+    
+    Se ejecuta como fragmento: sus umbrales son controles propios de la sección (no de
+    la barra lateral), de modo que moverlos solo recalcula la sección.
     """
     st.header("⚠️ Sistema de Alertas de Saturación Territorial")
     
@@ -3388,16 +3572,15 @@ def mostrar_alertas_saturacion(datasets, geodatos, ciudad_seleccionada, mostrar_
     col1, col2 = st.columns(2)
     
     with col1:
-        umbral_densidad = st.slider("🏠 Umbral Densidad (listings/km²)", 0, 200, 100, 5)
+        umbral_densidad = st.slider("🏠 Umbral Densidad (listings/km²)", 0, 200, 100, 5, key="alertas_umbral_densidad")
     
     with col2:
-        umbral_ratio = st.slider("📈 Umbral Ratio Turístico", 0.0, 1.0, 0.3, 0.05,
+        umbral_ratio = st.slider("📈 Umbral Ratio Turístico", 0.0, 1.0, 0.3, 0.05, key="alertas_umbral_ratio",
                                 help="Proporción de viviendas turísticas que consideramos problemática")
     
     # Análisis de saturación
     if 'kpis_barrio' in datasets and not datasets['kpis_barrio'].empty:
-        df_barrios = datasets['kpis_barrio']
-        df_ciudad = df_barrios[df_barrios['ciudad'].str.lower() == ciudad_seleccionada.lower()]
+        df_ciudad = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
         
         if not df_ciudad.empty:
             # Identificar barrios en estado crítico basado en datos disponibles
@@ -3406,18 +3589,39 @@ def mostrar_alertas_saturacion(datasets, geodatos, ciudad_seleccionada, mostrar_
             # Usar total_listings como indicador de concentración 
             if 'total_listings' in df_ciudad.columns:
                 # Calcular percentil 90 como umbral de alta concentración
-                umbral_alta_concentracion = df_ciudad['total_listings'].quantile(0.9)
-                criticos_concentracion = df_ciudad[df_ciudad['total_listings'] > umbral_alta_concentracion]['barrio'].tolist()
+                umbral_alta_concentracion = obtener_almacen_compartido().consultas.indice_umbral(
+                    'kpis_barrio', 'total_listings', ciudad_seleccionada
+                ).cuantil(0.9)
+                criticos_concentracion = consultar_ciudad(
+                    'kpis_barrio', ciudad_seleccionada, columnas=['barrio'],
+                    filtros=[('total_listings', '>', umbral_alta_concentracion)]
+                )['barrio'].tolist()
                 barrios_criticos.extend(criticos_concentracion)
             
             # Usar ratio de entire home como indicador de saturación turística
             if 'ratio_entire_home_pct' in df_ciudad.columns:
-                criticos_ratio = df_ciudad[df_ciudad['ratio_entire_home_pct'] > (umbral_ratio * 100)]['barrio'].tolist()
+                criticos_ratio = consultar_ciudad(
+                    'kpis_barrio', ciudad_seleccionada, columnas=['barrio'],
+                    filtros=[('ratio_entire_home_pct', '>', umbral_ratio * 100)]
+                )['barrio'].tolist()
                 barrios_criticos.extend(criticos_ratio)
             elif 'ratio_entire_home' in df_ciudad.columns:
-                criticos_ratio = df_ciudad[df_ciudad['ratio_entire_home'] > umbral_ratio]['barrio'].tolist()
+                criticos_ratio = consultar_ciudad(
+                    'kpis_barrio', ciudad_seleccionada, columnas=['barrio'],
+                    filtros=[('ratio_entire_home', '>', umbral_ratio)]
+                )['barrio'].tolist()
                 barrios_criticos.extend(criticos_ratio)
             
+            # Usar la actividad real (reseñas recientes por listing, percentil 90) si se ha exportado
+            actividad = obtener_tabla_ciudad(datasets, 'actividad_resenas', ciudad_seleccionada)
+            if not actividad.empty:
+                actividad = actividad[actividad['barrio'].isin(df_ciudad['barrio'])]
+            if not actividad.empty:
+                umbral_actividad = actividad['resenas_mes_por_listing'].quantile(0.9)
+                criticos_actividad = actividad[actividad['resenas_mes_por_listing'] > umbral_actividad]['barrio'].tolist()
+                barrios_criticos.extend(criticos_actividad)
+                st.caption(f"⭐ Actividad real: alerta en barrios con más de {umbral_actividad:.2f} reseñas/mes por alojamiento (percentil 90 de los últimos 12 meses)")
+            
             barrios_criticos = list(set(barrios_criticos))  # Eliminar duplicados
             
             # Panel de alertas
@@ -3429,6 +3633,13 @@ def mostrar_alertas_saturacion(datasets, geodatos, ciudad_seleccionada, mostrar_
                 </div>
                 """, unsafe_allow_html=True)
                 
+                # Puesto de cada barrio en el ranking de concentración de la ciudad
+                ranking_listings = None
+                if 'total_listings' in df_ciudad.columns:
+                    ranking_listings = obtener_almacen_compartido().consultas.ranking(
+                        'kpis_barrio', 'total_listings', ciudad_seleccionada
+                    )
+                
                 # Lista de barrios críticos
                 for i, barrio in enumerate(barrios_criticos[:10], 1):
                     barrio_data = df_ciudad[df_ciudad['barrio'] == barrio].iloc[0]
@@ -3447,9 +3658,19 @@ def mostrar_alertas_saturacion(datasets, geodatos, ciudad_seleccionada, mostrar_
                         precio_medio = 0
                     
                     st.write(f"🔴 **{i}. {barrio}**")
-                    st.write(f"   • Alojamientos: {total_listings:,}")
+                    puesto = ranking_listings.rango(barrio) if ranking_listings is not None else None
+                    if puesto is not None:
+                        st.write(f"   • Alojamientos: {total_listings:,} (n.º {puesto} de {len(ranking_listings)} barrios)")
+                    else:
+                        st.write(f"   • Alojamientos: {total_listings:,}")
                     st.write(f"   • Ratio turístico: {ratio_entire_home:.1f}%")
                     st.write(f"   • Precio medio: €{precio_medio:.0f}/noche")
+                    
+                    actividad_barrio = actividad[actividad['barrio'] == barrio] if not actividad.empty else actividad
+                    if not actividad_barrio.empty:
+                        actividad_barrio = actividad_barrio.iloc[0]
+                        st.write(f"   • Actividad: {actividad_barrio['resenas_mes_por_listing']:.2f} reseñas/mes por alojamiento "
+                                 f"({actividad_barrio['pct_activos']:.0f}% activos, ≈{actividad_barrio['noches_mes_estimadas']:,.0f} noches/mes)")
             else:
                 st.markdown("""
                 <div class="alert-success">
@@ -3545,8 +3766,7 @@ def mostrar_recomendaciones_regulatorias(datasets, ciudad_seleccionada):
     
     # Gráfico de apoyo: impacto esperado
     if 'kpis_barrio' in datasets and not datasets['kpis_barrio'].empty:
-        df_barrios = datasets['kpis_barrio']
-        df_ciudad = df_barrios[df_barrios['ciudad'].str.lower() == ciudad_seleccionada.lower()]
+        df_ciudad = consultar_ciudad('kpis_barrio', ciudad_seleccionada)
         
         if not df_ciudad.empty and 'ratio_entire_home_pct' in df_ciudad.columns:
             # Análisis de escenarios regulatorios
@@ -3630,8 +3850,8 @@ def mostrar_analisis_economico_avanzado(datasets, ciudad_seleccionada):
         df_listings = datasets['listings_precios']
         
         # Filtrar por ciudad seleccionada
-        ciudad_data = df_ciudad[df_ciudad['ciudad'].str.lower() == ciudad_seleccionada.lower()]
-        listings_ciudad = df_listings[df_listings['ciudad'].str.lower() == ciudad_seleccionada.lower()]
+        ciudad_data = consultar_ciudad('kpis_ciudad', ciudad_seleccionada)
+        listings_ciudad = consultar_ciudad('listings_precios', ciudad_seleccionada)
         
         if not ciudad_data.empty and not listings_ciudad.empty:
             # Primera fila: Métricas principales con mejor espaciado
@@ -3949,6 +4169,116 @@ def mostrar_analisis_economico_avanzado(datasets, ciudad_seleccionada):
     else:
         st.warning("⚠️ Datos económicos no disponibles")
 
+def mostrar_ocupacion_turistica(datasets, ciudad_seleccionada):
+    """
+    Pestaña 5: Ocupación turística - Días ocupados y libres y evolución mensual estimada
+    """
+    st.header("📅 Ocupación Turística")
+
+    st.markdown(f"### 🏙️ Análisis de Ocupación en {ciudad_seleccionada}")
+
+    st.markdown("""<div style="background-color: rgba(0, 212, 255, 0.08); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
+    <p style="margin: 0; font-size: 0.9rem; line-height: 1.4; color: #f2f2f2;">
+    📅 <strong>Esta sección muestra cuántos días al año están ocupados o libres los alojamientos turísticos</strong> (Airbnb, apartamentos turísticos) en la ciudad seleccionada, y cómo evoluciona la ocupación a lo largo de los meses.
+    </p></div>""", unsafe_allow_html=True)
+
+    df = datasets.get('listings_precios', pd.DataFrame())
+    if df.empty or 'availability_365' not in df.columns:
+        st.warning("⚠️ No hay datos de ocupación disponibles para mostrar esta sección.")
+        return
+
+    if 'city' in df.columns:
+        df = df[df['city'].str.lower() == ciudad_seleccionada.lower()]
+
+    avail = pd.to_numeric(df['availability_365'], errors='coerce').dropna()
+    total_listings = len(avail)
+    if total_listings == 0:
+        st.warning("⚠️ No hay datos de ocupación válidos para la ciudad seleccionada.")
+        return
+
+    # Ocupación real del calendario de la ciudad; si no se ha exportado, aproximación con availability_365
+    ocupacion = obtener_tabla_ciudad(datasets, 'ocupacion_mensual', ciudad_seleccionada)
+    usar_calendario = not ocupacion.empty
+
+    if usar_calendario:
+        dias_ocupados_total = ocupacion['dias_ocupados'].sum()
+        dias_libres_total = ocupacion['dias'].sum() - dias_ocupados_total
+    else:
+        dias_libres_total = avail.sum()
+        dias_ocupados_total = total_listings * 365 - dias_libres_total
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric(
+            label="📆 Días Ocupados (Total)",
+            value=f"{int(dias_ocupados_total):,}",
+            help="Suma de días al año en que los alojamientos están ocupados (reservados) en el periodo analizado."
+        )
+    with col2:
+        st.metric(
+            label="🛏️ Días Libres (Total)",
+            value=f"{int(dias_libres_total):,}",
+            help="Suma de días al año en que los alojamientos están libres (no reservados) en el periodo analizado."
+        )
+
+    st.markdown("""<div style="background-color: rgba(40, 167, 69, 0.08); border: 1px solid #28a745; border-radius: 8px; padding: 12px; margin-bottom: 15px;">
+    <p style="margin: 0; font-size: 0.9rem; line-height: 1.4; color: #f2f2f2;">
+    <strong>💡 ¿Qué significan estos números?</strong>  
+    Un mayor número de días ocupados indica alta demanda turística. Muchos días libres pueden señalar estacionalidad o baja demanda.
+    </p></div>""", unsafe_allow_html=True)
+
+    st.markdown("### 📈 Evolución Mensual de la Ocupación")
+
+    meses = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+    if usar_calendario:
+        # Días ocupados por listing en cada mes del calendario: tasa del mes por días del mes
+        por_mes = ocupacion.groupby(['anio', 'mes'], as_index=False)[['dias', 'dias_ocupados']].sum()
+        dias_mes = pd.to_datetime(dict(year=por_mes['anio'], month=por_mes['mes'], day=1)).dt.days_in_month
+        ocupacion_mensual = (por_mes['dias_ocupados'] / por_mes['dias'] * dias_mes).round(1).tolist()
+        meses = [f"{meses[mes - 1]} {anio}" for anio, mes in zip(por_mes['anio'], por_mes['mes'])]
+        titulo_grafico = f"📈 Ocupación Turística Mensual (calendario) - {ciudad_seleccionada}"
+    else:
+        factor_estacional = [0.6, 0.65, 0.75, 0.85, 0.95, 1.1, 1.3, 1.35, 1.15, 0.9, 0.7, 0.65]
+        ocupacion_media = (365 - avail.mean()) / 365
+        ocupacion_mensual = [ocupacion_media * 365 / 12 * f for f in factor_estacional]
+        titulo_grafico = f"📈 Ocupación Turística Mensual Estimada - {ciudad_seleccionada}"
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=meses,
+        y=ocupacion_mensual,
+        mode='lines+markers',
+        line=dict(color='#00d4ff', width=4),
+        marker=dict(size=10, color='#28a745'),
+        name="Días Ocupados (calendario)" if usar_calendario else "Días Ocupados (estimado)"
+    ))
+    fig.update_layout(
+        title={
+            'text': titulo_grafico,
+            'font': {'color': 'white', 'size': 18},
+            'x': 0.5
+        },
+        xaxis_title="Mes",
+        yaxis_title="Días Ocupados (media por listing)",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white',
+        height=400,
+        margin=dict(l=20, r=20, t=60, b=50),
+        showlegend=False
+    )
+    fig.update_xaxes(gridcolor='rgba(255,255,255,0.2)')
+    fig.update_yaxes(gridcolor='rgba(255,255,255,0.2)')
+
+    st.plotly_chart(fig, use_container_width=True, key="grafico_ocupacion_turistica")
+
+    st.markdown("""<div style="background-color: rgba(0, 212, 255, 0.05); border-radius: 8px; padding: 12px; margin-top: 15px;">
+    <p style="margin: 0; font-size: 0.9rem; line-height: 1.4; color: #f2f2f2;">
+    <strong>🎯 Interpreta el gráfico:</strong>  
+    Los picos en verano y festivos reflejan la estacionalidad del turismo urbano en España.  
+    Si tienes datos mensuales reales, puedes sustituir la estimación por los valores reales.
+    </p></div>""", unsafe_allow_html=True)
+
 def calcular_metricas_principales(datasets):
     """
     Calcula métricas principales para el dashboard asegurando que nunca muestre "No disponible"
@@ -4278,9 +4608,11 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # Cargar datos
-    datasets = cargar_datasets_verificados()
-    geodatos = cargar_datos_geograficos()
+    # Cargar datos (almacén compartido entre sesiones, vistas de solo lectura)
+    almacen = obtener_almacen_compartido()
+    datasets = almacen.vista_datasets()
+    # Geometría de barrios preparada una sola vez por ciudad (claves, centroides, índice)
+    geodatos = almacen.vista_geometrias()
     metadatos = cargar_metadatos_trazabilidad()
     
     if datasets is None:
@@ -4309,6 +4641,8 @@ def main():
     # Datos cargados exitosamente - limpiar mensaje de carga
     loading_placeholder.empty()
     
+    mostrar_informe_memoria(almacen)
+    
     # Mensaje de bienvenida y explicación del dashboard
     st.markdown("""
     <div style="background-color: rgba(40, 167, 69, 0.1); border: 1px solid #28a745; border-radius: 10px; padding: 20px; margin: 20px 0;">
@@ -4402,17 +4736,18 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
-        "📊 Resumen", 
-        "🏘️ Mapa por Barrios", 
-        "📈 Ratio Turístico", 
-        "⚠️ Alertas Saturación",
-        "🏅 Ocupación Turística",
-        "💰 Impacto Económico",
-        "💡 Recomendaciones",
-    ])
-    
-    with tab1:
+    # Navegación por secciones: solo se calcula y se muestra la sección activa
+    seccion_activa = st.radio(
+        "Sección",
+        options=SECCIONES_DASHBOARD,
+        horizontal=True,
+        key="seccion_activa",
+        label_visibility="collapsed"
+    )
+    
+    inicio_render = time.perf_counter()
+    
+    if seccion_activa == SECCION_RESUMEN:
         st.markdown("""
         <div style="background-color: rgba(0, 212, 255, 0.05); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
         <p style="margin: 0; font-size: 0.9rem; line-height: 1.4;">
@@ -4423,7 +4758,7 @@ def main():
         """, unsafe_allow_html=True)
         mostrar_vision_general(datasets, metricas, geodatos, ciudad_seleccionada)
     
-    with tab2:
+    elif seccion_activa == SECCION_BARRIOS:
         st.markdown("""
         <div style="background-color: rgba(0, 212, 255, 0.05); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
         <p style="margin: 0; font-size: 0.9rem; line-height: 1.4;">
@@ -4434,7 +4769,7 @@ def main():
         """, unsafe_allow_html=True)
         mostrar_densidad_por_barrio(datasets, geodatos, ciudad_seleccionada)
     
-    with tab3:
+    elif seccion_activa == SECCION_RATIO:
         st.markdown("""
         <div style="background-color: rgba(0, 212, 255, 0.05); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
         <p style="margin: 0; font-size: 0.9rem; line-height: 1.4;">
@@ -4445,7 +4780,7 @@ def main():
         """, unsafe_allow_html=True)
         mostrar_ratio_turistico(datasets, geodatos, ciudad_seleccionada)
     
-    with tab4:
+    elif seccion_activa == SECCION_ALERTAS:
         st.markdown("""
         <div style="background-color: rgba(0, 212, 255, 0.05); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
         <p style="margin: 0; font-size: 0.9rem; line-height: 1.4;">
@@ -4454,106 +4789,35 @@ def main():
         </p>
         </div>
         """, unsafe_allow_html=True)
-        mostrar_alertas_saturacion(datasets, geodatos, ciudad_seleccionada, mostrar_criticos, umbral_saturacion)
+        mostrar_alertas_saturacion(datasets, geodatos, ciudad_seleccionada)
     
-    with tab5:
-        st.header("📅 Ocupación Turística")
-
-        st.markdown(f"### 🏙️ Análisis de Ocupación en {ciudad_seleccionada}")
-
-        st.markdown("""<div style="background-color: rgba(0, 212, 255, 0.08); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
-        <p style="margin: 0; font-size: 0.9rem; line-height: 1.4; color: #f2f2f2;">
-        📅 <strong>Esta sección muestra cuántos días al año están ocupados o libres los alojamientos turísticos</strong> (Airbnb, apartamentos turísticos) en la ciudad seleccionada, y cómo evoluciona la ocupación a lo largo de los meses.
-        </p></div>""", unsafe_allow_html=True)
-
-        df = datasets.get('listings_precios', pd.DataFrame())
-        if df.empty or 'availability_365' not in df.columns:
-            st.warning("⚠️ No hay datos de ocupación disponibles para mostrar esta sección.")
-
-        if 'city' in df.columns:
-            df = df[df['city'].str.lower() == ciudad_seleccionada.lower()]
-
-        avail = pd.to_numeric(df['availability_365'], errors='coerce').dropna()
-        total_listings = len(avail)
-        if total_listings == 0:
-            st.warning("⚠️ No hay datos de ocupación válidos para la ciudad seleccionada.")
-
-        dias_libres_total = avail.sum()
-        dias_ocupados_total = total_listings * 365 - dias_libres_total
-
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric(
-                label="📆 Días Ocupados (Total)",
-                value=f"{int(dias_ocupados_total):,}",
-                help="Suma de días al año en que los alojamientos están ocupados (reservados) en el periodo analizado."
-            )
-        with col2:
-            st.metric(
-                label="🛏️ Días Libres (Total)",
-                value=f"{int(dias_libres_total):,}",
-                help="Suma de días al año en que los alojamientos están libres (no reservados) en el periodo analizado."
-            )
-
-        st.markdown("""<div style="background-color: rgba(40, 167, 69, 0.08); border: 1px solid #28a745; border-radius: 8px; padding: 12px; margin-bottom: 15px;">
-        <p style="margin: 0; font-size: 0.9rem; line-height: 1.4; color: #f2f2f2;">
-        <strong>💡 ¿Qué significan estos números?</strong>  
-        Un mayor número de días ocupados indica alta demanda turística. Muchos días libres pueden señalar estacionalidad o baja demanda.
-        </p></div>""", unsafe_allow_html=True)
-
-        st.markdown("### 📈 Evolución Mensual de la Ocupación")
-
-        meses = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
-        factor_estacional = [0.6, 0.65, 0.75, 0.85, 0.95, 1.1, 1.3, 1.35, 1.15, 0.9, 0.7, 0.65]
-        ocupacion_media = (365 - avail.mean()) / 365
-        ocupacion_mensual = [ocupacion_media * 365 / 12 * f for f in factor_estacional]
-
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=meses,
-            y=ocupacion_mensual,
-            mode='lines+markers',
-            line=dict(color='#00d4ff', width=4),
-            marker=dict(size=10, color='#28a745'),
-            name="Días Ocupados (estimado)"
-        ))
-        fig.update_layout(
-            title={
-                'text': f"📈 Ocupación Turística Mensual Estimada - {ciudad_seleccionada}",
-                'font': {'color': 'white', 'size': 18},
-                'x': 0.5
-            },
-            xaxis_title="Mes",
-            yaxis_title="Días Ocupados (media por listing)",
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='white',
-            height=400,
-            margin=dict(l=20, r=20, t=60, b=50),
-            showlegend=False
-        )
-        fig.update_xaxes(gridcolor='rgba(255,255,255,0.2)')
-        fig.update_yaxes(gridcolor='rgba(255,255,255,0.2)')
-
-        st.plotly_chart(fig, use_container_width=True, key="grafico_ocupacion_turistica")
-
-        st.markdown("""<div style="background-color: rgba(0, 212, 255, 0.05); border-radius: 8px; padding: 12px; margin-top: 15px;">
-        <p style="margin: 0; font-size: 0.9rem; line-height: 1.4; color: #f2f2f2;">
-        <strong>🎯 Interpreta el gráfico:</strong>  
-        Los picos en verano y festivos reflejan la estacionalidad del turismo urbano en España.  
-        Si tienes datos mensuales reales, puedes sustituir la estimación por los valores reales.
-        </p></div>""", unsafe_allow_html=True)
-        
-        with tab6:
-            st.markdown("""
-            <div style="background-color: rgba(0, 212, 255, 0.05); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
-            <p style="margin: 0; font-size: 0.9rem; line-height: 1.4;">
-            💰 <strong>Analiza el impacto económico detallado</strong> del turismo urbano: beneficios, costes, 
-            distribución de ingresos y efectos en la economía local.
-            </p>
-            </div>
-            """, unsafe_allow_html=True)
-            mostrar_analisis_economico_avanzado(datasets, ciudad_seleccionada)
+    elif seccion_activa == SECCION_OCUPACION:
+        mostrar_ocupacion_turistica(datasets, ciudad_seleccionada)
+    
+    elif seccion_activa == SECCION_ECONOMICO:
+        st.markdown("""
+        <div style="background-color: rgba(0, 212, 255, 0.05); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
+        <p style="margin: 0; font-size: 0.9rem; line-height: 1.4;">
+        💰 <strong>Analiza el impacto económico detallado</strong> del turismo urbano: beneficios, costes, 
+        distribución de ingresos y efectos en la economía local.
+        </p>
+        </div>
+        """, unsafe_allow_html=True)
+        mostrar_analisis_economico_avanzado(datasets, ciudad_seleccionada)
+    
+    elif seccion_activa == SECCION_RECOMENDACIONES:
+        st.markdown("""
+        <div style="background-color: rgba(0, 212, 255, 0.05); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
+        <p style="margin: 0; font-size: 0.9rem; line-height: 1.4;">
+        💡 <strong>Descubre propuestas concretas</strong> para conseguir un turismo más sostenible y equilibrado, 
+        con medidas específicas para administraciones, plataformas y comunidades locales.
+        </p>
+        </div>
+        """, unsafe_allow_html=True)
+        mostrar_recomendaciones_regulatorias(datasets, ciudad_seleccionada)
+    
+    registrar_latencia_seccion(seccion_activa, time.perf_counter() - inicio_render)
+    mostrar_latencias_secciones(geodatos, ciudad_seleccionada)
     
     # Footer con información de trazabilidad y fuentes
     st.markdown("---")
@@ -4598,17 +4862,6 @@ def main():
         </div>
         """, 
         unsafe_allow_html=True)
-        
-    with tab7:
-        st.markdown("""
-        <div style="background-color: rgba(0, 212, 255, 0.05); border-left: 3px solid #00d4ff; padding: 10px; margin-bottom: 20px; border-radius: 3px;">
-        <p style="margin: 0; font-size: 0.9rem; line-height: 1.4;">
-        💡 <strong>Descubre propuestas concretas</strong> para conseguir un turismo más sostenible y equilibrado, 
-        con medidas específicas para administraciones, plataformas y comunidades locales.
-        </p>
-        </div>
-        """, unsafe_allow_html=True)
-        mostrar_recomendaciones_regulatorias(datasets, ciudad_seleccionada)
 
 # Ejecución de la aplicación
 if __name__ == "__main__":